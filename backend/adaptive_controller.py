@@ -0,0 +1,149 @@
+"""
+Latency-driven quality controller
+- Each path (camera loop, browser uploads) has a ladder of quality levels, best first;
+  a level sets inference size, JPEG quality and, for the camera, stream fps and detection interval
+- observe() feeds measured end-to-end latency; a smoothed value above the target steps one
+  level down, a value well below it (headroom) steps back up
+- Changes wait for a cooldown and fresh samples (upgrades wait twice as long) so the
+  controller does not oscillate
+- Settings can be pinned through overrides (or a level set with the controller disabled);
+  everything is visible via stats()
+"""
+
+import threading
+import time
+
+# knobs and their valid ranges (overrides are validated against these)
+KNOB_RANGES = {
+    "imgsz": (64, 1280),
+    "jpeg_quality": (10, 100),
+    "stream_fps": (1, 60),
+    "detect_interval": (1, 30),
+}
+
+# stream_fps here is for a 30 fps target; camera_levels() rescales it to TARGET_FPS
+CAMERA_LEVELS = [
+    {"imgsz": 640, "jpeg_quality": 85, "stream_fps": 30, "detect_interval": 1},
+    {"imgsz": 512, "jpeg_quality": 80, "stream_fps": 24, "detect_interval": 1},
+    {"imgsz": 416, "jpeg_quality": 75, "stream_fps": 20, "detect_interval": 2},
+    {"imgsz": 320, "jpeg_quality": 70, "stream_fps": 15, "detect_interval": 3},
+    {"imgsz": 256, "jpeg_quality": 60, "stream_fps": 10, "detect_interval": 4},
+]
+
+# browser frames are paced by the client, so only size and response quality are adjustable
+BROWSER_LEVELS = [
+    {"imgsz": 480, "jpeg_quality": 80},
+    {"imgsz": 416, "jpeg_quality": 75},
+    {"imgsz": 320, "jpeg_quality": 70},
+    {"imgsz": 256, "jpeg_quality": 60},
+    {"imgsz": 192, "jpeg_quality": 50},
+]
+
+
+def camera_levels(target_fps: float):
+    """CAMERA_LEVELS with stream_fps scaled so level 0 streams at target_fps."""
+    lo, hi = KNOB_RANGES["stream_fps"]
+    scale = float(target_fps) / CAMERA_LEVELS[0]["stream_fps"]
+    return [dict(level, stream_fps=max(lo, min(hi, int(round(level["stream_fps"] * scale)))))
+            for level in CAMERA_LEVELS]
+
+
+class QualityController:
+    """Steps through `levels` to keep the smoothed latency under target_ms."""
+
+    def __init__(self, name: str, levels, target_ms: float, start_level: int = 0, enabled: bool = True,
+                 min_samples: int = 10, cooldown_s: float = 2.0, headroom: float = 0.6, alpha: float = 0.2):
+        self.name = name
+        self.levels = [dict(level) for level in levels]
+        self.target_ms = float(target_ms)
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.cooldown_s = cooldown_s
+        self.headroom = headroom
+        self.alpha = alpha
+        self.level = max(0, min(int(start_level), len(self.levels) - 1))
+        self.overrides = {}
+        self._lock = threading.Lock()
+        self._ewma_ms = None
+        self._samples = 0
+        self._last_change = float("-inf")
+        self.changes = 0
+
+    def settings(self) -> dict:
+        """Current knob values (level defaults with overrides applied)."""
+        with self._lock:
+            return {**self.levels[self.level], **self.overrides}
+
+    def get(self, knob: str):
+        with self._lock:
+            value = self.overrides.get(knob)
+            return value if value is not None else self.levels[self.level][knob]
+
+    def observe(self, latency_s: float, now: float = None):
+        """Record one end-to-end latency sample and adjust the level if needed."""
+        now = time.monotonic() if now is None else now
+        ms = latency_s * 1000.0
+        with self._lock:
+            self._ewma_ms = ms if self._ewma_ms is None else (1 - self.alpha) * self._ewma_ms + self.alpha * ms
+            self._samples += 1
+            if not self.enabled or self._samples < self.min_samples:
+                return
+            since_change = now - self._last_change
+            if self._ewma_ms > self.target_ms and since_change >= self.cooldown_s:
+                self._step(+1, now)
+            elif self._ewma_ms < self.headroom * self.target_ms and since_change >= 2 * self.cooldown_s:
+                self._step(-1, now)
+
+    def _step(self, direction: int, now: float):
+        level = max(0, min(self.level + direction, len(self.levels) - 1))
+        if level == self.level:
+            return
+        self.level = level
+        self.changes += 1
+        self._last_change = now
+        # judge the new level on its own measurements
+        self._samples = 0
+        self._ewma_ms = None
+
+    def configure(self, target_ms=None, enabled=None, level=None, overrides=None):
+        """Runtime changes from the API; raises ValueError on invalid input."""
+        if target_ms is not None and float(target_ms) <= 0:
+            raise ValueError("target_ms must be positive")
+        if level is not None and not 0 <= int(level) < len(self.levels):
+            raise ValueError(f"level must be in 0..{len(self.levels) - 1}")
+        checked = {}
+        for knob, value in (overrides or {}).items():
+            if knob not in self.levels[0]:
+                raise ValueError(f"unknown setting {knob!r} for {self.name}, expected one of {list(self.levels[0])}")
+            if value is None:
+                checked[knob] = None
+                continue
+            lo, hi = KNOB_RANGES[knob]
+            if not lo <= int(value) <= hi:
+                raise ValueError(f"{knob} must be in {lo}..{hi}")
+            checked[knob] = int(value)
+        with self._lock:
+            if target_ms is not None:
+                self.target_ms = float(target_ms)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if level is not None and int(level) != self.level:
+                self._step(int(level) - self.level, time.monotonic())
+            for knob, value in checked.items():
+                if value is None:
+                    self.overrides.pop(knob, None)
+                else:
+                    self.overrides[knob] = value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "target_ms": self.target_ms,
+                "latency_ms": round(self._ewma_ms, 2) if self._ewma_ms is not None else None,
+                "level": self.level,
+                "levels": len(self.levels),
+                "settings": {**self.levels[self.level], **self.overrides},
+                "overrides": dict(self.overrides),
+                "changes": self.changes,
+            }
@@ -0,0 +1,136 @@
+"""
+Shared annotation renderer for detection overlays
+- Takes the whole xyxy / conf / cls arrays of a frame at once
+- Per-class colors come from a palette array built once from the class names
+- Label sprites (background + text) are rasterized once per (class, confidence to 2 decimals)
+  and blitted with numpy slicing afterwards, so cv2.getTextSize / putText run only on cache misses
+- Track ids are assembled from per-class '#' / digit glyph sprites next to the label, so new
+  track ids don't grow the cache; the cache is an LRU bounded by max_sprites
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+TEXT_COLOR = (255, 255, 255)
+
+
+class AnnotationRenderer:
+    """Draw boxes and cached label sprites for a frame's detections."""
+
+    def __init__(self, names, color_fn, font_scale: float = 0.6, box_thickness: int = 2,
+                 max_sprites: int = 4096):
+        self.color_fn = color_fn
+        self.font_scale = font_scale
+        self.box_thickness = box_thickness
+        self.max_sprites = max_sprites
+        # one text height for every sprite, so id glyphs line up with the label next to them
+        (_, self._text_h), _ = cv2.getTextSize("#0", FONT, font_scale, 1)
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.sprite_hits = 0
+        self.sprite_misses = 0
+        self.set_names(names)
+
+    def set_names(self, names):
+        """(Re)build the class-name table and color palette, e.g. after loading another model."""
+        if isinstance(names, dict):
+            n = (max(names) + 1) if names else 0
+            self.names = [names.get(i, str(i)) for i in range(n)]
+        else:
+            self.names = list(names or [])
+        self.palette = np.array([self.color_fn(name) for name in self.names] or [(0, 255, 0)], dtype=np.uint8)
+        # cv2 drawing wants plain int tuples; convert once here instead of per box
+        self._palette_tuples = [tuple(int(c) for c in color) for color in self.palette]
+        with self._lock:
+            self._sprites.clear()
+
+    def class_name(self, cls_id: int) -> str:
+        return self.names[cls_id] if 0 <= cls_id < len(self.names) else str(cls_id)
+
+    def count(self, cls_ids) -> dict:
+        """Per-class detection counts {class_name: n} computed with one bincount."""
+        cls_ids = np.asarray(cls_ids, dtype=int)
+        if cls_ids.size == 0:
+            return {}
+        counts = np.bincount(cls_ids)
+        return {self.class_name(int(i)): int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def _cached(self, key, cls_id: int, text: str, pad: int) -> np.ndarray:
+        """Sprite of text on the class color (pad px left and right), rasterized on a cache miss."""
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self.sprite_hits += 1
+            try:
+                self._sprites.move_to_end(key)
+            except KeyError:  # evicted by another thread meanwhile
+                pass
+            return sprite
+
+        self.sprite_misses += 1
+        th = self._text_h
+        (tw, _), _ = cv2.getTextSize(text, FONT, self.font_scale, 1)
+        sprite = np.empty((th + 8, tw + 2 * pad, 3), dtype=np.uint8)
+        sprite[:] = self.palette[cls_id % len(self.palette)]
+        cv2.putText(sprite, text, (pad, th + 3), FONT, self.font_scale, TEXT_COLOR, 1, cv2.LINE_AA)
+        sprite.flags.writeable = False
+
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def _sprite(self, cls_id: int, conf_key: int) -> np.ndarray:
+        return self._cached((cls_id, conf_key), cls_id, f"{self.class_name(cls_id)} {conf_key / 100:.2f}", 3)
+
+    def _id_sprite(self, cls_id: int, track_id: int) -> np.ndarray:
+        """'#<id>' from cached per-class glyphs (a bounded set, unlike the ids themselves)."""
+        return np.hstack([self._cached((cls_id, ch), cls_id, ch, 0) for ch in f"#{track_id}"]
+                         + [self._cached((cls_id, " "), cls_id, "", 2)])
+
+    @staticmethod
+    def _blit(out: np.ndarray, sprite: np.ndarray, x: int, top: int) -> int:
+        """Copy sprite to (x, top), clipped to the frame; returns the x right after it."""
+        h, w = out.shape[:2]
+        sh, sw = sprite.shape[:2]
+        sw = min(sw, w - x)
+        sh = min(sh, h - top)
+        if sw > 0 and sh > 0:
+            out[top:top + sh, x:x + sw] = sprite[:sh, :sw]
+        return x + sprite.shape[1]
+
+    def render(self, frame: np.ndarray, xyxy, confs, cls_ids, copy: bool = True, track_ids=None) -> np.ndarray:
+        """Return frame (or a copy) with boxes and labels drawn for all detections (with #id when tracked)."""
+        out = frame.copy() if copy else frame
+        n = len(cls_ids)
+        if n == 0:
+            return out
+
+        h, w = out.shape[:2]
+        boxes = np.asarray(xyxy, dtype=np.float32).astype(np.int32)
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w - 1)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h - 1)
+        cls_ids = np.asarray(cls_ids, dtype=int)
+        conf_keys = np.rint(np.asarray(confs, dtype=np.float32) * 100).astype(int)
+        color_idx = cls_ids % len(self._palette_tuples)
+        track_ids = [None] * n if track_ids is None else np.asarray(track_ids, dtype=int).tolist()
+
+        for (x1, y1, x2, y2), cls_id, conf_key, ci, tid in zip(boxes.tolist(), cls_ids.tolist(), conf_keys.tolist(),
+                                                               color_idx.tolist(), track_ids):
+            cv2.rectangle(out, (x1, y1), (x2, y2), self._palette_tuples[ci], self.box_thickness)
+
+            # label sits on top of the box, pushed inside the frame when the box touches the edge
+            sprite = self._sprite(cls_id, conf_key)
+            top = max(0, y1 - sprite.shape[0])
+            x = self._blit(out, sprite, x1, top)
+            if tid is not None:
+                self._blit(out, self._id_sprite(cls_id, tid), x, top)
+        return out
+
+    def stats(self) -> dict:
+        return {"sprites_cached": len(self._sprites), "sprite_hits": self.sprite_hits,
+                "sprite_misses": self.sprite_misses}
@@ -2,28 +2,79 @@
 Flask Backend API for Object Detection System (improved, color-fix)
 - Ensures webcam frames are color (BGR) before processing/streaming
 - Robust webcam handling (select camera index, warm up, drop old frames)
-- Thread-safe detection loop
+- Staged detection pipeline (capture / inference / annotate+encode threads)
+- Multi-object tracking with persistent IDs: the camera loop detects every Nth frame (adaptive)
+  and draws Kalman-predicted boxes in between
+- Motion gate: frames that barely differ from the last inferred one reuse its detections
+  (optionally only the changed region is re-detected)
+- Adaptive quality: inference size, JPEG quality, stream fps and detection interval follow
+  measured end-to-end latency against a target (GET/POST /api/quality)
+- Encode-once MJPEG broadcast shared by all /api/video-feed viewers
+- Pluggable JPEG codec (libjpeg-turbo when installed, OpenCV otherwise) with DCT-scaled
+  decoding of uploads straight to about the inference size
+- Single letterbox pass per frame into a pooled input tensor for the exported backends (preprocess.py;
+  opt-in for torch with TORCH_TENSOR_INPUT)
+- Pooled frame buffers (camera reads decode in place, boxes are drawn in place) and a
+  versioned latest-frame snapshot that save-frame reads without copying
+- Persistent WebSocket frame channel (/api/ws/frames) next to the HTTP process-frame endpoint
+- Per-client browser sessions (X-Session-Id): own metrics, confidence and save-frame snapshot
+- Optional tiled / ROI inference at full resolution for small objects (GET/POST /api/tiling)
+- Optional asyncio serving mode (asgi_app.py): async MJPEG feeds and polls, this app mounted for the rest
+- Multi-stream manager: cameras, video files and RTSP/HTTP sources sharing one batched model
 - Proper handling of ultralytics YOLO results
 - CPU / CUDA device selection at startup
+- Selectable inference backend (PyTorch, ONNX Runtime or OpenVINO on CPU)
+- Micro-batched inference for browser frames (concurrent uploads share one predict call)
+- Optional multi-process inference pool (INFERENCE_WORKERS) fed through shared memory
+- Fast startup: MODEL_LOAD_MODE=background|lazy defers the torch/ultralytics import and model load;
+  /api/health reports liveness + readiness, /api/ready is the readiness probe
+- Prometheus-style /metrics: per-stage latency histograms, queue depths, drops, per-class counts
+- Saved frames: SQLite index with cursor pagination + ETag, cached thumbnails
 - Endpoints: start, stop, status, video-feed, set confidence, set camera index,
              list available cameras, save frame, saved frames management
 """
 
-from flask import Flask, Response, jsonify, request, send_from_directory
+import time
+_IMPORT_STARTED = time.perf_counter()  # startup timings are reported by /api/health
+
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
+try:
+    from flask_sock import Sock
+except ImportError:  # WebSocket frame channel is optional; the HTTP endpoints work without it
+    Sock = None
 import cv2
-from ultralytics import YOLO
 import numpy as np
 import json
-import time
+import math
 import os
 from datetime import datetime
 from pathlib import Path
 import threading
-from collections import defaultdict, deque
+from collections import deque
 import atexit
 import logging
-import torch
+
+from inference_batcher import InferenceBatcher
+from pipeline import LatestSlot, StageTimer
+from frame_pool import FrameBuffer, FramePool, SnapshotPublisher
+from frame_broadcaster import FrameBroadcaster
+from detection_codec import BINARY_MIMETYPE, classes_table, detections_to_json, pack_detections
+from diagnostics import DiagnosticsRecorder
+from frame_index import FrameIndex
+from jpeg_codec import create_codec, jpeg_size
+from stream_manager import StreamManager
+from worker_pool import WorkerPool
+from detection_core import (DEFAULT_CONFIDENCE, EXPORT_IMGSZ, INFERENCE_BACKEND, INFERENCE_THREADS, QUANT_MODE,
+                            SAVED_FRAMES_DIR, TORCH_TENSOR_INPUT, load_detector)
+from tracker import AdaptiveInterval, ObjectTracker
+from motion_gate import MotionGate, merge_region, parse_roi
+from tiling import TiledDetector
+from sessions import SessionStore, session_id_from
+from adaptive_controller import BROWSER_LEVELS, QualityController, camera_levels
+from instrumentation import (CONTENT_TYPE as METRICS_CONTENT_TYPE, END_TO_END_SECONDS, FRAMES_DROPPED,
+                             FRAMES_PROCESSED, MOTION_GATE, QUALITY_LEVEL, QUEUE_DEPTH, REGISTRY, REQUEST_SECONDS,
+                             STAGE_SECONDS, count_detections)
 
 # ---------- Configuration ----------
 DEFAULT_CAMERA_INDEX = int(os.environ.get("CAM_INDEX", 0))
@@ -31,8 +82,67 @@ MAX_CAMERA_TEST_INDEX = 5  # used for listing available cameras
 FRAME_WIDTH = int(os.environ.get("FRAME_WIDTH", 640))
 FRAME_HEIGHT = int(os.environ.get("FRAME_HEIGHT", 480))
 TARGET_FPS = int(os.environ.get("TARGET_FPS", 30))
-SAVED_FRAMES_DIR = Path(__file__).parent / "saved_frames"
 SAVED_FRAMES_DIR.mkdir(exist_ok=True)
+# Micro-batching window for /api/process-frame: flush at BATCH_MAX_SIZE frames or BATCH_MAX_WAIT_MS
+# (batches only fill when requests run concurrently, i.e. gunicorn --threads, see Procfile)
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 15))
+# /api/process-frame response formats: annotated JPEG or detections only
+RESPONSE_FORMATS = ("jpeg", "json", "binary")
+# Debug capture of process-frame uploads (off by default; sampled + bounded when on)
+DEBUG_CAPTURE = os.environ.get("DEBUG_CAPTURE", "0").lower() in ("1", "true", "yes")
+DEBUG_SAMPLE_RATE = float(os.environ.get("DEBUG_SAMPLE_RATE", 0.1))
+DEBUG_RING_SIZE = int(os.environ.get("DEBUG_RING_SIZE", 20))
+# JPEG codec: auto (turbojpeg when PyTurboJPEG + libturbojpeg are installed), turbojpeg or opencv
+JPEG_CODEC = os.environ.get("JPEG_CODEC", "auto")
+# /api/saved-frames page size (default and upper bound)
+SAVED_FRAMES_PAGE_SIZE = int(os.environ.get("SAVED_FRAMES_PAGE_SIZE", 50))
+SAVED_FRAMES_MAX_PAGE_SIZE = 500
+# Concurrent capture sources managed through /api/streams
+MAX_STREAMS = int(os.environ.get("MAX_STREAMS", 16))
+# /api/streams sources beyond camera indices are opt-in: video files only from STREAM_MEDIA_DIR,
+# URLs only for hosts in STREAM_URL_ALLOWLIST ("host" or "scheme://host[:port]", comma separated)
+STREAM_MEDIA_DIR = os.environ.get("STREAM_MEDIA_DIR") or None
+STREAM_URL_ALLOWLIST = [h.strip() for h in os.environ.get("STREAM_URL_ALLOWLIST", "").split(",") if h.strip()]
+# Inference backend settings (INFERENCE_BACKEND, INFERENCE_THREADS, EXPORT_IMGSZ, TORCH_TENSOR_INPUT,
+# QUANT_MODE) are read in detection_core.py, shared with the offline batch CLI
+# Run inference in N worker processes pinned to CPU subsets (0 = in this process)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+# eager: load the model at import (blocks startup); background: load in a thread right away;
+# lazy: load on the first request that needs it. Requests wait up to MODEL_WAIT_SECONDS for it.
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "eager").lower()
+MODEL_WAIT_SECONDS = float(os.environ.get("MODEL_WAIT_SECONDS", 10))
+# Camera loop tracking (opt-in; labels gain track IDs): detect at most every TRACK_MAX_INTERVAL
+# frames, predict boxes in between
+TRACKING = os.environ.get("TRACKING", "0").lower() in ("1", "true", "yes")
+TRACK_MAX_INTERVAL = int(os.environ.get("TRACK_MAX_INTERVAL", 4))
+# Camera loop motion gate (opt-in): skip inference while less than MOTION_MIN_CHANGED of the (ROI)
+# pixels changed by more than MOTION_THRESHOLD gray levels; re-detect at least every MOTION_REFRESH_SECONDS
+MOTION_GATE_ENABLED = os.environ.get("MOTION_GATE", "0").lower() in ("1", "true", "yes")
+MOTION_THRESHOLD = int(os.environ.get("MOTION_THRESHOLD", 25))
+MOTION_MIN_CHANGED = float(os.environ.get("MOTION_MIN_CHANGED", 0.003))
+MOTION_REFRESH_SECONDS = float(os.environ.get("MOTION_REFRESH_SECONDS", 5))
+MOTION_ROI_SPEC = os.environ.get("MOTION_ROI", "")  # "x1,y1,x2,y2" frame fractions (parsed below)
+# Run inference on just the changed region when it covers less than MOTION_REGION_MAX_AREA of the frame
+MOTION_REGIONS = os.environ.get("MOTION_REGIONS", "0").lower() in ("1", "true", "yes")
+MOTION_REGION_MAX_AREA = float(os.environ.get("MOTION_REGION_MAX_AREA", 0.5))
+# Adaptive quality (opt-in; off = the fixed starting level): step inference size / JPEG quality /
+# stream fps / detection interval down while the measured end-to-end latency is above target
+# (and back up when there is headroom)
+ADAPTIVE_QUALITY = os.environ.get("ADAPTIVE_QUALITY", "0").lower() in ("1", "true", "yes")
+CAMERA_LATENCY_TARGET_MS = float(os.environ.get("CAMERA_LATENCY_TARGET_MS", 300))
+BROWSER_LATENCY_TARGET_MS = float(os.environ.get("BROWSER_LATENCY_TARGET_MS", 250))
+# Tiled / ROI inference at full resolution (off | roi | auto): crops of TILE_SIZE px (overlapping by
+# TILE_OVERLAP) or the TILE_ROIS regions go through one batched call, at most TILE_MAX crops
+TILING = os.environ.get("TILING", "off").lower()
+TILE_SIZE = int(os.environ.get("TILE_SIZE", 640))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", 0.2))
+TILE_ROIS = os.environ.get("TILE_ROIS", "")  # "x1,y1,x2,y2;x1,y1,x2,y2" frame fractions
+TILE_MAX = int(os.environ.get("TILE_MAX", 6))
+TILE_FULL_FRAME = os.environ.get("TILE_FULL_FRAME", "1").lower() in ("1", "true", "yes")
+# Per-client browser sessions (X-Session-Id): at most SESSION_MAX, dropped after SESSION_IDLE_SECONDS idle
+SESSION_MAX = int(os.environ.get("SESSION_MAX", 200))
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", 600))
 
 # ---------- App & logging ----------
 app = Flask(__name__)
@@ -42,35 +152,52 @@ CORS(app, resources={
         # This is intentionally permissive to avoid CORS blocking in Render; can be tightened later.
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type"],
+        "allow_headers": ["Content-Type", "Authorization", "X-Session-Id"],
+        "expose_headers": ["Content-Type", "X-Classes-Version", "X-Processing-Time", "ETag"],
         "supports_credentials": False,
         "max_age": 3600
     }
 })
 logging.basicConfig(level=logging.INFO)
+sock = Sock(app) if Sock else None
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None and request.url_rule is not None:
+        # label by route pattern (not raw path) so cardinality stays bounded
+        REQUEST_SECONDS.labels(request.method, request.url_rule.rule, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
 
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:3000",
+    "http://localhost:5000",
+    "https://object-detection-2-9oo8.onrender.com",
+    "https://object-detection-rirh.onrender.com"
+]
+
+def cors_headers(origin: str = None) -> dict:
+    """CORS headers added to every response (also used by the ASGI routes in asgi_app.py)."""
+    return {
+        # allow all for non-browser tools or if origin missing
+        'Access-Control-Allow-Origin': origin if origin and origin in CORS_ALLOWED_ORIGINS else '*',
+        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Session-Id',
+        'Access-Control-Expose-Headers': 'Content-Type, X-Classes-Version, X-Processing-Time, ETag',
+        'Access-Control-Max-Age': '3600',
+    }
 
 # Ensure CORS headers are present on every response (extra safety for deployed envs)
 @app.after_request
 def add_cors_headers(response):
     try:
-        origin = request.headers.get('Origin')
-        allowed_origins = [
-            "http://localhost:3000",
-            "http://localhost:5000",
-            "https://object-detection-2-9oo8.onrender.com",
-            "https://object-detection-rirh.onrender.com"
-        ]
-        if origin and origin in allowed_origins:
-            response.headers['Access-Control-Allow-Origin'] = origin
-        else:
-            # allow all for non-browser tools or if origin missing
-            response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        response.headers['Access-Control-Expose-Headers'] = 'Content-Type'
-        response.headers['Access-Control-Max-Age'] = '3600'
+        response.headers.update(cors_headers(request.headers.get('Origin')))
     except Exception:
         # don't fail the request because of header logic
         pass
@@ -80,18 +207,68 @@ def add_cors_headers(response):
 camera = None
 camera_index = DEFAULT_CAMERA_INDEX
 model = None
+inference_backend = None  # InferenceBackend wrapping `model` (see inference_backends.py)
+worker_pool = None  # WorkerPool when INFERENCE_WORKERS > 0 (see worker_pool.py)
+model_ready = threading.Event()  # set once the model is loaded and warmed up
+model_load_lock = threading.Lock()
+model_loader = None  # background loading thread (MODEL_LOAD_MODE=background|lazy)
+startup_stats = {
+    "mode": MODEL_LOAD_MODE,
+    "model_status": "not_loaded",  # not_loaded | loading | ready | failed
+    "error": None,
+    "import_seconds": None,  # app module import (web app usable)
+    "torch_import_seconds": None,
+    "model_load_seconds": None,
+    "warmup_seconds": None,
+    "ready_seconds": None,  # since import started
+    "first_inference_seconds": None,  # since import started, first non-warm-up predict
+}
+annotation_renderer = None  # AnnotationRenderer with the model's class palette
+classes_info = {"version": None, "names": []}  # class-name table sent once to structured-output clients
+model_weights_file = None
 device = "cpu"
 detection_active = False
 detection_thread = None
 
-frame_lock = threading.Lock()
-current_frame = None  # BGR numpy array
+# Latest frame for save-frame: annotated, or raw + detections not drawn yet (structured responses).
+# Browser clients that send a session id get their own (see sessions.py); this one serves the
+# camera loop and clients without an id
+frame_snapshots = SnapshotPublisher()
+session_store = SessionStore(SESSION_MAX, SESSION_IDLE_SECONDS)
+camera_frame_pool = FramePool("camera")
+browser_frame_pool = FramePool("browser")
+camera_tracker = None  # ObjectTracker of the running camera loop (TRACKING=1)
+detection_interval = None  # AdaptiveInterval deciding which camera frames get inference
+camera_motion_gate = None  # MotionGate of the running camera loop (MOTION_GATE=1)
+pipeline_timer = StageTimer()
 fps_queue = deque(maxlen=30)
 
+# Sampled debug capture for process-frame (replaces per-request log/upload writes)
+diagnostics = DiagnosticsRecorder(SAVED_FRAMES_DIR / "debug_requests.log",
+                                  SAVED_FRAMES_DIR / "diagnostics",
+                                  enabled=DEBUG_CAPTURE,
+                                  sample_rate=DEBUG_SAMPLE_RATE,
+                                  ring_size=DEBUG_RING_SIZE)
+QUEUE_DEPTH.labels("diagnostics-log").set_function(lambda: diagnostics.stats()["log_queue"])
+
+# Saved-frames index; the first scan (and thumbnails for older frames) runs in the background
+frame_index = FrameIndex(SAVED_FRAMES_DIR)
+threading.Thread(target=frame_index.sync, name="frame-index-sync", daemon=True).start()
+
+# WebSocket frame channel counters
+ws_stats_lock = threading.Lock()
+websocket_stats = {
+    "connections": 0,
+    "active": 0,
+    "frames_received": 0,
+    "frames_processed": 0,
+    "frames_dropped": 0,
+}
+
 # Metrics
 current_metrics = {
     "fps": 0.0,
-    "confidence": 0.15,
+    "confidence": DEFAULT_CONFIDENCE,
     "object_count": 0,
     "frames_processed": 0,
     "saved_count": 0,
@@ -101,35 +278,20 @@ current_metrics = {
 
 # ---------- Utilities ----------
 
-def get_color_for_class(class_name: str):
-    """Return consistent BGR color for given class name."""
-    base_colors = {
-        "person": (255, 100, 100),
-        "car": (100, 255, 100),
-        "truck": (100, 200, 255),
-        "bus": (255, 100, 200),
-        "motorcycle": (200, 100, 255),
-        "bicycle": (100, 255, 255),
-    }
-    if class_name in base_colors:
-        return base_colors[class_name]
-    # deterministic hash-based color
-    h = abs(hash(class_name))
-    r = (h & 0xFF0000) >> 16
-    g = (h & 0x00FF00) >> 8
-    b = (h & 0x0000FF)
-    # brighten
-    r = min(255, r + 80)
-    g = min(255, g + 80)
-    b = min(255, b + 80)
-    return (b, g, r)
+def request_session():
+    """The calling browser's ClientSession, or None when it sends no (valid) session id."""
+    return session_store.get(session_id_from(request.headers, request.cookies, request.args),
+                             confidence=current_metrics["confidence"])
+
+jpeg_codec = create_codec(JPEG_CODEC)
 
 def safe_imencode_jpeg(frame, quality=85):
-    """Encode frame to JPEG bytes in a safe way (thread-safe)."""
-    ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-    if not ret:
+    """Encode frame to JPEG bytes in a safe way (thread-safe); None on failure."""
+    try:
+        return jpeg_codec.encode(frame, quality)
+    except Exception as e:
+        logging.warning(f"JPEG encode failed: {e}")
         return None
-    return buffer.tobytes()
 
 def is_color_frame(frame: np.ndarray) -> bool:
     """Return True if frame is multi-channel color (3 or 4 channels)."""
@@ -160,70 +322,183 @@ def normalize_frame_to_bgr(frame: np.ndarray) -> np.ndarray:
     # already BGR (3 channels)
     return frame
 
-# ---------- Model loading ----------
+# Latest annotated frame, JPEG-encoded once and shared with every /api/video-feed viewer
+frame_broadcaster = FrameBroadcaster(safe_imencode_jpeg, quality=85)
 
-def load_model(weights_path: str = "yolov8m.pt", prefer_gpu: bool = True):
-    """Load ultralytics YOLO model and move to device (cuda if available)."""
-    global model, device
+# Runtime quality settings per path; both start at the previous fixed settings
+# (camera: full size, quality 85, TARGET_FPS; browser: 320 px, quality 70)
+camera_quality = QualityController("camera", camera_levels(TARGET_FPS), CAMERA_LATENCY_TARGET_MS,
+                                   enabled=ADAPTIVE_QUALITY)
+browser_quality = QualityController("browser", BROWSER_LEVELS, BROWSER_LATENCY_TARGET_MS, enabled=ADAPTIVE_QUALITY,
+                                    start_level=next(i for i, lv in enumerate(BROWSER_LEVELS) if lv["imgsz"] == 320))
+for _controller in (camera_quality, browser_quality):
+    QUALITY_LEVEL.labels(_controller.name).set_function(lambda c=_controller: c.level)
+
+def parse_motion_roi():
+    """MOTION_ROI as a tuple; a malformed value only logs a warning (the gate then watches the whole frame)."""
     try:
-        logging.info("Loading YOLO model...")
+        return parse_roi(MOTION_ROI_SPEC)
+    except ValueError as e:
+        logging.warning(f"Ignoring MOTION_ROI: {e}; the motion gate watches the whole frame")
+        return None
 
-        # Add safe globals for PyTorch 2.6+ compatibility
-        try:
-            import torch.serialization
-            # Allow ultralytics classes for torch.load
-            from ultralytics.nn.tasks import DetectionModel
-            torch.serialization.add_safe_globals([DetectionModel])
-        except Exception as safe_global_err:
-            logging.warning(f"Could not add safe globals (non-critical): {safe_global_err}")
-
-        # Determine weights to use: prefer env override, otherwise pick a smaller model on CPU
-        env_weights = os.environ.get('MODEL_WEIGHTS')
-        chosen_weights = env_weights if env_weights else weights_path
-        if not env_weights:
-            # If no GPU available and not explicitly set, use yolov8n (nano) for faster CPU inference
-            try:
-                import torch as _torch
-                if not _torch.cuda.is_available() and weights_path == "yolov8m.pt":
-                    chosen_weights = "yolov8n.pt"
-            except Exception:
-                # conservative fallback
-                pass
+MOTION_ROI = parse_motion_roi()
 
-        # Try loading model
-        try:
-            model = YOLO(chosen_weights)
-        except Exception as load_err:
-            # Fallback: Try downloading fresh weights if local file fails
-            logging.warning(f"Failed to load local weights ({chosen_weights}), trying to download: {load_err}")
-            # Try to fallback to nano model for reliability
-            try:
-                model = YOLO("yolov8n.pt")
-            except Exception:
-                model = YOLO("yolov8m.pt")
+def create_tiled_detector() -> TiledDetector:
+    """TiledDetector from the TILE_* settings; invalid settings fall back to full-frame inference."""
+    try:
+        return TiledDetector(TILING, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, rois=TILE_ROIS,
+                             max_tiles=TILE_MAX, full_frame=TILE_FULL_FRAME)
+    except ValueError as e:
+        logging.warning(f"Invalid tiling settings (TILING={TILING}, TILE_ROIS={TILE_ROIS!r}): {e}; "
+                        f"running full-frame inference (TILING=off)")
+        return TiledDetector("off")
 
-        # choose device
-        if prefer_gpu and torch.cuda.is_available():
-            device = "cuda"
-        else:
-            device = "cpu"
+# Tiled / ROI inference, shared by the camera loop and browser uploads (GET/POST /api/tiling)
+tiled_detector = create_tiled_detector()
 
-        # move model to device if supported
-        try:
-            model.to(device)
-        except Exception:
-            # some ultralytics versions handle device in predict call; ignore if .to not supported
-            pass
+# ---------- Model loading ----------
 
-        logging.info(f"Model loaded ({chosen_weights}) on device: {device}")
-        return True
-    except Exception as e:
+def load_model(weights_path: str = "yolov8m.pt", prefer_gpu: bool = True, backend: str = None):
+    """Load the model through detection_core.load_detector and make it the app's active detector."""
+    global model, inference_backend, annotation_renderer, classes_info, model_weights_file, device
+    try:
+        logging.info("Loading YOLO model...")
+        detector = load_detector(weights_path, prefer_gpu=prefer_gpu, backend=backend)
+    except Exception:
         logging.exception("Failed to load model")
         model = None
+        inference_backend = None
         return False
+    model, device, model_weights_file = detector.model, detector.device, detector.weights_file
+    inference_backend, annotation_renderer = detector.backend, detector.renderer
+    classes_info = classes_table(inference_backend.names)
+    startup_stats["torch_import_seconds"] = detector.torch_import_seconds
+    return True
+
+def start_worker_pool(num_workers: int) -> bool:
+    """Move inference into num_workers processes (CPU only); the in-process backend stays as fallback."""
+    global worker_pool
+    if num_workers <= 0 or model is None or device != "cpu":
+        return False
+    pool = WorkerPool(num_workers, INFERENCE_BACKEND, model_weights_file, inference_backend.names,
+                      threads=INFERENCE_THREADS, imgsz=EXPORT_IMGSZ, slots_per_worker=BATCH_MAX_SIZE,
+                      max_frame_pixels=max(FRAME_WIDTH * FRAME_HEIGHT, 1280 * 720),
+                      calibration_dir=SAVED_FRAMES_DIR, quant_mode=QUANT_MODE,
+                      tensor_input=TORCH_TENSOR_INPUT)
+    if not pool.start():
+        logging.warning("Worker pool unavailable, running inference in-process")
+        return False
+    worker_pool = pool
+    return True
+
+def predictor():
+    """The worker pool when it is running, otherwise the in-process backend (same predict signature)."""
+    if worker_pool is not None and worker_pool.running:
+        return worker_pool
+    return inference_backend
+
+def run_inference(frames, **kwargs):
+    """predict() on the active predictor; records time-to-first-inference for the startup report."""
+    results = predictor().predict(frames, **kwargs)
+    if startup_stats["first_inference_seconds"] is None:
+        startup_stats["first_inference_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 2)
+    return results
+
+def warm_up_model():
+    """One dummy predict per input size used by the endpoints, so the first real request isn't slow."""
+    dummy = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    for imgsz in (320, 640):
+        try:
+            predictor().predict([dummy], conf=0.5, imgsz=imgsz, max_det=1)
+        except Exception as e:
+            logging.warning(f"Model warm-up at imgsz={imgsz} failed (non-critical): {e}")
+
+def initialize_model() -> bool:
+    """Load the model, start the optional worker pool and warm up; marks the app ready on success."""
+    startup_stats["model_status"] = "loading"
+    startup_stats["error"] = None
+    t0 = time.perf_counter()
+    if not load_model():
+        startup_stats["model_status"] = "failed"
+        startup_stats["error"] = "model failed to load (see server log)"
+        return False
+    start_worker_pool(INFERENCE_WORKERS)
+    startup_stats["model_load_seconds"] = round(time.perf_counter() - t0, 2)
+
+    t0 = time.perf_counter()
+    warm_up_model()
+    startup_stats["warmup_seconds"] = round(time.perf_counter() - t0, 2)
+    startup_stats["model_status"] = "ready"
+    startup_stats["ready_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 2)
+    model_ready.set()
+    logging.info(f"Model ready {startup_stats['ready_seconds']}s after startup "
+                 f"(load {startup_stats['model_load_seconds']}s, warm-up {startup_stats['warmup_seconds']}s)")
+    return True
 
-# Try loading default weights
-load_model()
+def start_model_loading():
+    """Run initialize_model on a background thread unless it is ready or already loading."""
+    global model_loader
+    with model_load_lock:
+        if model_ready.is_set() or (model_loader is not None and model_loader.is_alive()):
+            return
+        model_loader = threading.Thread(target=initialize_model, name="model-loader", daemon=True)
+        model_loader.start()
+
+def ensure_model(timeout: float = MODEL_WAIT_SECONDS) -> bool:
+    """True once the model is ready; triggers loading (lazy mode / after a failure) and waits up to timeout."""
+    if model_ready.is_set():
+        return True
+    start_model_loading()
+    loader = model_loader
+    if loader is not None:
+        # join (not wait on the event) so a failed load returns instead of blocking until timeout
+        loader.join(timeout)
+    return model_ready.is_set()
+
+def model_unavailable():
+    """(payload, status) for requests that arrive before the model is ready."""
+    if startup_stats["model_status"] == "failed":
+        return {"error": "Model not loaded. The YOLO model failed to initialize on this server.",
+                "model_status": "failed"}, 500
+    return {"error": "Model is still loading, retry shortly", "model_status": startup_stats["model_status"]}, 503
+
+if MODEL_LOAD_MODE == "eager":
+    initialize_model()
+elif MODEL_LOAD_MODE == "background":
+    start_model_loading()
+
+# ---------- Batched inference ----------
+
+# with a worker pool, keep one batch in flight per worker process
+BATCH_CONCURRENCY = max(1, INFERENCE_WORKERS)
+
+def predict_browser_batch(frames, conf: float):
+    """Run one predict call over downscaled browser frames; returns per-frame (xyxy, conf, cls) arrays."""
+    # smaller img size and limited detections for speed on CPU
+    return run_inference(frames, conf=conf, imgsz=browser_quality.get("imgsz"), max_det=50)
+
+inference_batcher = InferenceBatcher(predict_browser_batch,
+                                     max_batch_size=BATCH_MAX_SIZE,
+                                     max_wait_ms=BATCH_MAX_WAIT_MS,
+                                     concurrency=BATCH_CONCURRENCY)
+
+def predict_stream_batch(frames, conf: float):
+    """Batched predict for /api/streams sources (full frames, same settings as detection_loop)."""
+    return run_inference(frames, conf=conf, iou=0.45, max_det=200)
+
+stream_manager = StreamManager(predict_stream_batch,
+                               renderer=lambda: annotation_renderer,
+                               encoder=safe_imencode_jpeg,
+                               normalize=normalize_frame_to_bgr,
+                               max_batch_size=BATCH_MAX_SIZE,
+                               max_wait_ms=BATCH_MAX_WAIT_MS,
+                               max_streams=MAX_STREAMS,
+                               concurrency=BATCH_CONCURRENCY,
+                               frame_width=FRAME_WIDTH,
+                               frame_height=FRAME_HEIGHT,
+                               media_dir=STREAM_MEDIA_DIR,
+                               url_allowlist=STREAM_URL_ALLOWLIST)
 
 # ---------- Camera control ----------
 
@@ -357,97 +632,99 @@ def list_available_cameras(max_index=MAX_CAMERA_TEST_INDEX):
     return available
 
 # ---------- Detection loop ----------
+# Staged pipeline: capture thread -> inference (detection thread) -> annotate/encode thread,
+# connected by single-slot queues that drop stale frames so no stage waits on another's backlog.
 
-def detection_loop(skip_frames: int = 0):
-    """Threaded detection loop. If skip_frames > 0, runs detection once per (skip_frames+1) frames."""
-    global detection_active, current_frame, current_metrics, fps_queue, camera, model
-
-    if model is None:
-        logging.error("No model loaded. Cannot start detection.")
-        detection_active = False
-        return
-
-    # ensure camera opened
-    if camera is None or not camera.isOpened():
-        ok = open_camera(camera_index)
-        if not ok:
-            logging.error("Failed to open camera in detection loop.")
-            detection_active = False
-            return
-
-    current_metrics["session_start"] = datetime.now().isoformat()
-    current_metrics["frames_processed"] = 0
-    frame_counter = 0
-    last_time = time.time()
+def _record_pipeline_drop(stage: str):
+    pipeline_timer.record_drop(stage)
+    FRAMES_DROPPED.labels("camera", stage).inc()
 
-    # warm-up model once (optional small dummy inference to allocate GPU memory)
-    try:
-        # small black box
-        dummy = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
-        _ = model(dummy, conf=0.001, device=device)  # a tiny run to warm up
-    except Exception:
-        pass
+def _release_frame(frame):
+    if isinstance(frame, FrameBuffer):
+        frame.release()
 
+def _capture_stage(capture_slot):
+    """
+    Capture thread: read camera frames into pooled buffers and keep only the newest
+    (seq, captured_at, buffer) in capture_slot.
+    """
+    seq = 0
+    last_put = 0.0
+    shape = (FRAME_HEIGHT, FRAME_WIDTH, 3)
+    buffer = None
     while detection_active:
-        ret, frame = camera.read()
+        t0 = time.perf_counter()
+        cam = camera
+        if cam is None:
+            break
+        if buffer is None:
+            buffer = camera_frame_pool.acquire(shape)
+        # decode straight into the pooled buffer; OpenCV only allocates when the frame size differs
+        ret, frame = cam.read(buffer.array)
         if not ret or frame is None:
             # small sleep to avoid busy loop if camera fails momentarily
             time.sleep(0.01)
             continue
-
+        if frame is not buffer.array:
+            buffer.release()
+            buffer = camera_frame_pool.adopt(frame)
+            shape = frame.shape
         # Normalize channel layout (ensure BGR 3-channel)
-        frame = normalize_frame_to_bgr(frame)
-
-        frame_counter += 1
+        bgr = normalize_frame_to_bgr(frame)
+        if bgr is not frame:
+            buffer.release()
+            buffer = camera_frame_pool.adopt(bgr)
+        elapsed = time.perf_counter() - t0
+        pipeline_timer.record("capture", elapsed)
+        STAGE_SECONDS.labels("camera", "capture").observe(elapsed)
+        # stream frame rate from the quality controller; frames above it are read (so the camera
+        # buffer stays fresh) but not passed on
+        now = time.perf_counter()
+        if now - last_put < 1.0 / camera_quality.get("stream_fps"):
+            continue  # the next read reuses the same buffer
+        last_put = now
+        # the sequence number lets the tracker count frames dropped while inference ran
+        seq += 1
+        capture_slot.put((seq, now, buffer))
+        buffer = None  # owned by the pipeline now
+    if buffer is not None:
+        buffer.release()
+    capture_slot.close()
+
+def _annotate_stage(output_slot):
+    """
+    Annotate/encode thread: draw detections, update metrics and publish the streaming frame.
+    Pooled frames belong to this stage once received, so boxes are drawn in place.
+    """
+    last_time = time.time()
 
-        # reduce CPU work by optionally skipping frames
-        if skip_frames > 0 and (frame_counter % (skip_frames + 1) != 0):
-            # still update current_frame for streaming but skip detection
-            with frame_lock:
-                current_frame = frame.copy()
+    while True:
+        item = output_slot.get(timeout=0.5)
+        if item is None:
+            if output_slot.closed:
+                break
             continue
+        # inferred frames carry their capture time (end-to-end latency for the quality controller)
+        frame, detections = item[:2]
+        captured_at = item[2] if len(item) > 2 else None
+        pooled = isinstance(frame, FrameBuffer)
+        image = frame.array if pooled else frame
+
+        # tracked results carry a 4th array of track IDs
+        track_ids = detections[3] if detections is not None and len(detections) > 3 else None
+        if detections is None:
+            # skipped (or failed) frame: stream the raw frame without touching metrics
+            out_frame = image
+        else:
+            t0 = time.perf_counter()
+            xyxy, confs, cls_ids = detections[:3]
+            detections_count = annotation_renderer.count(cls_ids)
 
-        try:
-            # run inference
-            confidence = current_metrics.get("confidence", 0.15)
-            # call model on frame. Some ultralytics versions accept device in call, others don't.
-            results = model(frame, conf=confidence, iou=0.45, max_det=200)
-            # results is a list-like object (per batch). We only passed single frame -> iterate results
-            detections_count = defaultdict(int)
-
-            # draw boxes on a copy so we keep original intact
-            out_frame = frame.copy()
-
-            for res in results:
-                # res.boxes contains bounding boxes
-                boxes = res.boxes
-                # convert to numpy arrays (if tensors)
-                # boxes.xyxy -> Nx4
-                xyxy = boxes.xyxy.cpu().numpy() if hasattr(boxes.xyxy, "cpu") else np.array(boxes.xyxy)
-                confs = boxes.conf.cpu().numpy() if hasattr(boxes.conf, "cpu") else np.array(boxes.conf)
-                cls_ids = boxes.cls.cpu().numpy().astype(int) if hasattr(boxes.cls, "cpu") else np.array(boxes.cls).astype(int)
-
-                for (x1, y1, x2, y2), conf_val, cls_id in zip(xyxy, confs, cls_ids):
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    class_name = model.names[int(cls_id)] if model and hasattr(model, "names") else str(int(cls_id))
-                    detections_count[class_name] += 1
-
-                    color = get_color_for_class(class_name)
-
-                    # rectangle
-                    cv2.rectangle(out_frame, (x1, y1), (x2, y2), color, 2)
-
-                    # label background
-                    label = f"{class_name} {float(conf_val):.2f}"
-                    (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-                    # ensure label within frame bounds
-                    ly1 = max(0, y1 - th - 8)
-                    ly2 = y1
-                    lx1 = x1
-                    lx2 = x1 + tw + 6
-                    cv2.rectangle(out_frame, (lx1, ly1), (lx2, ly2), color, -1)
-                    cv2.putText(out_frame, label, (x1 + 3, y1 - 5),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+            # plain arrays may still be used by the caller: draw those on a copy
+            out_frame = annotation_renderer.render(image, xyxy, confs, cls_ids, copy=not pooled,
+                                                   track_ids=track_ids)
+            if not pooled:
+                camera_frame_pool.record_copy(image.nbytes)
 
             # calculate fps
             now = time.time()
@@ -462,22 +739,184 @@ def detection_loop(skip_frames: int = 0):
             current_metrics["object_count"] = sum(detections_count.values())
             current_metrics["detections"] = dict(detections_count)
             current_metrics["frames_processed"] += 1
+            elapsed = time.perf_counter() - t0
+            pipeline_timer.record("annotate", elapsed)
+            STAGE_SECONDS.labels("camera", "draw").observe(elapsed)
+            FRAMES_PROCESSED.labels("camera").inc()
+            count_detections("camera", detections_count)
+
+        # encode once here for every streaming viewer (no viewers, no encode)
+        if frame_broadcaster.has_viewers():
+            t0 = time.perf_counter()
+            frame_broadcaster.quality = camera_quality.get("jpeg_quality")
+            frame_broadcaster.publish(out_frame)
+            elapsed = time.perf_counter() - t0
+            pipeline_timer.record("encode", elapsed)
+            STAGE_SECONDS.labels("camera", "encode").observe(elapsed)
+
+        # keep frame for save-frame API (the snapshot takes over the buffer reference)
+        frame_snapshots.publish(frame if pooled else out_frame)
+        if captured_at is not None:
+            latency = time.perf_counter() - captured_at
+            END_TO_END_SECONDS.labels("camera").observe(latency)
+            camera_quality.observe(latency)
+
+def _detect_region(frame, region, previous, conf, max_imgsz: int = 640):
+    """Inference on the changed region only; boxes outside it are carried over from `previous`."""
+    x1, y1, x2, y2 = region
+    crop = frame[y1:y2, x1:x2]
+    # a smaller input size is where the saving comes from (the model would upscale the crop otherwise)
+    imgsz = min(max_imgsz, max(64, math.ceil(max(crop.shape[:2]) / 32) * 32))
+    detections = run_inference([crop], conf=conf, iou=0.45, imgsz=imgsz, max_det=200)[0]
+    return merge_region(previous, detections, region)
 
-            # save frame for streaming
-            with frame_lock:
-                current_frame = out_frame
+def detection_loop(skip_frames: int = 0):
+    """
+    Threaded detection loop. If skip_frames > 0, runs detection once per (skip_frames+1) frames.
+    With TRACKING on, frames between detections get tracker-predicted boxes (adaptive interval
+    unless skip_frames fixes it); without it they are streamed raw.
+    With MOTION_GATE on, detection frames that show no motion reuse the previous detections.
+    """
+    global detection_active, current_metrics, camera, model, camera_tracker, detection_interval, camera_motion_gate
 
-        except Exception as e:
-            logging.exception(f"Error in detection loop: {e}")
-            # still keep the raw frame for streaming
-            with frame_lock:
-                current_frame = frame.copy()
-            # small pause so logging doesn't spam
-            time.sleep(0.01)
-            continue
+    if not ensure_model():
+        logging.error("No model loaded. Cannot start detection.")
+        detection_active = False
+        return
 
-    # loop end -> release camera
-    close_camera()
+    # ensure camera opened
+    if camera is None or not camera.isOpened():
+        ok = open_camera(camera_index)
+        if not ok:
+            logging.error("Failed to open camera in detection loop.")
+            detection_active = False
+            return
+
+    current_metrics["session_start"] = datetime.now().isoformat()
+    current_metrics["frames_processed"] = 0
+    pipeline_timer.reset()
+
+    # warm-up model once (optional small dummy inference to allocate GPU memory)
+    try:
+        # small black box
+        dummy = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+        _ = predictor().predict([dummy], conf=0.001)  # a tiny run to warm up
+    except Exception:
+        pass
+
+    tracker = ObjectTracker(high_thresh=current_metrics.get("confidence", 0.15)) if TRACKING else None
+    base_interval = skip_frames + 1
+    if skip_frames > 0:
+        interval = AdaptiveInterval(base_interval, base_interval)
+    else:
+        interval = AdaptiveInterval(1, TRACK_MAX_INTERVAL)
+    cam_fps = camera.get(cv2.CAP_PROP_FPS) if camera is not None else 0
+    interval.observe_frame_period(1.0 / (cam_fps if cam_fps and cam_fps > 0 else TARGET_FPS))
+    gate = MotionGate(threshold=MOTION_THRESHOLD, min_changed=MOTION_MIN_CHANGED,
+                      refresh_seconds=MOTION_REFRESH_SECONDS, roi=MOTION_ROI) if MOTION_GATE_ENABLED else None
+    camera_tracker, detection_interval, camera_motion_gate = tracker, interval, gate
+    frames_since_detection = interval.interval  # detect on the first frame
+    last_seq = 0
+    last_captured = None
+    last_raw = None  # detections of the last inference, before tracking
+
+    # replaced items give their pooled buffer back
+    capture_slot = LatestSlot(on_drop=lambda: _record_pipeline_drop("capture"), dispose=lambda item: item[2].release())
+    output_slot = LatestSlot(on_drop=lambda: _record_pipeline_drop("inference"),
+                             dispose=lambda item: _release_frame(item[0]))
+    capture_thread = threading.Thread(target=_capture_stage, args=(capture_slot,), name="capture-stage", daemon=True)
+    annotate_thread = threading.Thread(target=_annotate_stage, args=(output_slot,), name="annotate-stage", daemon=True)
+    capture_thread.start()
+    annotate_thread.start()
+
+    try:
+        while detection_active:
+            item = capture_slot.get(timeout=0.5)
+            if item is None:
+                if capture_slot.closed:
+                    break
+                continue
+            # frame is read here; the buffer itself travels on to the annotate stage
+            seq, captured_at, buffer = item
+            frame = buffer.array
+            steps, last_seq = seq - last_seq, seq
+            if last_captured is not None:
+                interval.observe_frame_period((captured_at - last_captured) / max(steps, 1))
+            last_captured = captured_at
+            if tracker is not None:
+                # follows /api/confidence while the loop runs
+                tracker.high_thresh = current_metrics.get("confidence", 0.15)
+
+            # reduce CPU work by skipping detection on some frames
+            if frames_since_detection < interval.interval:
+                frames_since_detection += 1
+                if tracker is None:
+                    # no tracker: stream the frame with the last detections so boxes don't flicker
+                    output_slot.put((buffer, last_raw))
+                    continue
+                with STAGE_SECONDS.labels("camera", "track").time():
+                    output_slot.put((buffer, tracker.predict(steps)))
+                continue
+
+            # the quality controller can only widen the interval, and only when a tracker fills the gaps
+            if tracker is not None:
+                interval.set_min_interval(max(base_interval, camera_quality.get("detect_interval")))
+            region = None
+            if gate is not None:
+                with STAGE_SECONDS.labels("camera", "motion_gate").time():
+                    run, decision, region = gate.check(frame)
+                MOTION_GATE.labels("camera", decision).inc()
+                if not run and last_raw is not None:
+                    # static scene: reuse the last detections (re-associated so tracks stay alive)
+                    frames_since_detection = 1
+                    detections = tracker.update(*last_raw, steps=steps) if tracker else last_raw
+                    output_slot.put((buffer, detections))
+                    continue
+
+            try:
+                # run inference
+                t0 = time.perf_counter()
+                confidence = current_metrics.get("confidence", 0.15)
+                # the tracker also wants low-score boxes (they keep existing tracks alive)
+                predict_conf = min(confidence, tracker.low_thresh) if tracker else confidence
+                imgsz = camera_quality.get("imgsz")
+                h, w = frame.shape[:2]
+                if tiled_detector.enabled:
+                    # full-resolution tiles / ROIs in one batched call (instead of region or full frame)
+                    detections = tiled_detector.detect(frame, lambda crops, size: run_inference(
+                        crops, conf=predict_conf, iou=0.45, imgsz=size, max_det=200), max_det=200)
+                elif (MOTION_REGIONS and region is not None and last_raw is not None
+                        and (region[2] - region[0]) * (region[3] - region[1]) < MOTION_REGION_MAX_AREA * w * h):
+                    detections = _detect_region(frame, region, last_raw, predict_conf, max_imgsz=imgsz)
+                else:
+                    # we only pass a single frame -> single result
+                    detections = run_inference([frame], conf=predict_conf, iou=0.45, imgsz=imgsz, max_det=200)[0]
+                last_raw = detections
+                elapsed = time.perf_counter() - t0
+                pipeline_timer.record("inference", elapsed)
+                STAGE_SECONDS.labels("camera", "inference").observe(elapsed)
+                frames_since_detection = 1
+                interval.observe_inference(elapsed)
+                if tracker is not None:
+                    with STAGE_SECONDS.labels("camera", "track").time():
+                        detections = tracker.update(*detections, steps=steps)
+                    interval.update(tracker.motion(), tracker.scene_changed)
+                output_slot.put((buffer, detections, captured_at))
+            except Exception as e:
+                logging.exception(f"Error in detection loop: {e}")
+                if gate is not None:
+                    gate.reset()  # make the next detection frame retry inference
+                # still keep the raw frame for streaming
+                output_slot.put((buffer, None))
+                # small pause so logging doesn't spam
+                time.sleep(0.01)
+                continue
+    finally:
+        # loop end -> stop stages, then release camera
+        capture_thread.join(timeout=2)
+        output_slot.close()
+        annotate_thread.join(timeout=2)
+        close_camera()
 
 # ---------- Flask endpoints ----------
 
@@ -487,9 +926,13 @@ def status():
         "active": detection_active,
         "camera_index": camera_index,
         "camera_open": (camera is not None and camera.isOpened()) if camera else False,
-        "model_loaded": model is not None,
+        "model_loaded": model_ready.is_set(),
+        "model_status": startup_stats["model_status"],
         "device": device,
-        "metrics": current_metrics
+        "backend": inference_backend.info() if inference_backend else None,
+        "worker_pool": worker_pool.stats() if worker_pool is not None else None,
+        "metrics": current_metrics,
+        "batching": inference_batcher.stats()
     })
 
 @app.route("/api/list-cameras", methods=["GET"])
@@ -522,10 +965,12 @@ def api_start():
     global detection_active, detection_thread
     if detection_active:
         return jsonify({"status": "already_running"}), 200
-    if model is None:
-        return jsonify({
-            "error": "Model not loaded. The YOLO model failed to initialize on this server."
-        }), 500
+    if not ensure_model():
+        payload, code = model_unavailable()
+        return jsonify(payload), code
+
+    if stream_manager.uses_source(camera_index):
+        return jsonify({"error": f"camera {camera_index} is in use by a stream (see /api/streams)"}), 409
 
     # ensure camera open
     ok = open_camera(camera_index)
@@ -553,7 +998,111 @@ def api_stop():
 
 @app.route("/api/metrics", methods=["GET"])
 def api_metrics():
-    return jsonify(current_metrics)
+    """Metrics of the caller's session, or the global ones (camera loop / clients without a session)."""
+    session = request_session()
+    return jsonify(session.metrics() if session is not None else current_metrics)
+
+@app.route("/api/inference-stats", methods=["GET"])
+def api_inference_stats():
+    """Queue depth and batch size statistics of the process-frame micro-batcher (and worker pool)."""
+    stats = inference_batcher.stats()
+    if worker_pool is not None:
+        stats["worker_pool"] = {**worker_pool.stats(), **worker_pool.info()}
+    return jsonify(stats)
+
+@app.route("/api/pipeline-stats", methods=["GET"])
+def api_pipeline_stats():
+    """Per-stage timings of the camera detection pipeline, the slowest stage, tracking and motion-gate state."""
+    snapshot = pipeline_timer.snapshot()
+    snapshot["tracking"] = {
+        "enabled": TRACKING,
+        "tracker": camera_tracker.stats() if camera_tracker is not None else None,
+        "interval": detection_interval.stats() if detection_interval is not None else None,
+    }
+    snapshot["motion_gate"] = camera_motion_gate.stats() if camera_motion_gate is not None else None
+    return jsonify(snapshot)
+
+@app.route("/api/frame-pool", methods=["GET"])
+def api_frame_pool():
+    """Buffer allocations, reuses and bytes copied per frame for each frame path."""
+    pools = [camera_frame_pool, browser_frame_pool, stream_manager.frame_pool]
+    # input tensors of the in-process backend (worker processes keep their own)
+    preprocessor = getattr(inference_backend, "preprocessor", None)
+    if preprocessor is not None:
+        pools.append(preprocessor.pool)
+    return jsonify({"pools": {pool.name: pool.stats() for pool in pools},
+                    "snapshot_version": frame_snapshots.version})
+
+@app.route("/api/quality", methods=["GET"])
+def api_get_quality():
+    """Current adaptive quality settings, latency targets and measured latency per path."""
+    return jsonify({"camera": camera_quality.stats(), "browser": browser_quality.stats()})
+
+@app.route("/api/quality", methods=["POST"])
+def api_set_quality():
+    """
+    Change a path's controller: {"path": "camera"|"browser", "target_ms", "enabled", "level",
+    "overrides": {"jpeg_quality": 90, "imgsz": null, ...}} (null removes an override).
+    """
+    data = request.get_json() or {}
+    controllers = {"camera": camera_quality, "browser": browser_quality}
+    controller = controllers.get(data.get("path"))
+    if controller is None:
+        return jsonify({"error": f"path must be one of {list(controllers)}"}), 400
+    overrides = data.get("overrides")
+    if overrides is not None and not isinstance(overrides, dict):
+        return jsonify({"error": "overrides must be an object"}), 400
+    try:
+        controller.configure(target_ms=data.get("target_ms"), enabled=data.get("enabled"),
+                             level=data.get("level"), overrides=overrides)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": "invalid quality settings", "details": str(e)}), 400
+    return jsonify(controller.stats())
+
+@app.route("/api/tiling", methods=["GET"])
+def api_get_tiling():
+    """Tiled / ROI inference settings, the last crop plan and per-call input counts."""
+    return jsonify(tiled_detector.stats())
+
+@app.route("/api/tiling", methods=["POST"])
+def api_set_tiling():
+    """
+    Change tiling: {"mode": "off"|"roi"|"auto", "tile_size", "overlap", "max_tiles", "full_frame",
+    "rois": [[x1, y1, x2, y2], ...] or "x1,y1,x2,y2;..."} (frame fractions).
+    """
+    data = request.get_json() or {}
+    try:
+        tiled_detector.configure(mode=data.get("mode"), tile_size=data.get("tile_size"),
+                                 overlap=data.get("overlap"), rois=data.get("rois"),
+                                 max_tiles=data.get("max_tiles"), full_frame=data.get("full_frame"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": "invalid tiling settings", "details": str(e)}), 400
+    return jsonify(tiled_detector.stats())
+
+@app.route("/api/stream-stats", methods=["GET"])
+def api_stream_stats():
+    """Encode count, viewer count and sequence number of the shared MJPEG broadcast."""
+    stats = frame_broadcaster.stats()
+    stats["renderer"] = annotation_renderer.stats() if annotation_renderer else None
+    return jsonify(stats)
+
+@app.route("/api/quantization-report", methods=["GET"])
+def api_quantization_report():
+    """INT8 vs FP32 accuracy/speed reports produced by `python quantization.py --report`."""
+    if not model_weights_file:
+        return jsonify({"error": "Model not loaded"}), 500
+    weights = Path(model_weights_file)
+    reports = []
+    for p in sorted(weights.parent.glob(f"{weights.stem}.int8-*.report.json")):
+        try:
+            reports.append(json.loads(p.read_text()))
+        except Exception as e:
+            logging.warning(f"Unreadable quantization report {p}: {e}")
+    if not reports:
+        return jsonify({"error": "no quantization report",
+                        "details": "Run 'python quantization.py --report' in the backend folder."}), 404
+    return jsonify({"active_backend": inference_backend.name if inference_backend else None,
+                    "reports": reports})
 
 @app.route("/api/confidence", methods=["POST"])
 def api_set_confidence():
@@ -563,40 +1112,91 @@ def api_set_confidence():
     except Exception:
         return jsonify({"error": "invalid confidence value"}), 400
     conf = max(0.01, min(0.99, conf))
-    current_metrics["confidence"] = conf
+    session = request_session()
+    if session is not None:
+        session.confidence = conf
+    else:
+        current_metrics["confidence"] = conf
     return jsonify({"confidence": conf})
 
-@app.route("/api/video-feed")
-def video_feed():
-    """HTTP MJPEG streaming endpoint for the annotated frames."""
+def mjpeg_response(broadcaster: FrameBroadcaster):
+    """Stream a broadcaster's frames as multipart MJPEG."""
     boundary = "--frame"
 
     def generate():
-        while True:
-            if current_frame is None:
-                time.sleep(0.01)
-                continue
-            with frame_lock:
-                frame = current_frame.copy()
-            # ensure frame is BGR and 3-channel before encoding
-            frame = normalize_frame_to_bgr(frame)
-            jpg = safe_imencode_jpeg(frame, quality=85)
-            if jpg is None:
-                time.sleep(0.01)
-                continue
-            yield (b"%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (boundary.encode(), len(jpg))) + jpg + b"\r\n"
-            # throttle to avoid excess CPU — desired ~30fps (adjust as needed)
-            time.sleep(1.0 / max(1, TARGET_FPS))
+        # every viewer shares the broadcaster's single JPEG per frame and sleeps until the next one
+        last_seq = 0
+        with broadcaster.viewer():
+            while True:
+                seq, jpg = broadcaster.wait_next(last_seq, timeout=1.0)
+                if jpg is None:
+                    continue
+                last_seq = seq
+                yield (b"%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (boundary.encode(), len(jpg))) + jpg + b"\r\n"
 
     return Response(generate(), mimetype=f"multipart/x-mixed-replace; boundary={boundary}")
 
+@app.route("/api/video-feed")
+def video_feed():
+    """HTTP MJPEG streaming endpoint for the annotated frames."""
+    return mjpeg_response(frame_broadcaster)
+
+# ---------- Multi-stream endpoints ----------
+
+@app.route("/api/streams", methods=["GET"])
+def api_list_streams():
+    return jsonify({"streams": stream_manager.list(), **stream_manager.stats()})
+
+@app.route("/api/streams", methods=["POST"])
+def api_add_stream():
+    """Start a stream: {"source": camera index | video file | rtsp/http URL, "id", "confidence", "loop"}."""
+    if not ensure_model():
+        payload, code = model_unavailable()
+        return jsonify(payload), code
+    data = request.get_json() or {}
+    if data.get("source") in (None, ""):
+        return jsonify({"error": "source is required"}), 400
+    try:
+        source = stream_manager.parse_source(data["source"])
+        conf = max(0.01, min(0.99, float(data.get("confidence", current_metrics["confidence"]))))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if detection_active and source == camera_index:
+        return jsonify({"error": f"camera {source} is used by the main detection loop"}), 409
+    try:
+        stream = stream_manager.add(source, stream_id=data.get("id"), confidence=conf,
+                                    loop=bool(data.get("loop", True)))
+    except (KeyError, RuntimeError) as e:
+        return jsonify({"error": str(e).strip("'")}), 409
+    return jsonify(stream.info()), 201
+
+@app.route("/api/streams/<stream_id>", methods=["DELETE"])
+def api_remove_stream(stream_id):
+    if not stream_manager.remove(stream_id):
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"status": "stopped", "id": stream_id})
+
+@app.route("/api/streams/<stream_id>/metrics", methods=["GET"])
+def api_stream_metrics(stream_id):
+    stream = stream_manager.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(stream.info())
+
+@app.route("/api/streams/<stream_id>/video-feed")
+def api_stream_video_feed(stream_id):
+    stream = stream_manager.get(stream_id)
+    if stream is None:
+        return jsonify({"error": "not found"}), 404
+    return mjpeg_response(stream.broadcaster)
+
 @app.route("/api/save-frame", methods=["POST"])
 def api_save_frame():
-    global current_metrics, current_frame, frame_lock
-    
-    # Check if frame is available
-    if current_frame is None:
-        logging.warning("Save frame requested but current_frame is None")
+    # Reads the latest snapshot without copying; the reference keeps its buffer from being reused
+    session = request_session()
+    snapshot = (session.snapshots if session is not None else frame_snapshots).acquire()
+    if snapshot is None:
+        logging.warning("Save frame requested but no frame has been published yet")
         return jsonify({
             "error": "No frame available",
             "details": "Please wait for detection to process at least one frame before saving."
@@ -607,25 +1207,28 @@ def api_save_frame():
         SAVED_FRAMES_DIR.mkdir(exist_ok=True)
         
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        fname = f"detection_{ts}_f{current_metrics['frames_processed']}.jpg"
+        metrics = session.metrics() if session is not None else current_metrics
+        fname = f"detection_{ts}_f{metrics['frames_processed']}.jpg"
         fpath = SAVED_FRAMES_DIR / fname
         
-        # Save frame with lock
-        with frame_lock:
-            if current_frame is None:  # Double-check inside lock
-                return jsonify({"error": "Frame became unavailable"}), 400
-            
-            success = cv2.imwrite(str(fpath), current_frame)
-            if not success:
-                logging.error(f"cv2.imwrite failed for path: {fpath}")
-                return jsonify({"error": "Failed to write image file"}), 500
+        frame_to_save = snapshot.frame
+        if snapshot.detections is not None:
+            frame_to_save = annotation_renderer.render(snapshot.frame, *snapshot.detections)
+        success = cv2.imwrite(str(fpath), frame_to_save)
+        if not success:
+            logging.error(f"cv2.imwrite failed for path: {fpath}")
+            return jsonify({"error": "Failed to write image file"}), 500
         
         # Verify file was created
         if not fpath.exists():
             logging.error(f"File not found after write: {fpath}")
             return jsonify({"error": "File was not created"}), 500
+        frame_index.add(fname, frame_to_save, detections=metrics.get("detections"))
         
-        current_metrics["saved_count"] += 1
+        if session is not None:
+            session.record_save()
+        else:
+            current_metrics["saved_count"] += 1
         logging.info(f"Frame saved successfully: {fname} (size: {fpath.stat().st_size} bytes)")
         
         return jsonify({
@@ -642,170 +1245,230 @@ def api_save_frame():
             "details": str(e),
             "type": type(e).__name__
         }), 500
+    finally:
+        snapshot.release()
 
-@app.route("/api/process-frame", methods=["POST"])
-def api_process_frame():
+# ---------- Browser frame processing (shared by HTTP and WebSocket) ----------
+
+class FrameProcessingError(Exception):
+    """Raised by process_browser_frame with the HTTP status / payload to report."""
+
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+    def to_dict(self):
+        return {"error": self.message, **self.extra}
+
+def decode_browser_frame(image_bytes: bytes, target_width: int, full_size: bool = False):
+    """Decode an upload; large JPEGs are decoded DCT-scaled to about target_width (never below it)."""
+    return jpeg_codec.decode(image_bytes, min_width=None if full_size else target_width) if image_bytes else None
+
+def downscale_browser_frame(frame: np.ndarray, target_width: int, width: int, height: int):
     """
-    Process a single frame sent from the frontend browser camera.
-    This enables WebRTC-style detection where the browser captures the camera
-    and sends frames to the backend for processing.
+    (small_frame, pooled buffer or None): frame scaled to target_width, sized from the uploaded
+    width x height. A frame already small enough is returned as is (no buffer).
     """
-    global current_metrics, fps_queue, current_frame, frame_lock
-    
-    # Log request received
-    logging.info(f"Received process-frame request from {request.remote_addr}")
-    # Append to debug log file for postmortem in Render
+    if frame.shape[1] <= target_width:
+        return frame, None
+    scale = target_width / float(width)
+    new_w, new_h = int(width * scale), int(height * scale)
+    buffer = browser_frame_pool.acquire((new_h, new_w, 3))
     try:
-        with open(SAVED_FRAMES_DIR / 'debug_requests.log', 'a') as lf:
-            lf.write(f"{datetime.now().isoformat()} - Received process-frame from {request.remote_addr}\n")
+        return cv2.resize(frame, (new_w, new_h), dst=buffer.array, interpolation=cv2.INTER_AREA), buffer
     except Exception:
-        pass
-    
+        buffer.release()
+        raise
+
+def process_browser_frame(image_bytes: bytes, response_format: str = "jpeg", source: str = None,
+                          session=None):
+    """
+    Decode an uploaded browser frame, run detection and build the response body.
+    Returns (body bytes, mimetype, headers); raises FrameProcessingError on failure.
+    With a ClientSession, confidence, metrics and the save-frame snapshot are that client's own.
+    """
+    global current_metrics, fps_queue
+
     # Track FPS for browser camera mode
     start_time = time.time()
-    
-    try:
-        # Check if model is loaded
-        if model is None:
-            return jsonify({"error": "Model not loaded"}), 500
-        
-        # Get uploaded frame
-        if 'frame' not in request.files:
-            return jsonify({"error": "No frame provided"}), 400
-        
-        file = request.files['frame']
-        logging.info("Read uploaded file object")
-        try:
-            with open(SAVED_FRAMES_DIR / f"last_upload_{int(time.time())}.jpg", 'wb') as f:
-                f.write(file.read())
-            # re-seek file for decoding
-            file.stream.seek(0)
-        except Exception:
-            # ignore file save failures
-            file.stream.seek(0)
-        
-        # Read image data
-        # Read image bytes for decoding
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        logging.info(f"Uploaded frame bytes length: {len(file_bytes)}")
-        frame = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        
-        if frame is None:
-            return jsonify({"error": "Invalid image data"}), 400
-        
-        # PROCESS: mark time before predict
-        logging.info("Starting prediction step")
-        try:
-            t_predict_start = time.time()
-        except Exception:
-            t_predict_start = None
 
-        # Process frame with YOLO
-        conf_thresh = current_metrics.get("confidence", 0.15)
+    # Check if model is loaded (waits briefly / starts loading in lazy mode)
+    if not ensure_model():
+        payload, code = model_unavailable()
+        raise FrameProcessingError(payload.pop("error"), code, **payload)
+    if response_format not in RESPONSE_FORMATS:
+        raise FrameProcessingError(f"invalid format, expected one of {list(RESPONSE_FORMATS)}", 400)
 
-        # Downscale frame to speed up CPU inference on deployed servers.
-        # We'll run detection on a smaller copy and return the annotated smaller image.
-        try:
-            target_width = 320
-            h, w = frame.shape[:2]
-            if w > target_width:
-                scale = target_width / float(w)
-                new_w = int(w * scale)
-                new_h = int(h * scale)
-                small_frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            else:
-                small_frame = frame.copy()
-        except Exception as resize_err:
-            logging.warning(f"Failed to resize frame for faster inference: {resize_err}")
-            small_frame = frame.copy()
-
-        # Run prediction on the smaller frame to reduce inference time
-        # Use explicit device, smaller img size and limited detections for speed on CPU
+    # Decode; large JPEGs are decoded DCT-scaled to about the inference width (never below it)
+    logging.debug(f"Uploaded frame bytes length: {len(image_bytes)}")
+    target_width = browser_quality.get("imgsz")
+    tiled = tiled_detector.enabled  # tiles are cut from the full-resolution upload
+    with STAGE_SECONDS.labels("browser", "decode").time():
+        frame = decode_browser_frame(image_bytes, target_width, full_size=tiled)
+
+    if frame is None:
+        raise FrameProcessingError("Invalid image data", 400)
+
+    # PROCESS: mark time before predict
+    t_predict_start = time.time()
+
+    # Process frame with YOLO
+    conf_thresh = session.confidence if session is not None else current_metrics.get("confidence", 0.15)
+    snapshots = session.snapshots if session is not None else frame_snapshots
+
+    # Downscale frame to speed up CPU inference on deployed servers.
+    # We'll run detection on a smaller copy and return the annotated smaller image.
+    # The decoded frame is private to this request, so it is used as-is when small enough;
+    # the downscaled copy goes into a pooled buffer (handed to the snapshot publisher below).
+    # h, w stay the uploaded size: boxes are reported in those coordinates.
+    h, w = frame.shape[:2]
+    size = jpeg_size(image_bytes)
+    if size:
+        w, h = size
+    t_resize = time.perf_counter()
+    try:
+        small_frame, small_buffer = downscale_browser_frame(frame, target_width, w, h)
+    except Exception as resize_err:
+        logging.warning(f"Failed to resize frame for faster inference: {resize_err}")
+        small_frame, small_buffer = frame, None
+    STAGE_SECONDS.labels("browser", "resize").observe(time.perf_counter() - t_resize)
+
+    # Until the snapshot publisher takes it, the pooled buffer is ours to hand back on any
+    # failure (busy batcher, timeout, inference / encode errors)
+    try:
+        # Run prediction on the smaller frame through the shared micro-batcher so concurrent
+        # uploads are served by one predict call instead of serializing on the model
         try:
-            results = model.predict(small_frame, conf=conf_thresh, device=device, imgsz=320, max_det=50, verbose=False)
-        except TypeError:
-            # Some ultralytics versions have different argument names - fallback
-            results = model.predict(small_frame, conf=conf_thresh, device=device, verbose=False)
-        finally:
-            try:
-                t_predict_end = time.time()
-                logging.info(f"Prediction took: {round(t_predict_end - (t_predict_start or t_predict_end), 3)}s")
-                with open(SAVED_FRAMES_DIR / 'debug_requests.log', 'a') as lf:
-                    lf.write(f"{datetime.now().isoformat()} - prediction_time: {round(t_predict_end - (t_predict_start or t_predict_end),3)}\n")
-            except Exception:
-                pass
+            # includes the micro-batch queue wait (see inference_queue_wait_seconds)
+            with STAGE_SECONDS.labels("browser", "inference").time():
+                if tiled:
+                    xyxy, confs, cls_ids = tiled_detector.detect(frame, lambda crops, size: run_inference(
+                        crops, conf=conf_thresh, iou=0.45, imgsz=size, max_det=50), max_det=50)
+                    # the rest of the path works in small_frame coordinates
+                    xyxy = xyxy * (small_frame.shape[1] / float(frame.shape[1]))
+                else:
+                    xyxy, confs, cls_ids = inference_batcher.submit(small_frame, conf_thresh)
+        except (RuntimeError, TimeoutError) as busy_err:
+            logging.warning(f"Inference batcher unavailable: {busy_err}")
+            raise FrameProcessingError("Inference busy", 503, details=str(busy_err))
+        predict_time = time.time() - t_predict_start
+        logging.debug(f"Prediction took: {predict_time:.3f}s")
+        diagnostics.log(f"prediction_time: {predict_time:.3f} source: {source}")
+
+        detections_count = annotation_renderer.count(cls_ids)
 
-        # Draw detections on small_frame (returned image will be smaller but faster)
-        out_frame = small_frame.copy()
-        detections_count = defaultdict(int)
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is None or len(boxes) == 0:
-                continue
-            
-            for box in boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                conf = float(box.conf[0])
-                cls_id = int(box.cls[0])
-                class_name = model.names[cls_id]
-                
-                detections_count[class_name] += 1
-                
-                # Draw bounding box and label
-                color = get_color_for_class(class_name)
-                cv2.rectangle(out_frame, (x1, y1), (x2, y2), color, 2)
-                
-                label = f"{class_name} {conf:.2f}"
-                (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-                ly1 = max(y1 - th - 10, 0)
-                ly2 = y1
-                lx1 = x1
-                lx2 = x1 + tw + 6
-                cv2.rectangle(out_frame, (lx1, ly1), (lx2, ly2), color, -1)
-                cv2.putText(out_frame, label, (x1 + 3, y1 - 5),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
-        
         # Calculate FPS
         processing_time = time.time() - start_time
         # Safety guard: if processing took too long, return 504 to avoid Render 502 proxy
         if processing_time > 12.0:
             logging.warning(f"Processing time too long: {processing_time}s - returning 504")
-            return jsonify({"error": "Processing timeout", "processing_time": processing_time}), 504
-        fps = 1.0 / processing_time if processing_time > 0 else 0
-        fps_queue.append(fps)
-        avg_fps = sum(fps_queue) / len(fps_queue) if len(fps_queue) else fps
-        
-        # Update metrics
-        current_metrics["fps"] = round(avg_fps, 2)
-        current_metrics["object_count"] = sum(detections_count.values())
-        current_metrics["detections"] = dict(detections_count)
-        current_metrics["frames_processed"] += 1
-        
-        # Initialize session_start if not set
-        if current_metrics.get("session_start") is None:
-            current_metrics["session_start"] = datetime.now().isoformat()
-        
-        # Save processed frame for potential save-frame API
-        with frame_lock:
-            current_frame = out_frame
-        
-        logging.info(f"Frame processed: {current_metrics['frames_processed']}, "
-                    f"FPS: {current_metrics['fps']}, "
-                    f"Objects: {current_metrics['object_count']}")
-        
+            raise FrameProcessingError("Processing timeout", 504, processing_time=processing_time)
+        END_TO_END_SECONDS.labels("browser").observe(processing_time)
+        browser_quality.observe(processing_time)
+        FRAMES_PROCESSED.labels("browser").inc()
+        count_detections("browser", detections_count)
+
+        if session is not None:
+            session.record(processing_time, detections_count)
+        else:
+            fps = 1.0 / processing_time if processing_time > 0 else 0
+            fps_queue.append(fps)
+            avg_fps = sum(fps_queue) / len(fps_queue) if len(fps_queue) else fps
+
+            # Update metrics
+            current_metrics["fps"] = round(avg_fps, 2)
+            current_metrics["object_count"] = sum(detections_count.values())
+            current_metrics["detections"] = dict(detections_count)
+            current_metrics["frames_processed"] += 1
+
+            # Initialize session_start if not set
+            if current_metrics.get("session_start") is None:
+                current_metrics["session_start"] = datetime.now().isoformat()
+
+        logging.debug(f"Frame processed ({session.id if session is not None else 'no session'}): "
+                      f"{sum(detections_count.values())} objects in {processing_time:.3f}s")
+        if diagnostics.should_sample():
+            diagnostics.record_upload(image_bytes, source, format=response_format,
+                                      shape=[h, w], predict_time=round(predict_time, 4),
+                                      processing_time=round(processing_time, 4),
+                                      detections=dict(detections_count))
+
+        headers = {'Cache-Control': 'no-cache'}
+
+        if response_format != "jpeg":
+            # Detections only: the browser already has the frame and draws its own overlay.
+            if frame_broadcaster.has_viewers():
+                frame_broadcaster.publish(annotation_renderer.render(small_frame, xyxy, confs, cls_ids))
+                browser_frame_pool.record_copy(small_frame.nbytes)
+            # Keep the raw frame + detections so save-frame can still render them on demand
+            # (published last: another request may recycle the buffer once it is replaced)
+            snapshots.publish(small_buffer or small_frame, detections=(xyxy, confs, cls_ids))
+            small_buffer = None  # owned by the snapshot publisher now
+
+            # report boxes in the uploaded frame's coordinates
+            scale = w / float(small_frame.shape[1])
+            full_xyxy = xyxy * scale if scale != 1.0 else xyxy
+            headers['X-Classes-Version'] = classes_info["version"]
+            headers['X-Processing-Time'] = f"{processing_time:.4f}"
+            if response_format == "binary":
+                return pack_detections(full_xyxy, confs, cls_ids, w, h), BINARY_MIMETYPE, headers
+            payload = detections_to_json(full_xyxy, confs, cls_ids, w, h)
+            payload["classes_version"] = classes_info["version"]
+            payload["processing_time"] = round(processing_time, 4)
+            return json.dumps(payload).encode(), "application/json", headers
+
+        # Draw detections on small_frame (returned image will be smaller but faster).
+        # small_frame is private to this request, so draw in place instead of copying again.
+        with STAGE_SECONDS.labels("browser", "draw").time():
+            out_frame = annotation_renderer.render(small_frame, xyxy, confs, cls_ids, copy=False)
+
         # Encode processed frame as JPEG with lower quality for faster transmission
-        ret, buffer = cv2.imencode('.jpg', out_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-        if not ret:
-            return jsonify({"error": "Failed to encode frame"}), 500
+        with STAGE_SECONDS.labels("browser", "encode").time():
+            jpg = safe_imencode_jpeg(out_frame, browser_quality.get("jpeg_quality"))
+        if jpg is None:
+            raise FrameProcessingError("Failed to encode frame", 500)
+
+        # Share the already-encoded frame with MJPEG viewers (no second encode)
+        frame_broadcaster.publish(out_frame, jpeg=jpg)
+        # Save processed frame for potential save-frame API (drawn in place, so it is the same buffer)
+        snapshots.publish(small_buffer or out_frame)
+        small_buffer = None
+        return jpg, 'image/jpeg', headers
+    except BaseException:
+        if small_buffer is not None:
+            small_buffer.release()
+        raise
+
+@app.route("/api/process-frame", methods=["POST"])
+def api_process_frame():
+    """
+    Process a single frame sent from the frontend browser camera.
+    This enables WebRTC-style detection where the browser captures the camera
+    and sends frames to the backend for processing.
+
+    Response format (?format= or form field):
+    - jpeg (default): annotated, downscaled JPEG
+    - json / binary: detections only, in the uploaded frame's coordinates (see detection_codec.py)
+    """
+    # Debug capture is sampled and written off-thread (see diagnostics.py); free when disabled
+    diagnostics.log(f"Received process-frame from {request.remote_addr}")
+    
+    try:
+        # Get uploaded frame
+        if 'frame' not in request.files:
+            return jsonify({"error": "No frame provided"}), 400
+        
+        response_format = (request.args.get("format") or request.form.get("format") or "jpeg").lower()
         
-        # Return processed frame
-        return Response(
-            buffer.tobytes(),
-            mimetype='image/jpeg',
-            headers={'Cache-Control': 'no-cache'}
-        )
+        file = request.files['frame']
+        body, mimetype, headers = process_browser_frame(file.read(), response_format,
+                                                        source=request.remote_addr, session=request_session())
+        return Response(body, mimetype=mimetype, headers=headers)
         
+    except FrameProcessingError as e:
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         logging.exception("Error processing frame")
         return jsonify({"error": str(e)}), 500
@@ -829,22 +1492,176 @@ def api_process_frame_options():
     resp.headers['Access-Control-Max-Age'] = '3600'
     return resp
 
+def _ws_count(key: str, n: int = 1):
+    with ws_stats_lock:
+        websocket_stats[key] += n
+
+def _ws_drop():
+    _ws_count("frames_dropped")
+    FRAMES_DROPPED.labels("websocket", "receive").inc()
+
+def ws_frames(ws):
+    """
+    Persistent frame channel for the browser camera.
+    The client pushes binary JPEG frames and receives one result message per processed frame
+    (binary detections by default; ?format=json|jpeg as for /api/process-frame). A receiver
+    thread keeps only the newest unprocessed frame, so a slow server drops stale frames
+    instead of queueing them and the client always gets the result for its latest frame.
+    Text messages are control messages, e.g. {"format": "json"}; errors come back as JSON text.
+    """
+    response_format = (request.args.get("format") or "binary").lower()
+    session = request_session()  # ?session=<id> (browsers can't set WebSocket headers)
+    pending = LatestSlot(on_drop=_ws_drop)
+    _ws_count("connections")
+    _ws_count("active")
+
+    def receive_frames():
+        nonlocal response_format
+        try:
+            while True:
+                message = ws.receive()
+                if message is None:
+                    break
+                if isinstance(message, str):
+                    try:
+                        control = json.loads(message)
+                        response_format = str(control.get("format", response_format)).lower()
+                    except Exception:
+                        logging.warning(f"Ignoring invalid WebSocket control message: {message[:100]!r}")
+                    continue
+                _ws_count("frames_received")
+                pending.put(message)
+        except Exception as e:
+            logging.info(f"WebSocket receiver closed: {e}")
+        finally:
+            pending.close()
+
+    receiver = threading.Thread(target=receive_frames, name="ws-receiver", daemon=True)
+    receiver.start()
+    try:
+        while True:
+            data = pending.get(timeout=1.0)
+            if data is None:
+                if pending.closed:
+                    break
+                continue
+            try:
+                body, mimetype, _ = process_browser_frame(data, response_format, source="websocket",
+                                                          session=session)
+            except FrameProcessingError as e:
+                ws.send(json.dumps(e.to_dict()))
+                continue
+            except Exception as e:
+                logging.exception("Error processing WebSocket frame")
+                ws.send(json.dumps({"error": str(e)}))
+                continue
+            ws.send(body.decode() if mimetype == "application/json" else body)
+            _ws_count("frames_processed")
+    except Exception as e:
+        logging.info(f"WebSocket closed: {e}")
+    finally:
+        _ws_count("active", -1)
+
+if sock is not None:
+    sock.route("/api/ws/frames")(ws_frames)
+
+@app.route("/api/sessions", methods=["GET"])
+def api_sessions():
+    """Active browser sessions, their idle time and the eviction counters."""
+    return jsonify(session_store.stats())
+
+@app.route("/api/ws-stats", methods=["GET"])
+def api_ws_stats():
+    """Counters for the WebSocket frame channel (received / processed / dropped-as-stale)."""
+    with ws_stats_lock:
+        stats = dict(websocket_stats)
+    stats["available"] = sock is not None
+    return jsonify(stats)
+
+@app.route("/api/diagnostics", methods=["GET", "POST"])
+def api_diagnostics():
+    """
+    GET: capture settings and metadata of the buffered uploads.
+    POST {"enabled", "sample_rate", "ring_size"}: change capture settings at runtime.
+    """
+    if request.method == "POST":
+        data = request.get_json() or {}
+        try:
+            diagnostics.configure(enabled=data.get("enabled"),
+                                  sample_rate=data.get("sample_rate"),
+                                  ring_size=data.get("ring_size"))
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid diagnostics settings"}), 400
+    return jsonify({**diagnostics.stats(), "uploads": diagnostics.uploads()})
+
+@app.route("/api/diagnostics/dump", methods=["POST"])
+def api_diagnostics_dump():
+    """Write the in-memory ring buffer of sampled uploads to SAVED_FRAMES_DIR/diagnostics/<ts>/."""
+    try:
+        return jsonify({"status": "dumped", **diagnostics.dump()})
+    except Exception as e:
+        logging.exception("Failed to dump diagnostics")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/classes", methods=["GET"])
+def api_classes():
+    """Class-name table for structured process-frame responses; cache it by `version`."""
+    if not ensure_model():
+        payload, code = model_unavailable()
+        return jsonify(payload), code
+    return jsonify(classes_info)
+
 @app.route("/api/saved-frames", methods=["GET"])
 def api_saved_frames():
-    frames = []
-    for p in sorted(SAVED_FRAMES_DIR.glob("*.jpg"), reverse=True):
-        st = p.stat()
-        frames.append({
-            "filename": p.name,
-            "size": st.st_size,
-            "created": datetime.fromtimestamp(st.st_ctime).isoformat(),
-            "url": f"/api/saved-frames/{p.name}"
-        })
-    return jsonify({"frames": frames})
+    """
+    Newest-first page of saved frames from the index.
+    ?limit= (default SAVED_FRAMES_PAGE_SIZE) and ?cursor= (next_cursor of the previous page);
+    answers 304 when If-None-Match matches (the ETag changes whenever a frame is added or deleted);
+    with Cache-Control: no-cache browsers send it themselves, so clients need no custom header.
+    """
+    try:
+        limit = int(request.args.get("limit", SAVED_FRAMES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, SAVED_FRAMES_MAX_PAGE_SIZE))
+    cursor = request.args.get("cursor") or None
+
+    frame_index.sync_if_changed()
+    etag = frame_index.etag(limit, cursor)
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+    try:
+        rows, next_cursor = frame_index.page(limit, cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    frames = [{
+        "filename": row["filename"],
+        "size": row["size"],
+        "created": datetime.fromtimestamp(row["created"]).isoformat(),
+        "width": row["width"],
+        "height": row["height"],
+        "object_count": row["object_count"],
+        "detections": row["detections"],
+        "url": f"/api/saved-frames/{row['filename']}",
+        "thumbnail_url": f"/api/saved-frames/{row['filename']}?thumb=1",
+    } for row in rows]
+    resp = jsonify({"frames": frames, "next_cursor": next_cursor, "total": frame_index.count()})
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 @app.route("/api/saved-frames/<filename>", methods=["GET"])
 def api_get_saved_frame(filename):
+    """The saved JPEG, or its cached thumbnail with ?thumb=1 (both answer conditional requests)."""
     try:
+        if request.args.get("thumb", "").lower() in ("1", "true", "yes"):
+            if not (SAVED_FRAMES_DIR / filename).is_file():
+                return jsonify({"error": "not found"}), 404
+            thumb = frame_index.ensure_thumbnail(filename)
+            return send_from_directory(thumb.parent, thumb.name, max_age=3600)
         return send_from_directory(SAVED_FRAMES_DIR, filename)
     except Exception as e:
         return jsonify({"error": str(e)}), 404
@@ -855,6 +1672,7 @@ def api_delete_frame(filename):
         p = SAVED_FRAMES_DIR / filename
         if p.exists():
             p.unlink()
+            frame_index.remove(filename)
             return jsonify({"status": "deleted"})
         return jsonify({"error": "not found"}), 404
     except Exception as e:
@@ -874,32 +1692,56 @@ def root():
             "start_detection": "/api/start",
             "stop_detection": "/api/stop",
             "video_feed": "/api/video-feed",
+            "inference_stats": "/api/inference-stats",
+            "pipeline_stats": "/api/pipeline-stats",
+            "frames_websocket": "/api/ws/frames",
+            "streams": "/api/streams",
             "saved_frames": "/api/saved-frames"
         },
         "frontend": "https://object-detection-2-9oo8.onrender.com",
         "documentation": "See frontend for full interface"
     })
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text exposition of the latency histograms, counters and queue gauges."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+def health_payload() -> dict:
+    return {"status": "healthy", "ready": model_ready.is_set(), "startup": startup_stats,
+            "timestamp": datetime.now().isoformat()}
+
+def readiness_payload():
+    """(payload, status) for the readiness probe; starts a lazy load when the model isn't ready."""
+    if ensure_model(timeout=0):
+        return {"ready": True, "startup": startup_stats}, 200
+    payload, code = model_unavailable()
+    return {"ready": False, **payload, "startup": startup_stats}, code
+
 @app.route("/api/health", methods=["GET"])
 def health():
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    """Liveness: 200 whenever the process serves requests; `ready` tells whether the model can serve."""
+    return jsonify(health_payload())
+
+@app.route("/api/ready", methods=["GET"])
+def readiness():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before (starts a lazy load)."""
+    payload, code = readiness_payload()
+    return jsonify(payload), code
 
 @app.route("/api/debug", methods=["GET"])
 def debug_info():
     """Debug endpoint to check backend status"""
     return jsonify({
         "status": "online",
-        "model_loaded": model is not None,
+        "model_loaded": model_ready.is_set(),
+        "startup": startup_stats,
         "model_name": "yolov8m.pt" if model else None,
         "device": device,
+        "backend": inference_backend.info() if inference_backend else None,
         "detection_active": detection_active,
         "current_metrics": current_metrics,
-        "cors_origins": [
-            "http://localhost:3000",
-            "http://localhost:5000",
-            "https://object-detection-2-9oo8.onrender.com",
-            "https://object-detection-rirh.onrender.com"
-        ],
+        "cors_origins": CORS_ALLOWED_ORIGINS,
         "saved_frames_dir": str(SAVED_FRAMES_DIR),
         "timestamp": datetime.now().isoformat()
     })
@@ -914,9 +1756,14 @@ def shutdown():
             detection_thread.join(timeout=1)
     except Exception:
         pass
+    inference_batcher.stop()
+    stream_manager.stop_all()
+    if worker_pool is not None:
+        worker_pool.stop()
     close_camera()
 
 atexit.register(shutdown)
+startup_stats["import_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 2)
 
 # ---------- Start server ----------
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+"""
+Asyncio (ASGI) serving mode for the same API
+- Streaming and polling endpoints run natively on the event loop:
+  * /api/video-feed and /api/streams/<id>/video-feed are async generators; one broadcaster
+    listener per feed wakes every viewer, so an idle viewer is a parked coroutine, not a thread
+  * /api/health, /api/ready, /api/metrics and /metrics answer without touching a thread
+- /api/process-frame and the /api/ws/frames WebSocket await process_browser_frame in a
+  bounded executor sized to fill the micro-batcher; the event loop never blocks on inference
+- Every other route is the unchanged Flask app, mounted through a WSGI adapter
+- Responses carry the same CORS headers and request-latency metrics as the Flask routes
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+(the WSGI entry point `gunicorn app:app` keeps working as before)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # Starlette's own adapter (deprecated upstream, but always available)
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as flask_backend
+from instrumentation import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, REQUEST_SECONDS
+from sessions import session_id_from
+
+# Threads that run process_browser_frame; each one blocks on the micro-batcher while its
+# frame waits for a batch, so the default lets every batch slot be filled
+ASGI_INFERENCE_THREADS = int(os.environ.get("ASGI_INFERENCE_THREADS",
+                                            flask_backend.BATCH_MAX_SIZE * flask_backend.BATCH_CONCURRENCY))
+# Threads for the mounted Flask routes (a2wsgi adapter only)
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 8))
+
+MJPEG_BOUNDARY = "--frame"
+
+inference_executor = ThreadPoolExecutor(max_workers=max(1, ASGI_INFERENCE_THREADS),
+                                        thread_name_prefix="asgi-inference")
+
+
+def run_in_executor(fn, *args, **kwargs):
+    return asyncio.get_running_loop().run_in_executor(inference_executor, partial(fn, *args, **kwargs))
+
+
+def json_response(payload, status: int = 200) -> Response:
+    # json.dumps defaults (NaN allowed, str fallback) match what the Flask routes return
+    return Response(json.dumps(payload, default=str), status_code=status, media_type="application/json")
+
+
+def client_session(conn):
+    """ClientSession of a Starlette request / WebSocket (same id sources as app.request_session)."""
+    return flask_backend.session_store.get(session_id_from(conn.headers, conn.cookies, conn.query_params),
+                                           confidence=flask_backend.current_metrics["confidence"])
+
+
+def endpoint(rule: str):
+    """Wrap an async handler: answer CORS preflights, add CORS headers and record request latency."""
+    def wrap(handler):
+        async def route(request):
+            started = time.perf_counter()
+            if request.method == "OPTIONS":
+                response = Response(status_code=204)
+            else:
+                response = await handler(request)
+            response.headers.update(flask_backend.cors_headers(request.headers.get("origin")))
+            # same labels as the Flask routes (method, Flask rule pattern, status)
+            REQUEST_SECONDS.labels(request.method, rule, response.status_code).observe(
+                time.perf_counter() - started)
+            return response
+        return route
+    return wrap
+
+
+# ---------- MJPEG feeds ----------
+
+class FeedNotifier:
+    """
+    Registers one listener on a FrameBroadcaster and wakes all async viewers of it on publish.
+    The listener runs on the publishing thread; it only schedules the wake-up on the loop.
+    """
+
+    def __init__(self, broadcaster, loop):
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.viewers = 0
+
+    def _on_publish(self, seq):
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # swap before set: viewers that wake re-arm on the fresh event
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    def attach(self):
+        if self.viewers == 0:
+            self.broadcaster.add_listener(self._on_publish)
+        self.viewers += 1
+
+    def detach(self) -> bool:
+        """Drop one viewer; True when it was the last one (listener removed)."""
+        self.viewers -= 1
+        if self.viewers == 0:
+            self.broadcaster.remove_listener(self._on_publish)
+            return True
+        return False
+
+
+_notifiers = {}  # id(broadcaster) -> FeedNotifier, only touched on the event loop
+
+
+async def mjpeg_frames(broadcaster):
+    """Async multipart MJPEG generator; shares the broadcaster's single JPEG per frame."""
+    key = id(broadcaster)
+    notifier = _notifiers.get(key)
+    if notifier is None:
+        notifier = _notifiers[key] = FeedNotifier(broadcaster, asyncio.get_running_loop())
+    notifier.attach()
+    last_seq = 0
+    try:
+        with broadcaster.viewer():
+            while True:
+                # take the event before polling so a publish in between is not missed
+                event = notifier.event
+                seq, jpg = broadcaster.poll(last_seq)
+                if jpg is None:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                last_seq = seq
+                yield (b"%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+                       % (MJPEG_BOUNDARY.encode(), len(jpg))) + jpg + b"\r\n"
+    finally:
+        if notifier.detach():
+            _notifiers.pop(key, None)
+
+
+def mjpeg_response(broadcaster) -> StreamingResponse:
+    return StreamingResponse(mjpeg_frames(broadcaster),
+                             media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+
+
+@endpoint("/api/video-feed")
+async def video_feed(request):
+    return mjpeg_response(flask_backend.frame_broadcaster)
+
+
+@endpoint("/api/streams/<stream_id>/video-feed")
+async def stream_video_feed(request):
+    stream = flask_backend.stream_manager.get(request.path_params["stream_id"])
+    if stream is None:
+        return json_response({"error": "not found"}, 404)
+    return mjpeg_response(stream.broadcaster)
+
+
+# ---------- Browser frames ----------
+
+@endpoint("/api/process-frame")
+async def process_frame(request):
+    """Same contract as the Flask /api/process-frame; inference runs in the executor."""
+    try:
+        form = await request.form()
+        upload = form.get("frame")
+        if upload is None or isinstance(upload, str):
+            return json_response({"error": "No frame provided"}, 400)
+        response_format = (request.query_params.get("format") or form.get("format") or "jpeg").lower()
+        data = await upload.read()
+        source = request.client.host if request.client else None
+        body, mimetype, headers = await run_in_executor(flask_backend.process_browser_frame,
+                                                        data, response_format, source=source,
+                                                        session=client_session(request))
+        return Response(body, media_type=mimetype, headers=headers)
+    except flask_backend.FrameProcessingError as e:
+        return json_response(e.to_dict(), e.status)
+    except Exception as e:
+        logging.exception("Error processing frame")
+        return json_response({"error": str(e)}, 500)
+
+
+async def ws_frames(websocket):
+    """
+    Async version of the /api/ws/frames channel (same messages as app.ws_frames): frames that
+    arrive while one is being processed replace each other, so only the newest is processed.
+    """
+    await websocket.accept()
+    response_format = (websocket.query_params.get("format") or "binary").lower()
+    session = client_session(websocket)
+    pending = None
+    closed = False
+    ready = asyncio.Event()
+    flask_backend._ws_count("connections")
+    flask_backend._ws_count("active")
+
+    async def receive_frames():
+        nonlocal response_format, pending, closed
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is not None:
+                    try:
+                        control = json.loads(message["text"])
+                        response_format = str(control.get("format", response_format)).lower()
+                    except Exception:
+                        logging.warning(f"Ignoring invalid WebSocket control message: {message['text'][:100]!r}")
+                    continue
+                if message.get("bytes") is None:
+                    continue
+                flask_backend._ws_count("frames_received")
+                if pending is not None:
+                    flask_backend._ws_drop()
+                pending = message["bytes"]
+                ready.set()
+        except Exception as e:
+            logging.info(f"WebSocket receiver closed: {e}")
+        finally:
+            closed = True
+            ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            await ready.wait()
+            ready.clear()
+            data, pending = pending, None
+            if data is None:
+                if closed:
+                    break
+                continue
+            try:
+                body, mimetype, _ = await run_in_executor(flask_backend.process_browser_frame,
+                                                          data, response_format, source="websocket",
+                                                          session=session)
+            except flask_backend.FrameProcessingError as e:
+                await websocket.send_text(json.dumps(e.to_dict()))
+                continue
+            except Exception as e:
+                logging.exception("Error processing WebSocket frame")
+                await websocket.send_text(json.dumps({"error": str(e)}))
+                continue
+            if mimetype == "application/json":
+                await websocket.send_text(body.decode())
+            else:
+                await websocket.send_bytes(body)
+            flask_backend._ws_count("frames_processed")
+    except (WebSocketDisconnect, RuntimeError) as e:
+        logging.info(f"WebSocket closed: {e}")
+    finally:
+        receiver.cancel()
+        flask_backend._ws_count("active", -1)
+
+
+# ---------- Health & metrics polls ----------
+
+@endpoint("/api/health")
+async def health(request):
+    return json_response(flask_backend.health_payload())
+
+
+@endpoint("/api/ready")
+async def readiness(request):
+    payload, code = flask_backend.readiness_payload()
+    return json_response(payload, code)
+
+
+@endpoint("/api/metrics")
+async def api_metrics(request):
+    session = client_session(request)
+    return json_response(session.metrics() if session is not None else flask_backend.current_metrics)
+
+
+@endpoint("/metrics")
+async def prometheus_metrics(request):
+    return Response(REGISTRY.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+# ---------- App ----------
+
+@asynccontextmanager
+async def lifespan(_app):
+    logging.info(f"ASGI mode: {ASGI_INFERENCE_THREADS} inference threads, Flask routes via {WSGIMiddleware.__module__}")
+    yield
+    inference_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _wsgi_app():
+    try:
+        return WSGIMiddleware(flask_backend.app, workers=ASGI_WSGI_THREADS)
+    except TypeError:  # Starlette's adapter has no thread option (uses the anyio thread pool)
+        return WSGIMiddleware(flask_backend.app)
+
+
+app = Starlette(
+    routes=[
+        Route("/api/video-feed", video_feed, methods=["GET", "OPTIONS"]),
+        Route("/api/streams/{stream_id}/video-feed", stream_video_feed, methods=["GET", "OPTIONS"]),
+        Route("/api/process-frame", process_frame, methods=["POST", "OPTIONS"]),
+        WebSocketRoute("/api/ws/frames", ws_frames),
+        Route("/api/health", health, methods=["GET", "OPTIONS"]),
+        Route("/api/ready", readiness, methods=["GET", "OPTIONS"]),
+        Route("/api/metrics", api_metrics, methods=["GET", "OPTIONS"]),
+        Route("/metrics", prometheus_metrics, methods=["GET", "OPTIONS"]),
+        # everything else: the Flask app as is
+        Mount("/", app=_wsgi_app()),
+    ],
+    lifespan=lifespan,
+)
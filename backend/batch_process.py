@@ -0,0 +1,305 @@
+"""
+Offline batch / video processing on the same detection core as the API
+- Inputs: image folders, single images and video files (any mix)
+- Decoding is prefetched: images in a thread pool, videos on a reader thread
+- Frames are run through the configured inference backend in batches
+- Detections go to JSONL (or Parquet when pyarrow is installed); annotated
+  output videos are optional
+- Progress and frames-per-second are reported while running
+
+The model is loaded through detection_core.load_detector (honouring MODEL_WEIGHTS /
+INFERENCE_BACKEND and the other inference settings) with the API's default confidence, so
+offline results match what the API returns. Importing detection_core starts none of the
+server's services (frame index sync, worker pool, eager model load).
+
+Usage:
+    python batch_process.py recordings/cam1.mp4 saved_frames/ --out detections.jsonl
+    python batch_process.py clip.mp4 --out det.parquet --video-out annotated/ --batch-size 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from detection_core import DEFAULT_CONFIDENCE, load_detector
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"}
+
+
+# ---------- Frame sources ----------
+
+def expand_inputs(inputs):
+    """Turn CLI inputs into [(kind, path, images)]; folders are expanded to their images (sorted)."""
+    sources = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            images = sorted(q for q in p.iterdir() if q.suffix.lower() in IMAGE_SUFFIXES)
+            if images:
+                sources.append(("images", p, images))
+        elif p.suffix.lower() in IMAGE_SUFFIXES:
+            sources.append(("images", p.parent, [p]))
+        elif p.suffix.lower() in VIDEO_SUFFIXES or p.is_file():
+            sources.append(("video", p, None))
+        else:
+            logging.warning(f"Skipping {item}: not a folder, image or video file")
+    return sources
+
+
+def image_frames(paths, workers: int, prefetch: int):
+    """Yield (name, index, frame) for image files, decoding up to `prefetch` ahead in a thread pool."""
+    it = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+        pending = deque((p, pool.submit(cv2.imread, str(p), cv2.IMREAD_COLOR))
+                        for p in (next(it, None) for _ in range(prefetch)) if p is not None)
+        index = 0
+        while pending:
+            path, future = pending.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(cv2.imread, str(nxt), cv2.IMREAD_COLOR)))
+            frame = future.result()
+            if frame is None:
+                logging.warning(f"Could not decode {path}")
+                continue
+            yield path.name, index, frame
+            index += 1
+
+
+def video_frames(path, prefetch: int):
+    """Yield (name, index, frame) for a video, decoding on a background reader thread."""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        logging.error(f"Could not open video {path}")
+        return
+    frames = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.put(frame)
+        finally:
+            cap.release()
+            frames.put(None)
+
+    thread = threading.Thread(target=reader, name="video-reader", daemon=True)
+    thread.start()
+    index = 0
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            yield path.name, index, frame
+            index += 1
+    finally:
+        stop.set()
+        # unblock the reader if it is waiting on a full queue
+        while thread.is_alive():
+            try:
+                frames.get_nowait()
+            except queue.Empty:
+                thread.join(timeout=0.05)
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(str(path))
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0), float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    finally:
+        cap.release()
+
+
+# ---------- Outputs ----------
+
+class DetectionWriter:
+    """Write one record per frame to JSONL, or collect and write Parquet at close()."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.parquet = self.path.suffix.lower() == ".parquet"
+        self.rows = []
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl path instead")
+            self._fh = None
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "w")
+
+    def write(self, record: dict):
+        if self.parquet:
+            self.rows.append(record)
+        else:
+            self._fh.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(pa.Table.from_pylist(self.rows), str(self.path))
+        elif self._fh:
+            self._fh.close()
+
+
+class AnnotatedVideoWriter:
+    """Lazily opened VideoWriter per source; frames are resized to the first frame's size."""
+
+    def __init__(self, out_dir: Path, fps: float):
+        self.out_dir = Path(out_dir)
+        self.fps = fps
+        self.writers = {}
+
+    def write(self, source_key: str, frame, fps: float = None):
+        writer = self.writers.get(source_key)
+        if writer is None:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            h, w = frame.shape[:2]
+            out_path = self.out_dir / f"{Path(source_key).stem}_annotated.mp4"
+            writer = (cv2.VideoWriter(str(out_path), cv2.VideoWriter_fourcc(*"mp4v"), fps or self.fps, (w, h)), (w, h))
+            self.writers[source_key] = writer
+            logging.info(f"Writing annotated video {out_path}")
+        vw, size = writer
+        if frame.shape[1::-1] != size:
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        vw.write(frame)
+
+    def close(self):
+        for vw, _ in self.writers.values():
+            vw.release()
+
+
+# ---------- Main loop ----------
+
+def run(args) -> dict:
+    # pick the weights/backend through the same loader the API uses
+    if args.weights:
+        os.environ["MODEL_WEIGHTS"] = args.weights
+    try:
+        detector = load_detector(backend=args.backend)
+    except Exception as e:
+        logging.exception("Failed to load model")
+        raise SystemExit(f"Model failed to load: {e}")
+    backend = detector.backend
+    renderer = detector.renderer
+
+    sources = expand_inputs(args.inputs)
+    if not sources:
+        raise SystemExit("No readable inputs")
+    total = sum(len(images) if kind == "images" else video_info(path)[0] for kind, path, images in sources)
+
+    writer = DetectionWriter(args.out)
+    video_writer = AnnotatedVideoWriter(args.video_out, args.fps) if args.video_out else None
+    started = time.time()
+    last_report = started
+    done = 0
+    n_detections = 0
+
+    def flush(batch):
+        nonlocal done, n_detections, last_report
+        results = backend.predict([f for _, _, _, f in batch], conf=args.conf, iou=args.iou,
+                                  imgsz=args.imgsz, max_det=args.max_det)
+        for (key, name, index, frame), (xyxy, confs, cls_ids) in zip(batch, results):
+            h, w = frame.shape[:2]
+            writer.write({
+                "source": key,
+                "name": name,
+                "frame": index,
+                "width": w,
+                "height": h,
+                "detections": [
+                    {"box": [round(float(v), 1) for v in box], "conf": round(float(c), 4),
+                     "class_id": int(k), "class": renderer.class_name(int(k))}
+                    for box, c, k in zip(xyxy, confs, cls_ids)
+                ],
+            })
+            n_detections += len(cls_ids)
+            if video_writer is not None:
+                video_writer.write(key, renderer.render(frame, xyxy, confs, cls_ids, copy=False),
+                                   fps=source_fps.get(key))
+        done += len(batch)
+        now = time.time()
+        if now - last_report >= args.progress_every:
+            last_report = now
+            rate = done / (now - started)
+            pct = f" ({100 * done / total:.1f}%)" if total else ""
+            eta = f", eta {(total - done) / rate:.0f}s" if total and rate else ""
+            logging.info(f"{done}/{total or '?'} frames{pct}, {rate:.1f} fps{eta}")
+
+    source_fps = {}
+    try:
+        for kind, path, images in sources:
+            key = str(path)
+            if kind == "images":
+                frames = image_frames(images, args.workers, args.prefetch)
+            else:
+                source_fps[key] = video_info(path)[1] or args.fps
+                frames = video_frames(path, args.prefetch)
+            batch = []
+            for name, index, frame in frames:
+                batch.append((key, name, index, frame))
+                if len(batch) >= args.batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        writer.close()
+        if video_writer is not None:
+            video_writer.close()
+
+    elapsed = time.time() - started
+    summary = {
+        "frames": done,
+        "detections": n_detections,
+        "seconds": round(elapsed, 2),
+        "fps": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        "backend": backend.info(),
+        "output": str(args.out),
+    }
+    logging.info(f"Processed {done} frames in {elapsed:.1f}s ({summary['fps']} fps), {n_detections} detections")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run object detection over image folders and video files")
+    parser.add_argument("inputs", nargs="+", help="image folders, image files or video files")
+    parser.add_argument("--out", default="detections.jsonl", help="output path (.jsonl or .parquet)")
+    parser.add_argument("--video-out", default=None, help="folder for annotated output videos")
+    parser.add_argument("--weights", default=None, help="weights file (default: same choice as the API)")
+    parser.add_argument("--backend", default=None, help="torch | onnx | onnx-int8 | openvino")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="image decode threads")
+    parser.add_argument("--prefetch", type=int, default=32, help="frames decoded ahead of inference")
+    parser.add_argument("--conf", type=float, default=DEFAULT_CONFIDENCE, help="same default as the API")
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--max-det", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=10.0, help="output fps for image folders")
+    parser.add_argument("--progress-every", type=float, default=2.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
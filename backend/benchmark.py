@@ -0,0 +1,468 @@
+"""
+Reproducible benchmark for the detection hot paths
+- Feeds recorded frames (test.jpg, saved frames, --frames) and synthetic frames
+  through the real code in app.py, not re-implementations of it
+- Scenarios:
+  * stages:        decode -> resize -> predict -> draw -> encode, each timed on its own
+  * process-frame: POST /api/process-frame through the Flask test client (jpeg/json/binary)
+  * detection-loop: inference as in detection_loop + the real _annotate_stage thread
+  * video-feed:    mjpeg_response generator fan-out to N viewers
+  * jpeg:          upload decode + downscale and response encode, full imdecode + resize
+                   against each available codec's scaled decode (jpeg_codec.py)
+- Reports p50/p95/p99 latency, throughput and peak RSS per stage
+- Results are saved as JSON; --compare prints the change against an earlier run
+
+Usage:
+    python benchmark.py --iterations 100 --out bench/baseline.json
+    python benchmark.py --iterations 100 --compare bench/baseline.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is reported as None
+    resource = None
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("stages", "process-frame", "detection-loop", "video-feed", "jpeg")
+
+
+# ---------- Measurement helpers ----------
+
+def current_rss_bytes():
+    """
+    Resident set size of this process (Linux /proc; falls back to the peak from getrusage);
+    None where neither is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _max_rss(a, b):
+    return None if a is None or b is None else max(a, b)
+
+
+class MemorySampler:
+    """Samples RSS on a background thread while a stage runs and keeps the peak."""
+
+    def __init__(self, interval: float = 0.005, trace: bool = False):
+        self.interval = interval
+        self.trace = trace
+        self.start_rss = 0
+        self.peak_rss = 0
+        self.traced_peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = _max_rss(self.peak_rss, current_rss_bytes())
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss_bytes()
+        if self.trace:
+            tracemalloc.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = _max_rss(self.peak_rss, current_rss_bytes())
+        if self.trace:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return False
+
+
+def summarize(samples, elapsed: float, mem: MemorySampler, **extra) -> dict:
+    """Latency percentiles (ms), throughput and memory for one timed stage."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    result = {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 3) if ms.size else 0.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3) if ms.size else 0.0,
+        "p95_ms": round(float(np.percentile(ms, 95)), 3) if ms.size else 0.0,
+        "p99_ms": round(float(np.percentile(ms, 99)), 3) if ms.size else 0.0,
+        "max_ms": round(float(ms.max()), 3) if ms.size else 0.0,
+        "throughput_per_s": round(ms.size / elapsed, 2) if elapsed > 0 else 0.0,
+        "peak_rss_mb": round(mem.peak_rss / 2**20, 1) if mem.peak_rss is not None else None,
+        "rss_growth_mb": round((mem.peak_rss - mem.start_rss) / 2**20, 1) if mem.peak_rss is not None else None,
+    }
+    if mem.traced_peak is not None:
+        result["tracemalloc_peak_mb"] = round(mem.traced_peak / 2**20, 2)
+    result.update(extra)
+    return result
+
+
+def timed(fn, inputs, iterations: int, warmup: int, trace: bool = False, **extra) -> dict:
+    """Run fn(item) cycling over inputs; warm-up calls are not recorded."""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    samples = []
+    with MemorySampler(trace=trace) as mem:
+        started = time.perf_counter()
+        for i in range(iterations):
+            t0 = time.perf_counter()
+            fn(inputs[i % len(inputs)])
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed, mem, **extra)
+
+
+# ---------- Inputs ----------
+
+def synthetic_frames(count: int, width: int = 640, height: int = 480, seed: int = 0):
+    """Deterministic frames: smooth gradients with a few filled shapes and sensor-like noise."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    frames = []
+    for i in range(count):
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[..., 0] = (xx * 255 // width + i * 17) % 256
+        frame[..., 1] = (yy * 255 // height + i * 31) % 256
+        frame[..., 2] = ((xx + yy) * 255 // (width + height)) % 256
+        for _ in range(4):
+            x, y = int(rng.integers(0, width - 80)), int(rng.integers(0, height - 80))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(frame, (x, y), (x + int(rng.integers(30, 80)), y + int(rng.integers(30, 80))), color, -1)
+        noise = rng.integers(-8, 9, frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def load_inputs(frame_paths, synthetic: int, width: int, height: int):
+    """Return [(label, jpeg bytes)] for recorded frames plus encoded synthetic frames."""
+    paths = [ROOT_DIR / "test.jpg"] if (ROOT_DIR / "test.jpg").exists() else []
+    for item in frame_paths or []:
+        p = Path(item)
+        paths.extend(sorted(p.glob("*.jpg")) if p.is_dir() else [p])
+    inputs = []
+    for p in paths:
+        try:
+            inputs.append((p.name, p.read_bytes()))
+        except OSError as e:
+            logging.warning(f"Skipping {p}: {e}")
+    for i, frame in enumerate(synthetic_frames(synthetic, width, height)):
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            inputs.append((f"synthetic_{i}", buf.tobytes()))
+    return inputs
+
+
+# ---------- Scenarios ----------
+
+def bench_stages(app, jpegs, args) -> dict:
+    """The process-frame stages (the app's own decode / downscale / encode helpers), each timed on its own."""
+    conf = app.current_metrics.get("confidence", 0.15)
+    target_width = app.browser_quality.get("imgsz")
+    quality = app.browser_quality.get("jpeg_quality")
+    decoded = []
+    for data in jpegs:
+        frame = app.decode_browser_frame(data, target_width)
+        # the upload's size (as process_browser_frame uses it), not the DCT-scaled one
+        decoded.append((frame, app.jpeg_size(data) or frame.shape[1::-1]))
+
+    def resize(item):
+        frame, (w, h) = item
+        small, buffer = app.downscale_browser_frame(frame, target_width, w, h)
+        if buffer is not None:
+            small = small.copy()
+            buffer.release()
+        return small
+
+    small = [resize(item) for item in decoded]
+    detections = [app.predict_browser_batch([f], conf)[0] for f in small]
+    renderer = app.annotation_renderer
+    drawn = [renderer.render(f, *d) for f, d in zip(small, detections)]
+    run = dict(iterations=args.iterations, warmup=args.warmup, trace=args.tracemalloc)
+
+    return {
+        "decode": timed(lambda b: app.decode_browser_frame(b, target_width), jpegs, **run),
+        "resize": timed(resize, decoded, **run),
+        "predict": timed(lambda f: app.predict_browser_batch([f], conf), small, **run),
+        "draw": timed(lambda fd: renderer.render(fd[0], *fd[1]), list(zip(small, detections)), **run),
+        "encode": timed(lambda f: app.safe_imencode_jpeg(f, quality), drawn, **run),
+    }
+
+
+def bench_process_frame(app, jpegs, args) -> dict:
+    """End-to-end POST /api/process-frame through the Flask test client, per response format."""
+    client = app.app.test_client()
+    results = {}
+    for fmt in ("jpeg", "json", "binary"):
+        errors = []
+
+        def post(data, fmt=fmt, errors=errors):
+            resp = client.post(f"/api/process-frame?format={fmt}",
+                               data={"frame": (io.BytesIO(data), "frame.jpg")},
+                               content_type="multipart/form-data")
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+            return resp.get_data()
+
+        results[fmt] = timed(post, jpegs, args.iterations, args.warmup, args.tracemalloc)
+        results[fmt]["errors"] = len(errors)
+    return results
+
+
+def bench_detection_loop(app, frames, args) -> dict:
+    """detection_loop's inference step feeding the real annotate/encode stage thread."""
+    published = threading.Event()
+    listener = lambda seq: published.set()  # noqa: E731
+    app.frame_broadcaster.add_listener(listener)
+    app.pipeline_timer.reset()
+    output_slot = app.LatestSlot(on_drop=lambda: app.pipeline_timer.record_drop("inference"))
+    annotate = threading.Thread(target=app._annotate_stage, args=(output_slot,), name="bench-annotate", daemon=True)
+    annotate.start()
+    conf = app.current_metrics.get("confidence", 0.15)
+    timeouts = []
+
+    def step(frame):
+        published.clear()
+        with app.pipeline_timer.time("inference"):
+            detections = app.inference_backend.predict([frame], conf=conf, iou=0.45, max_det=200)[0]
+        output_slot.put((frame, detections))
+        if not published.wait(timeout=5.0):
+            timeouts.append(1)
+
+    try:
+        result = timed(step, frames, args.iterations, args.warmup, args.tracemalloc)
+    finally:
+        output_slot.close()
+        annotate.join(timeout=2)
+        app.frame_broadcaster.remove_listener(listener)
+    result["timeouts"] = len(timeouts)
+    # per-stage split measured by the pipeline's own timer
+    result["pipeline"] = app.pipeline_timer.snapshot()
+    return result
+
+
+def bench_video_feed(app, frames, args) -> dict:
+    """
+    Publish annotated frames and time delivery through mjpeg_response to N concurrent viewers.
+    Latency is measured against the newest published frame when a viewer receives a chunk.
+    """
+    broadcaster = app.FrameBroadcaster(app.safe_imencode_jpeg, quality=app.frame_broadcaster.quality)
+    total = args.iterations
+    publish_times = {}
+    latencies = []
+    lock = threading.Lock()
+    ready = threading.Barrier(args.viewers + 1)
+
+    def viewer():
+        gen = iter(app.mjpeg_response(broadcaster).response)
+        received = 0
+        ready.wait()
+        try:
+            for chunk in gen:
+                t = time.perf_counter()
+                seq = broadcaster.latest()[0]
+                with lock:
+                    if seq in publish_times:
+                        latencies.append(t - publish_times[seq])
+                received += 1
+                if received >= total or stop.is_set():
+                    break
+        finally:
+            gen.close()
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=viewer, name=f"bench-viewer-{i}", daemon=True) for i in range(args.viewers)]
+    for t in threads:
+        t.start()
+    interval = 1.0 / args.feed_fps if args.feed_fps > 0 else 0.0
+
+    with MemorySampler(trace=args.tracemalloc) as mem:
+        ready.wait()
+        started = time.perf_counter()
+        encode_samples = []
+        for i in range(total):
+            t0 = time.perf_counter()
+            with lock:
+                # the sequence publish() is about to assign
+                publish_times[broadcaster.latest()[0] + 1] = t0
+            broadcaster.publish(frames[i % len(frames)])
+            encode_samples.append(time.perf_counter() - t0)
+            if interval:
+                time.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+        elapsed = time.perf_counter() - started
+        time.sleep(0.2)
+        stop.set()
+        # wake viewers still blocked waiting for a frame so they see the stop flag
+        broadcaster.publish(frames[0])
+        for t in threads:
+            t.join(timeout=2)
+
+    result = summarize(latencies, elapsed, mem, viewers=args.viewers, stream=broadcaster.stats())
+    result["throughput_per_s"] = round(total / elapsed, 2) if elapsed > 0 else 0.0
+    result["publish"] = summarize(encode_samples, elapsed, mem)
+    return result
+
+
+def bench_jpeg(app, jpegs, args, target_width: int = 320) -> dict:
+    """Decode to inference width and encode the response, per codec (baseline = full decode + resize)."""
+    from jpeg_codec import OpenCVCodec, TurboJPEGCodec
+
+    def shrink(frame):
+        h, w = frame.shape[:2]
+        if w <= target_width:
+            return frame
+        return cv2.resize(frame, (target_width, int(h * target_width / w)), interpolation=cv2.INTER_AREA)
+
+    run = dict(iterations=args.iterations, warmup=args.warmup, trace=args.tracemalloc)
+    small = [shrink(cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR)) for b in jpegs]
+    results = {
+        "baseline_decode_resize": timed(
+            lambda b: shrink(cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR)), jpegs, **run),
+        "baseline_encode": timed(
+            lambda f: cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes(), small, **run),
+    }
+    codecs = [OpenCVCodec()]
+    try:
+        codecs.append(TurboJPEGCodec())
+    except Exception as e:
+        logging.info(f"turbojpeg not benchmarked: {e}")
+    for codec in codecs:
+        results[f"{codec.name}_decode_resize"] = timed(
+            lambda b, c=codec: shrink(c.decode(b, min_width=target_width)), jpegs, **run)
+        results[f"{codec.name}_encode"] = timed(lambda f, c=codec: c.encode(f, 70), small, **run)
+    return results
+
+
+# ---------- Reporting ----------
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def flatten(results: dict, prefix: str = ""):
+    """Yield (name, stats) for every leaf result that has latency percentiles."""
+    for key, value in results.items():
+        if isinstance(value, dict) and "p50_ms" in value:
+            yield prefix + key, value
+        elif isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+
+
+def _fmt_mb(value) -> str:
+    return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def print_table(results: dict, baseline: dict = None):
+    base = dict(flatten(baseline["scenarios"])) if baseline else {}
+    print(f"{'stage':34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>9} {'rss MB':>8}")
+    for name, s in flatten(results):
+        line = (f"{name:34} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['p99_ms']:9.2f} "
+                f"{s['throughput_per_s']:9.1f} {_fmt_mb(s.get('peak_rss_mb'))}")
+        old = base.get(name)
+        if old and old.get("p50_ms"):
+            line += f"   p50 {100 * (s['p50_ms'] - old['p50_ms']) / old['p50_ms']:+.1f}%"
+            if old.get("p95_ms"):
+                line += f"  p95 {100 * (s['p95_ms'] - old['p95_ms']) / old['p95_ms']:+.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection hot paths")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--frames", nargs="*", help="extra JPEG files or folders (test.jpg is always used)")
+    parser.add_argument("--synthetic", type=int, default=8, help="number of synthetic frames")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--viewers", type=int, default=4, help="video-feed viewers")
+    parser.add_argument("--feed-fps", type=float, default=0.0, help="video-feed publish rate (0 = as fast as possible)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record Python allocation peaks (slower)")
+    parser.add_argument("--out", default=None, help="JSON results path (default: bench/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    t_import = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - t_import
+    if not app.ensure_model(timeout=None):
+        raise SystemExit("Model failed to load")
+
+    inputs = load_inputs(args.frames, args.synthetic, args.width, args.height)
+    if not inputs:
+        raise SystemExit("No input frames")
+    jpegs = [b for _, b in inputs]
+    frames = [cv2.imdecode(np.frombuffer(b, np.uint8), cv2.IMREAD_COLOR) for b in jpegs]
+
+    runners = {
+        "stages": lambda: bench_stages(app, jpegs, args),
+        "process-frame": lambda: bench_process_frame(app, jpegs, args),
+        "detection-loop": lambda: bench_detection_loop(app, frames, args),
+        "video-feed": lambda: bench_video_feed(app, frames, args),
+        "jpeg": lambda: bench_jpeg(app, jpegs, args),
+    }
+    results = {}
+    for name in scenarios:
+        logging.info(f"Running {name} ({args.iterations} iterations)")
+        results[name] = runners[name]()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "backend": app.inference_backend.info(),
+            "weights": str(app.model_weights_file),
+            "app_import_seconds": round(import_seconds, 2),
+            "startup": dict(app.startup_stats),
+            "inputs": [label for label, _ in inputs],
+            "args": vars(args),
+        },
+        "scenarios": results,
+    }
+
+    out = Path(args.out) if args.out else Path("bench") / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, default=str))
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_table(results, baseline)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Compact wire formats for detection results
+- JSON: {"width", "height", "detections": [{"box": [x1, y1, x2, y2], "conf", "class_id"}]}
+- Binary (little-endian), for clients that draw their own overlay:
+    header  : b"DET1" | uint16 width | uint16 height | uint32 count      (12 bytes)
+    boxes   : count x 4 float32 (x1, y1, x2, y2 in frame pixels)
+    scores  : count float32
+    classes : count uint16
+Class names are not repeated per frame; clients fetch the table once from /api/classes
+and compare its version with the X-Classes-Version response header.
+"""
+
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+BINARY_MAGIC = b"DET1"
+BINARY_MIMETYPE = "application/x-detections"
+_HEADER = struct.Struct("<4sHHI")
+
+
+def classes_table(names) -> dict:
+    """Class-name table plus a short content hash clients can use to cache it."""
+    if isinstance(names, dict):
+        names = [names[i] for i in sorted(names)]
+    names = list(names or [])
+    version = hashlib.sha1(json.dumps(names).encode()).hexdigest()[:12]
+    return {"version": version, "names": names}
+
+
+def detections_to_json(xyxy, confs, cls_ids, width: int, height: int) -> dict:
+    return {
+        "width": int(width),
+        "height": int(height),
+        "detections": [
+            {"box": [round(float(v), 1) for v in box], "conf": round(float(c), 3), "class_id": int(k)}
+            for box, c, k in zip(xyxy, confs, cls_ids)
+        ],
+    }
+
+
+def pack_detections(xyxy, confs, cls_ids, width: int, height: int) -> bytes:
+    n = len(cls_ids)
+    return b"".join((
+        _HEADER.pack(BINARY_MAGIC, int(width), int(height), n),
+        np.ascontiguousarray(xyxy, dtype="<f4").reshape(n, 4).tobytes(),
+        np.ascontiguousarray(confs, dtype="<f4").tobytes(),
+        np.ascontiguousarray(cls_ids, dtype="<u2").tobytes(),
+    ))
+
+
+def unpack_detections(payload: bytes):
+    """Inverse of pack_detections -> (xyxy, confs, cls_ids, width, height)."""
+    magic, width, height, n = _HEADER.unpack_from(payload, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError("not a detections payload")
+    offset = _HEADER.size
+    xyxy = np.frombuffer(payload, dtype="<f4", count=n * 4, offset=offset).reshape(n, 4)
+    offset += n * 16
+    confs = np.frombuffer(payload, dtype="<f4", count=n, offset=offset)
+    offset += n * 4
+    cls_ids = np.frombuffer(payload, dtype="<u2", count=n, offset=offset).astype(int)
+    return xyxy, confs, cls_ids, width, height
@@ -0,0 +1,122 @@
+"""
+Detection core shared by the API (app.py) and offline tools (batch_process.py)
+- Inference settings from the environment (backend, threads, export size, tensor input, quantization)
+- load_detector(): YOLO weights -> device -> inference backend + annotation renderer, the same
+  choices for every caller
+- get_color_for_class(): the per-class overlay palette
+- Importing this module has no side effects: no threads, no model, no torch import
+  (those happen inside load_detector)
+"""
+
+import logging
+import os
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from annotation_renderer import AnnotationRenderer
+from inference_backends import create_backend
+
+# Confidence threshold the API starts with (/api/confidence changes it at runtime)
+DEFAULT_CONFIDENCE = 0.15
+# Inference backend: torch (default), onnx or openvino; exported graphs are cached next to the weights
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0))  # 0 = runtime default
+EXPORT_IMGSZ = int(os.environ.get("EXPORT_IMGSZ", 640))
+# torch backend: letterbox once into a pooled square tensor and feed that to ultralytics (opt-in;
+# ultralytics' own rectangular letterbox is smaller, so the default passes frames)
+TORCH_TENSOR_INPUT = os.environ.get("TORCH_TENSOR_INPUT", "0").lower() in ("1", "true", "yes")
+# INFERENCE_BACKEND=onnx-int8 quantizes the ONNX export, calibrated from SAVED_FRAMES_DIR
+QUANT_MODE = os.environ.get("QUANT_MODE", "static")  # static | dynamic
+SAVED_FRAMES_DIR = Path(__file__).parent / "saved_frames"
+
+Detector = namedtuple("Detector", "model device weights_file backend renderer torch_import_seconds")
+
+
+def get_color_for_class(class_name: str):
+    """Return consistent BGR color for given class name."""
+    base_colors = {
+        "person": (255, 100, 100),
+        "car": (100, 255, 100),
+        "truck": (100, 200, 255),
+        "bus": (255, 100, 200),
+        "motorcycle": (200, 100, 255),
+        "bicycle": (100, 255, 255),
+    }
+    if class_name in base_colors:
+        return base_colors[class_name]
+    # deterministic hash-based color
+    h = abs(hash(class_name))
+    r = (h & 0xFF0000) >> 16
+    g = (h & 0x00FF00) >> 8
+    b = (h & 0x0000FF)
+    # brighten
+    r = min(255, r + 80)
+    g = min(255, g + 80)
+    b = min(255, b + 80)
+    return (b, g, r)
+
+
+def load_detector(weights_path: str = "yolov8m.pt", prefer_gpu: bool = True, backend: str = None) -> Detector:
+    """Load ultralytics YOLO, move it to the device (cuda if available) and build the inference backend; raises on failure."""
+    # heavy imports happen here, not at module import, so the web app can start first
+    t_import = time.perf_counter()
+    import torch
+    from ultralytics import YOLO
+    torch_import_seconds = round(time.perf_counter() - t_import, 2)
+
+    # Add safe globals for PyTorch 2.6+ compatibility
+    try:
+        import torch.serialization
+        # Allow ultralytics classes for torch.load
+        from ultralytics.nn.tasks import DetectionModel
+        torch.serialization.add_safe_globals([DetectionModel])
+    except Exception as safe_global_err:
+        logging.warning(f"Could not add safe globals (non-critical): {safe_global_err}")
+
+    # Determine weights to use: prefer env override, otherwise pick a smaller model on CPU
+    env_weights = os.environ.get('MODEL_WEIGHTS')
+    chosen_weights = env_weights if env_weights else weights_path
+    if not env_weights:
+        # If no GPU available and not explicitly set, use yolov8n (nano) for faster CPU inference
+        try:
+            if not torch.cuda.is_available() and weights_path == "yolov8m.pt":
+                chosen_weights = "yolov8n.pt"
+        except Exception:
+            # conservative fallback
+            pass
+
+    # Try loading model
+    try:
+        model = YOLO(chosen_weights)
+    except Exception as load_err:
+        # Fallback: Try downloading fresh weights if local file fails
+        logging.warning(f"Failed to load local weights ({chosen_weights}), trying to download: {load_err}")
+        # Try to fallback to nano model for reliability
+        try:
+            model = YOLO("yolov8n.pt")
+        except Exception:
+            model = YOLO("yolov8m.pt")
+
+    # choose device
+    if prefer_gpu and torch.cuda.is_available():
+        device = "cuda"
+    else:
+        device = "cpu"
+
+    # move model to device if supported
+    try:
+        model.to(device)
+    except Exception:
+        # some ultralytics versions handle device in predict call; ignore if .to not supported
+        pass
+
+    # wrap in the configured backend (exports to ONNX/OpenVINO once if requested)
+    weights_file = getattr(model, "ckpt_path", None) or chosen_weights
+    inference_backend = create_backend(backend or INFERENCE_BACKEND, model, weights_file,
+                                       device=device, threads=INFERENCE_THREADS, imgsz=EXPORT_IMGSZ,
+                                       calibration_dir=SAVED_FRAMES_DIR, quant_mode=QUANT_MODE,
+                                       tensor_input=TORCH_TENSOR_INPUT)
+    renderer = AnnotationRenderer(inference_backend.names, get_color_for_class)
+    logging.info(f"Model loaded ({chosen_weights}) on device: {device}, backend: {inference_backend.name}")
+    return Detector(model, device, weights_file, inference_backend, renderer, torch_import_seconds)
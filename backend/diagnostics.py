@@ -0,0 +1,139 @@
+"""
+Sampled, asynchronous diagnostics for the frame-processing hot path
+- Off by default: every hook returns after a single flag check
+- When on, a sample of uploads is kept in an in-memory ring buffer (last N only)
+- Log lines go through a bounded queue to a background writer thread (dropped when full)
+  and the log file is rotated once it reaches max_log_bytes
+- dump() writes the ring buffer to disk on demand
+"""
+
+import json
+import logging
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+
+class DiagnosticsRecorder:
+    """Bounded, mostly-free debug capture for process-frame requests."""
+
+    def __init__(self, log_path, dump_dir, enabled: bool = False, sample_rate: float = 0.1,
+                 ring_size: int = 20, max_log_bytes: int = 5 * 1024 * 1024, queue_size: int = 1000):
+        self.log_path = Path(log_path)
+        self.dump_dir = Path(dump_dir)
+        self.enabled = bool(enabled)
+        self.sample_rate = float(sample_rate)
+        self.max_log_bytes = int(max_log_bytes)
+        self._uploads = deque(maxlen=max(1, int(ring_size)))
+        self._uploads_lock = threading.Lock()
+        self._lines = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.sampled = 0
+        self.log_lines_dropped = 0
+
+    # ---------- configuration ----------
+
+    def configure(self, enabled: bool = None, sample_rate: float = None, ring_size: int = None):
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if ring_size is not None:
+            with self._uploads_lock:
+                self._uploads = deque(self._uploads, maxlen=max(1, int(ring_size)))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if self.enabled:
+            self._ensure_writer()
+
+    # ---------- hot-path hooks ----------
+
+    def should_sample(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def record_upload(self, image_bytes: bytes, source: str = None, **info):
+        """Keep a sampled upload (bytes + timing/detection info) in the ring buffer."""
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "source": source,
+            "size": len(image_bytes),
+            **info,
+        }
+        with self._uploads_lock:
+            self._uploads.append((entry, bytes(image_bytes)))
+            self.sampled += 1
+
+    def log(self, message: str):
+        """Queue a line for the background writer; never blocks the caller."""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._lines.put_nowait(f"{datetime.now().isoformat()} - {message}\n")
+        except queue.Full:
+            self.log_lines_dropped += 1
+
+    # ---------- background writer ----------
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="diagnostics-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            line = self._lines.get()
+            batch = [line]
+            # drain whatever else is queued so one open/write covers many lines
+            while len(batch) < 500:
+                try:
+                    batch.append(self._lines.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.log_path.exists() and self.log_path.stat().st_size >= self.max_log_bytes:
+                    self.log_path.replace(self.log_path.with_suffix(self.log_path.suffix + ".1"))
+                with open(self.log_path, "a") as lf:
+                    lf.writelines(batch)
+            except Exception as e:
+                logging.warning(f"Diagnostics writer failed: {e}")
+
+    # ---------- inspection ----------
+
+    def uploads(self) -> list:
+        with self._uploads_lock:
+            return [dict(entry) for entry, _ in self._uploads]
+
+    def dump(self) -> dict:
+        """Write the ring buffer (images + index.json) to a fresh folder under dump_dir."""
+        with self._uploads_lock:
+            items = list(self._uploads)
+        target = self.dump_dir / datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        target.mkdir(parents=True, exist_ok=True)
+        index = []
+        for i, (entry, data) in enumerate(items):
+            fname = f"upload_{i:03d}.jpg"
+            (target / fname).write_bytes(data)
+            index.append({**entry, "file": fname})
+        (target / "index.json").write_text(json.dumps(index, indent=2))
+        return {"path": str(target), "count": len(index)}
+
+    def stats(self) -> dict:
+        with self._uploads_lock:
+            buffered = len(self._uploads)
+            capacity = self._uploads.maxlen
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "ring_size": capacity,
+            "buffered_uploads": buffered,
+            "sampled_total": self.sampled,
+            "log_queue": self._lines.qsize(),
+            "log_lines_dropped": self.log_lines_dropped,
+            "log_path": str(self.log_path),
+        }
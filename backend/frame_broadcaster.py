@@ -0,0 +1,113 @@
+"""
+Encode-once JPEG broadcaster for MJPEG viewers
+- publish() encodes each new annotated frame a single time and bumps a sequence number
+- viewers block on a condition for the next sequence number instead of polling
+- JPEG cost stays flat no matter how many clients watch the stream
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class FrameBroadcaster:
+    """Holds the latest (sequence, frame, jpeg) and wakes waiting viewers on publish."""
+
+    def __init__(self, encoder, quality: int = 85):
+        # encoder(frame, quality) -> bytes or None
+        self._encoder = encoder
+        self.quality = quality
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._frame = None
+        self._jpeg = None
+        self._listeners = []
+
+        # stats (guarded by _cond)
+        self._encodes = 0
+        self._viewers = 0
+        self._frames_sent = 0
+
+    def publish(self, frame, jpeg: bytes = None) -> int:
+        """
+        Publish a new frame. Pass jpeg when the caller already encoded it;
+        otherwise it is encoded here once for all viewers.
+        """
+        if jpeg is None:
+            jpeg = self._encoder(frame, self.quality)
+            if jpeg is None:
+                return self._seq
+            encoded = True
+        else:
+            encoded = False
+
+        with self._cond:
+            self._seq += 1
+            self._frame = frame
+            self._jpeg = jpeg
+            if encoded:
+                self._encodes += 1
+            seq = self._seq
+            listeners = list(self._listeners)
+            self._cond.notify_all()
+
+        for listener in listeners:
+            listener(seq)
+        return seq
+
+    def latest(self):
+        """Return (seq, frame, jpeg) of the newest published frame."""
+        with self._cond:
+            return self._seq, self._frame, self._jpeg
+
+    def wait_next(self, last_seq: int, timeout: float = 1.0):
+        """Block until a frame newer than last_seq exists; returns (seq, jpeg) or (last_seq, None) on timeout."""
+        with self._cond:
+            if self._seq <= last_seq or self._jpeg is None:
+                self._cond.wait_for(lambda: self._seq > last_seq and self._jpeg is not None, timeout)
+            return self._take_locked(last_seq)
+
+    def poll(self, last_seq: int):
+        """Non-blocking wait_next for async viewers (woken through add_listener instead)."""
+        with self._cond:
+            return self._take_locked(last_seq)
+
+    def _take_locked(self, last_seq: int):
+        if self._seq <= last_seq or self._jpeg is None:
+            return last_seq, None
+        self._frames_sent += 1
+        return self._seq, self._jpeg
+
+    def add_listener(self, callback):
+        """Register callback(seq) invoked after every publish (used by non-threaded consumers)."""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def has_viewers(self) -> bool:
+        with self._cond:
+            return self._viewers > 0 or bool(self._listeners)
+
+    @contextmanager
+    def viewer(self):
+        """Track a connected viewer for the lifetime of its stream."""
+        with self._cond:
+            self._viewers += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._viewers -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "sequence": self._seq,
+                "encodes": self._encodes,
+                "viewers": self._viewers,
+                "frames_sent": self._frames_sent,
+                "quality": self.quality,
+            }
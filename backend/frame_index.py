@@ -0,0 +1,196 @@
+"""
+SQLite index of saved frames with a thumbnail cache
+- One row per saved JPEG (size, time, dimensions, detection counts), so listing is an
+  indexed query instead of a glob + sort + stat of every file
+- Cursor pagination on (created, filename), newest first; cursors stay valid while frames are added
+- A revision counter bumps on every change and feeds the list ETag (304 on unchanged polls)
+- Thumbnails are written at save time (from the in-memory frame) into thumbs/; frames found
+  on disk without one get theirs during sync()
+- sync() reconciles the index with the folder; list calls run it only when the folder's
+  mtime changed (files copied in or deleted by hand)
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+import cv2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    filename TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    object_count INTEGER,
+    detections TEXT
+);
+CREATE INDEX IF NOT EXISTS frames_created ON frames (created DESC, filename DESC);
+"""
+
+
+def encode_cursor(created: float, filename: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created, filename]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, filename = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(created), str(filename)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class FrameIndex:
+    """Index + thumbnail cache for the *.jpg files directly inside frames_dir."""
+
+    def __init__(self, frames_dir: Path, db_path: Path = None, thumbs_dir: Path = None,
+                 thumb_width: int = 240, thumb_quality: int = 75):
+        self.frames_dir = Path(frames_dir)
+        self.db_path = Path(db_path or self.frames_dir / "index.sqlite3")
+        self.thumbs_dir = Path(thumbs_dir or self.frames_dir / "thumbs")
+        self.thumb_width = thumb_width
+        self.thumb_quality = thumb_quality
+        self.thumbs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        # ETags only need to be unique per process lifetime + change count
+        self._generation = uuid.uuid4().hex[:8]
+        self.revision = 0
+        self._dir_mtime = None
+
+    # ---------- thumbnails ----------
+
+    def thumbnail_path(self, filename: str) -> Path:
+        return self.thumbs_dir / f"{Path(filename).stem}.jpg"
+
+    def write_thumbnail(self, filename: str, frame=None) -> Path:
+        """Create (or overwrite) the thumbnail; decodes the saved file when no frame is given."""
+        if frame is None:
+            frame = cv2.imread(str(self.frames_dir / filename), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise FileNotFoundError(filename)
+        h, w = frame.shape[:2]
+        if w > self.thumb_width:
+            frame = cv2.resize(frame, (self.thumb_width, max(1, round(h * self.thumb_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        path = self.thumbnail_path(filename)
+        cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, self.thumb_quality])
+        return path
+
+    def ensure_thumbnail(self, filename: str) -> Path:
+        path = self.thumbnail_path(filename)
+        if not path.exists():
+            self.write_thumbnail(filename)
+        return path
+
+    # ---------- changes ----------
+
+    def add(self, filename: str, frame=None, detections: dict = None):
+        """Index a newly saved file; frame (the image just written) is used for the thumbnail."""
+        st = (self.frames_dir / filename).stat()
+        h, w = frame.shape[:2] if frame is not None else (None, None)
+        detections = {k: v for k, v in (detections or {}).items() if v}
+        try:
+            self.write_thumbnail(filename, frame)
+        except Exception as e:
+            logging.warning(f"Thumbnail for {filename} failed: {e}")
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (filename, st.st_mtime, st.st_size, w, h, sum(detections.values()), json.dumps(detections)))
+            self._db.commit()
+            self._changed()
+
+    def remove(self, filename: str):
+        self.thumbnail_path(filename).unlink(missing_ok=True)
+        with self._lock:
+            self._db.execute("DELETE FROM frames WHERE filename = ?", (filename,))
+            self._db.commit()
+            self._changed()
+
+    def _changed(self):
+        self.revision += 1
+        # our own writes also touch the folder mtime; don't let that trigger a rescan
+        self._dir_mtime = os.stat(self.frames_dir).st_mtime_ns
+
+    def sync(self) -> dict:
+        """Reconcile with the folder: index new files (and thumbnail them), drop rows of deleted ones."""
+        with self._lock:
+            mtime = os.stat(self.frames_dir).st_mtime_ns
+            on_disk = {e.name: e for e in os.scandir(self.frames_dir)
+                       if e.is_file() and e.name.lower().endswith(".jpg")}
+            indexed = {row[0] for row in self._db.execute("SELECT filename FROM frames")}
+        added = sorted(set(on_disk) - indexed)
+        removed = sorted(indexed - set(on_disk))
+        rows = []
+        for name in added:
+            st = on_disk[name].stat()
+            rows.append((name, st.st_mtime, st.st_size, None, None, None, None))
+            try:
+                self.ensure_thumbnail(name)
+            except Exception as e:
+                logging.warning(f"Thumbnail for {name} failed: {e}")
+        with self._lock:
+            if rows:
+                # OR IGNORE: a concurrent add() has the better row (dimensions + detections)
+                self._db.executemany("INSERT OR IGNORE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            if removed:
+                self._db.executemany("DELETE FROM frames WHERE filename = ?", [(n,) for n in removed])
+            self._db.commit()
+            if rows or removed:
+                self.revision += 1
+            self._dir_mtime = mtime
+        for name in removed:
+            self.thumbnail_path(name).unlink(missing_ok=True)
+        if added or removed:
+            logging.info(f"Saved-frames index: {len(added)} added, {len(removed)} removed")
+        return {"added": len(added), "removed": len(removed)}
+
+    def sync_if_changed(self):
+        try:
+            mtime = os.stat(self.frames_dir).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._dir_mtime:
+            self.sync()
+
+    # ---------- queries ----------
+
+    def etag(self, *parts) -> str:
+        """Unquoted (weak) entity tag for the current revision, qualified by query parts."""
+        return "-".join([self._generation, str(self.revision)] + [str(p) for p in parts if p is not None])
+
+    def page(self, limit: int = 50, cursor: str = None):
+        """Newest-first page of rows (dicts) plus the cursor of the next page (None at the end)."""
+        query = "SELECT * FROM frames"
+        args = []
+        if cursor:
+            created, filename = decode_cursor(cursor)
+            query += " WHERE (created < ?) OR (created = ? AND filename < ?)"
+            args += [created, created, filename]
+        query += " ORDER BY created DESC, filename DESC LIMIT ?"
+        args.append(limit + 1)
+        with self._lock:
+            rows = [dict(r) for r in self._db.execute(query, args)]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created"], rows[-1]["filename"])
+        for row in rows:
+            row["detections"] = json.loads(row["detections"]) if row["detections"] else None
+        return rows, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
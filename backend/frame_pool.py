@@ -0,0 +1,181 @@
+"""
+Preallocated frame buffers and zero-copy frame snapshots
+- FramePool hands out reference-counted buffers per shape; released buffers are reused,
+  so a steady stream (1080p included) stops allocating after the first few frames
+- cap.read(buffer.array) and cv2.resize(..., dst=buffer.array) fill buffers in place
+- SnapshotPublisher holds the latest frame as an immutable, versioned snapshot; readers
+  retain it instead of copying, and the buffer goes back to the pool once the snapshot
+  is replaced and every reader released it
+- Pools count allocations, reuses and bytes copied so /api/frame-pool can show per-frame costs
+
+Buffers that are never released are simply garbage-collected (the pool keeps no reference
+to buffers in use), so an error path that forgets release() costs an allocation, not a leak.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class FrameBuffer:
+    """A pooled ndarray plus reference count. The creator holds the first reference."""
+
+    __slots__ = ("array", "_pool", "_refs")
+
+    def __init__(self, array: np.ndarray, pool=None):
+        self.array = array
+        self._pool = pool
+        self._refs = 1
+
+    def retain(self):
+        if self._pool is None:
+            return self
+        with self._pool._lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        if self._pool is None:
+            return
+        with self._pool._lock:
+            self._refs -= 1
+            if self._refs == 0:
+                self._pool._recycle_locked(self)
+
+
+class FramePool:
+    """Free lists of same-shape buffers; keeps at most max_free idle buffers per shape."""
+
+    def __init__(self, name: str, max_free: int = 4):
+        self.name = name
+        self.max_free = max_free
+        self._lock = threading.Lock()
+        self._free = {}
+        self.frames = 0
+        self.allocations = 0
+        self.bytes_allocated = 0
+        self.reuses = 0
+        self.copies = 0
+        self.bytes_copied = 0
+
+    def acquire(self, shape, dtype=np.uint8) -> FrameBuffer:
+        """A buffer of exactly this shape (contents undefined), reused when one is free."""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            self.frames += 1
+            free = self._free.get(key)
+            if free:
+                buffer = free.pop()
+                buffer._refs = 1
+                self.reuses += 1
+                return buffer
+            self.allocations += 1
+        array = np.empty(shape, dtype=dtype)
+        with self._lock:
+            self.bytes_allocated += array.nbytes
+        return FrameBuffer(array, self)
+
+    def adopt(self, array: np.ndarray) -> FrameBuffer:
+        """Wrap an array allocated elsewhere (e.g. by OpenCV); it joins the pool when released."""
+        with self._lock:
+            self.allocations += 1
+            self.bytes_allocated += array.nbytes
+        return FrameBuffer(array, self)
+
+    def record_copy(self, nbytes: int):
+        with self._lock:
+            self.copies += 1
+            self.bytes_copied += int(nbytes)
+
+    def _recycle_locked(self, buffer: FrameBuffer):
+        key = (buffer.array.shape, buffer.array.dtype.str)
+        free = self._free.setdefault(key, [])
+        if len(free) < self.max_free:
+            free.append(buffer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            frames = max(self.frames, 1)
+            return {
+                "frames": self.frames,
+                "allocations": self.allocations,
+                "bytes_allocated": self.bytes_allocated,
+                "reuses": self.reuses,
+                "copies": self.copies,
+                "bytes_copied": self.bytes_copied,
+                "allocations_per_frame": round(self.allocations / frames, 4),
+                "bytes_copied_per_frame": round(self.bytes_copied / frames, 1),
+                "free_buffers": sum(len(v) for v in self._free.values()),
+            }
+
+
+class FrameSnapshot:
+    """
+    One published frame: read-only view, version and the detections that go with it.
+    Use as a context manager (or call release()) when obtained from SnapshotPublisher.acquire().
+    """
+
+    __slots__ = ("version", "frame", "detections", "published_at", "_buffer")
+
+    def __init__(self, version: int, buffer: FrameBuffer, detections, published_at: float):
+        self.version = version
+        self._buffer = buffer
+        self.frame = buffer.array.view()
+        self.frame.flags.writeable = False
+        self.detections = detections
+        self.published_at = published_at
+
+    def _retained(self):
+        self._buffer.retain()
+        return self
+
+    def release(self):
+        self._buffer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SnapshotPublisher:
+    """Latest-frame holder: publish() swaps the snapshot, acquire() hands out a retained reference."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def publish(self, frame, detections=None) -> int:
+        """
+        Publish a FrameBuffer (ownership of the caller's reference moves to the publisher) or a
+        plain ndarray the caller will no longer write to. detections are kept alongside the frame.
+        """
+        buffer = frame if isinstance(frame, FrameBuffer) else FrameBuffer(frame)
+        with self._lock:
+            self._version += 1
+            previous = self._snapshot
+            self._snapshot = FrameSnapshot(self._version, buffer, detections, time.time())
+            version = self._version
+        if previous is not None:
+            previous.release()
+        return version
+
+    def acquire(self):
+        """The current snapshot with a reference held for the caller, or None before the first publish."""
+        with self._lock:
+            if self._snapshot is None:
+                return None
+            return self._snapshot._retained()
+
+    def clear(self):
+        with self._lock:
+            previous, self._snapshot = self._snapshot, None
+        if previous is not None:
+            previous.release()
@@ -0,0 +1,351 @@
+"""
+Pluggable inference backends for the YOLO detector
+- torch:    ultralytics YOLO graph (default, CPU or CUDA)
+- onnx:     weights exported once to ONNX and run through ONNX Runtime
+- openvino: weights exported once to OpenVINO IR and run through OpenVINO Runtime
+- onnx-int8: the ONNX export quantized to INT8 (see quantization.py)
+Exported backends letterbox each frame once into a pooled input tensor (preprocess.py); the
+torch backend does so only with tensor_input, otherwise ultralytics letterboxes itself.
+Exported files are cached next to the weights. Every backend returns one
+(xyxy Nx4, conf N, cls N) tuple of numpy arrays per frame, in the frame's own
+pixel coordinates, so callers don't need to know which backend is running.
+"""
+
+import ast
+import logging
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+from instrumentation import BACKEND_STAGE_SECONDS
+from preprocess import Preprocessor, unletterbox
+
+# offset added per class id so a single NMS call never suppresses across classes
+_CLASS_OFFSET = 7680.0
+# cap on candidates fed into NMS (same as ultralytics' max_nms)
+_MAX_NMS = 30000
+# input stride of the YOLOv8 graphs; tensor sides must be a multiple of it
+_STRIDE = 32
+# preprocess_batch() hands its tensors to the caller, so only the resize scratch is pooled
+_STANDALONE = Preprocessor(FramePool("preprocess-standalone"))
+
+
+def empty_detections():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32), np.zeros((0,), dtype=int)
+
+
+def boxes_to_arrays(boxes):
+    """Convert ultralytics Boxes to (xyxy Nx4, conf N, cls N) numpy arrays."""
+    if boxes is None or len(boxes) == 0:
+        return empty_detections()
+    xyxy = boxes.xyxy.cpu().numpy() if hasattr(boxes.xyxy, "cpu") else np.array(boxes.xyxy)
+    confs = boxes.conf.cpu().numpy() if hasattr(boxes.conf, "cpu") else np.array(boxes.conf)
+    cls_ids = boxes.cls.cpu().numpy().astype(int) if hasattr(boxes.cls, "cpu") else np.array(boxes.cls).astype(int)
+    return xyxy, confs, cls_ids
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between xyxy boxes a (N x 4) and b (M x 4) -> N x M."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+# ---------- Pre / post processing for exported graphs ----------
+
+def preprocess_batch(frames, size: int):
+    """Letterbox BGR frames into a new float32 RGB NCHW tensor scaled to [0, 1] (see preprocess.py)."""
+    tensor = np.empty((len(frames), 3, size, size), dtype=np.float32)
+    return tensor, _STANDALONE.fill(tensor, frames, size)
+
+
+def postprocess(raw: np.ndarray, metas, conf: float, iou: float, max_det: int):
+    """
+    Decode raw YOLOv8 output (B, 4 + num_classes, N) into per-frame detections:
+    confidence filter, class-aware NMS, then undo the letterbox.
+    """
+    outputs = []
+    for pred, meta in zip(raw, metas):
+        pred = pred.T  # (N, 4 + nc)
+        scores = pred[:, 4:]
+        cls_ids = scores.argmax(axis=1)
+        confs = scores[np.arange(len(scores)), cls_ids]
+        keep = confs >= conf
+        if not keep.any():
+            outputs.append(empty_detections())
+            continue
+        boxes, confs, cls_ids = pred[keep, :4], confs[keep], cls_ids[keep]
+        if len(confs) > _MAX_NMS:
+            top = np.argsort(-confs)[:_MAX_NMS]
+            boxes, confs, cls_ids = boxes[top], confs[top], cls_ids[top]
+
+        # cx, cy, w, h -> x, y, w, h (top-left) with class offset for NMS
+        nms_boxes = boxes.copy()
+        nms_boxes[:, 0] = boxes[:, 0] - boxes[:, 2] / 2 + cls_ids * _CLASS_OFFSET
+        nms_boxes[:, 1] = boxes[:, 1] - boxes[:, 3] / 2 + cls_ids * _CLASS_OFFSET
+        idx = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confs.tolist(), conf, iou)
+        idx = np.array(idx, dtype=int).reshape(-1)[:max_det]
+
+        boxes, confs, cls_ids = boxes[idx], confs[idx], cls_ids[idx]
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+        unletterbox(xyxy, meta)
+        outputs.append((xyxy.astype(np.float32), confs.astype(np.float32), cls_ids.astype(int)))
+    return outputs
+
+
+def _parse_names(value):
+    """Parse a class-name table stored as a dict literal (ultralytics export metadata)."""
+    if isinstance(value, dict):
+        return {int(k): v for k, v in value.items()}
+    try:
+        return {int(k): v for k, v in ast.literal_eval(value).items()}
+    except Exception:
+        return None
+
+
+# ---------- Backends ----------
+
+class InferenceBackend:
+    """Common interface: predict(frames, ...) -> list of (xyxy, conf, cls) arrays per frame."""
+
+    name = "base"
+
+    def __init__(self, names):
+        self.names = names
+
+    def predict(self, frames, conf: float = 0.25, iou: float = 0.45, imgsz: int = 640, max_det: int = 300):
+        raise NotImplementedError
+
+    def info(self) -> dict:
+        return {"backend": self.name}
+
+
+class TorchBackend(InferenceBackend):
+    """
+    Runs the ultralytics YOLO model. With tensor_input, frames are letterboxed once into a
+    pooled NCHW tensor (preprocess.py) and ultralytics starts from that tensor instead of
+    letterboxing and converting each frame again; boxes are mapped back here. The tensor is
+    square (imgsz x imgsz) while ultralytics letterboxes to a smaller stride-aligned rectangle,
+    so tensor input costs more compute on wide frames and boxes can differ slightly; it is off
+    by default.
+    """
+
+    name = "torch"
+
+    def __init__(self, yolo, device: str = "cpu", tensor_input: bool = False):
+        super().__init__(yolo.names)
+        self.model = yolo
+        self.device = device
+        self.tensor_input = tensor_input
+        self.preprocessor = Preprocessor(FramePool(f"{self.name}-input"))
+        # ultralytics predictors are not thread-safe; serialize callers
+        self._lock = threading.Lock()
+
+    def _predict(self, source, conf, iou, imgsz, max_det):
+        with self._lock:
+            try:
+                results = self.model.predict(source, conf=conf, iou=iou, imgsz=imgsz, max_det=max_det,
+                                             device=self.device, verbose=False)
+            except TypeError:
+                # Some ultralytics versions have different argument names - fallback
+                results = self.model.predict(source, conf=conf, device=self.device, verbose=False)
+        # ultralytics times its own stages (ms per image); fold them into the shared histograms
+        for res in results:
+            for stage, ms in (getattr(res, "speed", None) or {}).items():
+                if ms is not None:
+                    BACKEND_STAGE_SECONDS.labels(self.name, stage).observe(ms / 1000.0)
+        return [boxes_to_arrays(res.boxes) for res in results]
+
+    def predict(self, frames, conf=0.25, iou=0.45, imgsz=640, max_det=300):
+        if not self.tensor_input:
+            return self._predict(frames, conf, iou, imgsz, max_det)
+        if not frames:
+            return []
+        import torch
+
+        size = int(np.ceil(imgsz / _STRIDE) * _STRIDE)
+        with BACKEND_STAGE_SECONDS.labels(self.name, "letterbox").time():
+            buffer, metas = self.preprocessor(frames, size)
+        try:
+            # from_numpy shares the pooled memory; results are converted before it is released
+            outputs = self._predict(torch.from_numpy(buffer.array), conf, iou, size, max_det)
+        finally:
+            buffer.release()
+        return [(unletterbox(xyxy, meta), confs, cls_ids) for (xyxy, confs, cls_ids), meta in zip(outputs, metas)]
+
+    def info(self):
+        return {"backend": self.name, "device": self.device, "tensor_input": self.tensor_input}
+
+
+class _ExportedGraphBackend(InferenceBackend):
+    """Shared letterbox/NMS logic for graphs exported from the ultralytics model."""
+
+    def __init__(self, names, path: Path, threads: int, static_size=None, static_batch=None):
+        super().__init__(names)
+        self.path = Path(path)
+        self.threads = threads
+        self.static_size = static_size
+        self.static_batch = static_batch
+        self.preprocessor = Preprocessor(FramePool(f"{self.name}-input"))
+
+    def _run(self, tensor: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict(self, frames, conf=0.25, iou=0.45, imgsz=640, max_det=300):
+        if not frames:
+            return []
+        size = self.static_size or int(np.ceil(imgsz / _STRIDE) * _STRIDE)
+        with BACKEND_STAGE_SECONDS.labels(self.name, "preprocess").time():
+            buffer, metas = self.preprocessor(frames, size)
+        try:
+            tensor = buffer.array
+            with BACKEND_STAGE_SECONDS.labels(self.name, "inference").time():
+                if self.static_batch:
+                    raw = np.concatenate([self._run(tensor[i:i + self.static_batch])
+                                          for i in range(0, len(frames), self.static_batch)])
+                else:
+                    raw = self._run(tensor)
+        finally:
+            buffer.release()
+        with BACKEND_STAGE_SECONDS.labels(self.name, "postprocess").time():
+            return postprocess(raw, metas, conf, iou, max_det)
+
+    def info(self):
+        return {"backend": self.name, "path": str(self.path), "threads": self.threads,
+                "static_size": self.static_size, "static_batch": self.static_batch}
+
+
+class OnnxBackend(_ExportedGraphBackend):
+    """ONNX Runtime CPU session with a configurable intra-op thread count."""
+
+    name = "onnx"
+
+    def __init__(self, onnx_path, threads: int = 0, names=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(threads)  # 0 lets ORT pick physical cores
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(onnx_path), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        batch, _, height, _ = inp.shape
+        meta_names = _parse_names(self.session.get_modelmeta().custom_metadata_map.get("names", ""))
+        super().__init__(meta_names or names, onnx_path, threads,
+                         static_size=height if isinstance(height, int) else None,
+                         static_batch=batch if isinstance(batch, int) else None)
+
+    def _run(self, tensor):
+        return self.session.run(None, {self.input_name: tensor})[0]
+
+
+class OpenVinoBackend(_ExportedGraphBackend):
+    """OpenVINO Runtime CPU plugin with a configurable inference thread count."""
+
+    name = "openvino"
+
+    def __init__(self, xml_path, threads: int = 0, names=None):
+        from openvino.runtime import Core
+
+        core = Core()
+        config = {"INFERENCE_NUM_THREADS": str(int(threads))} if threads else {}
+        ov_model = core.read_model(str(xml_path))
+        shape = ov_model.input(0).get_partial_shape()
+        batch = shape[0].get_length() if shape[0].is_static else None
+        size = shape[2].get_length() if shape[2].is_static else None
+        self.compiled = core.compile_model(ov_model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        meta_names = None
+        meta_file = Path(xml_path).parent / "metadata.yaml"
+        if meta_file.exists():
+            try:
+                import yaml
+                meta_names = _parse_names(yaml.safe_load(meta_file.read_text()).get("names", {}))
+            except Exception:
+                pass
+        super().__init__(meta_names or names, xml_path, threads, static_size=size, static_batch=batch)
+
+    def _run(self, tensor):
+        return self.compiled([tensor])[self.output]
+
+
+# ---------- Export cache & factory ----------
+
+def exported_path(weights_file, kind: str) -> Path:
+    """Where the exported graph for weights_file is cached."""
+    weights = Path(weights_file)
+    if kind == "onnx":
+        return weights.with_suffix(".onnx")
+    if kind == "openvino":
+        return weights.parent / f"{weights.stem}_openvino_model" / f"{weights.stem}.xml"
+    raise ValueError(f"unknown export format: {kind}")
+
+
+def export_weights(weights_file, kind: str, imgsz: int = 640) -> Path:
+    """Export weights to ONNX / OpenVINO IR once and reuse the cached file afterwards."""
+    target = exported_path(weights_file, kind)
+    if target.exists():
+        return target
+
+    from ultralytics import YOLO
+
+    logging.info(f"Exporting {weights_file} to {kind} (imgsz={imgsz}) ...")
+    t0 = time.time()
+    # ONNX gets dynamic batch/spatial axes so batched and downscaled inputs work
+    exported = YOLO(str(weights_file)).export(format=kind, imgsz=imgsz, dynamic=(kind == "onnx"))
+    exported = Path(exported)
+    if exported.is_dir():
+        exported = next(exported.glob("*.xml"))
+    if exported.resolve() != target.resolve():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        exported.replace(target)
+        if kind == "openvino":
+            bin_file = exported.with_suffix(".bin")
+            if bin_file.exists():
+                bin_file.replace(target.with_suffix(".bin"))
+    logging.info(f"Exported {target} in {time.time() - t0:.1f}s")
+    return target
+
+
+def create_backend(kind: str, yolo, weights_file, device: str = "cpu", threads: int = 0,
+                   imgsz: int = 640, calibration_dir=None, quant_mode: str = "static",
+                   tensor_input: bool = False) -> InferenceBackend:
+    """Build the requested backend; falls back to the torch path if export/runtime is unavailable."""
+    kind = (kind or "torch").lower()
+    if kind == "torch" or device != "cpu":
+        return TorchBackend(yolo, device, tensor_input=tensor_input)
+    try:
+        if kind == "onnx-int8":
+            from quantization import quantize_onnx
+
+            fp32_path = export_weights(weights_file, "onnx", imgsz=imgsz)
+            int8_path = quantize_onnx(fp32_path, calibration_dir, mode=quant_mode, imgsz=imgsz)
+            backend = OnnxBackend(int8_path, threads=threads, names=yolo.names)
+            backend.name = "onnx-int8"
+            return backend
+        path = export_weights(weights_file, kind, imgsz=imgsz)
+        if kind == "onnx":
+            return OnnxBackend(path, threads=threads, names=yolo.names)
+        if kind == "openvino":
+            return OpenVinoBackend(path, threads=threads, names=yolo.names)
+        raise ValueError(f"unknown inference backend: {kind}")
+    except Exception:
+        logging.exception(f"Could not initialize {kind} backend, falling back to torch")
+        return TorchBackend(yolo, device, tensor_input=tensor_input)
@@ -0,0 +1,200 @@
+"""
+Micro-batching inference scheduler
+- Collects frames submitted by concurrent requests into a single batch
+- Flushes when the batch is full or the oldest frame has waited max_wait_ms
+- Runs one predict call per batch on a dedicated worker thread (or `concurrency`
+  threads when predict_fn can serve several batches at once, e.g. a worker pool)
+- Hands each per-frame result back to the request waiting for it
+- Tracks queue depth, batch size and wait/predict timings for tuning
+- Only requests in flight at the same time can share a batch, so the server must handle
+  requests concurrently (gunicorn --threads N, or the ASGI mode); under a single sync
+  worker every batch holds one frame
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from instrumentation import BATCH_SIZE, BATCH_WAIT_SECONDS, FRAMES_DROPPED, QUEUE_DEPTH
+
+
+class _PendingFrame:
+    """A frame waiting in the batch queue together with its reply slot."""
+
+    __slots__ = ("frame", "conf", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, frame, conf):
+        self.frame = frame
+        self.conf = conf
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    """
+    Batch frames from concurrent callers into one predict call.
+
+    predict_fn(frames, conf) must return one (xyxy, confs, cls_ids) tuple per
+    frame. The batch runs at the lowest confidence requested by its members and
+    each caller's detections are then filtered by its own threshold.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 8, max_wait_ms: float = 15.0,
+                 max_queue: int = 64, name: str = "inference-batcher", concurrency: int = 1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(self.max_batch_size, int(max_queue))
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+
+        # stats (guarded by _cond)
+        self._batches = 0
+        self._frames = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._batch_size_counts = {}
+        self._recent_sizes = deque(maxlen=100)
+        self._recent_wait_ms = deque(maxlen=100)
+        self._recent_predict_ms = deque(maxlen=100)
+        QUEUE_DEPTH.labels(name).set_function(lambda: len(self._queue))
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                         for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"{self.name} started (max_batch={self.max_batch_size}, "
+                     f"max_wait={self.max_wait * 1000:.1f}ms, concurrency={self.concurrency})")
+
+    def stop(self, timeout: float = 1.0):
+        with self._cond:
+            self._running = False
+            pending = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        for item in pending:
+            item.error = RuntimeError("inference batcher stopped")
+            item.done.set()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout=timeout)
+        self._threads = []
+
+    # ---------- public API ----------
+
+    def submit(self, frame, conf: float, timeout: float = 10.0):
+        """Queue a frame and block until its (xyxy, confs, cls_ids) result is ready."""
+        if not self._running:
+            self.start()
+        item = _PendingFrame(frame, conf)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                FRAMES_DROPPED.labels(self.name, "queue_full").inc()
+                raise RuntimeError("inference queue full")
+            self._queue.append(item)
+            self._max_depth = max(self._max_depth, len(self._queue))
+            self._cond.notify_all()
+
+        if not item.done.wait(timeout):
+            # leave the item in place; the worker will still fill it but nobody waits
+            raise TimeoutError(f"inference did not complete within {timeout}s")
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def stats(self) -> dict:
+        with self._cond:
+            sizes = list(self._recent_sizes)
+            waits = list(self._recent_wait_ms)
+            predicts = list(self._recent_predict_ms)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "concurrency": self.concurrency,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_depth,
+                "batches": self._batches,
+                "frames": self._frames,
+                "rejected": self._rejected,
+                "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_wait_ms": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "avg_predict_ms": round(sum(predicts) / len(predicts), 2) if predicts else 0.0,
+            }
+
+    # ---------- worker ----------
+
+    def _next_batch(self):
+        """Block until a batch is ready; return [] when stopping."""
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+            if not self._running:
+                return []
+            # wait for more frames until the batch fills or the oldest frame's window expires
+            deadline = self._queue[0].enqueued_at + self.max_wait
+            while self._running and len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if not self._running:
+                    break
+                continue
+
+            t_start = time.monotonic()
+            conf = min(item.conf for item in batch)
+            try:
+                results = self.predict_fn([item.frame for item in batch], conf)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"predict returned {len(results)} results for {len(batch)} frames")
+                for item, (xyxy, confs, cls_ids) in zip(batch, results):
+                    keep = confs >= item.conf
+                    item.result = (xyxy[keep], confs[keep], cls_ids[keep])
+            except Exception as e:
+                logging.exception(f"{self.name}: batch of {len(batch)} failed")
+                for item in batch:
+                    item.error = e
+            t_end = time.monotonic()
+
+            for item in batch:
+                item.done.set()
+
+            with self._cond:
+                size = len(batch)
+                self._batches += 1
+                self._frames += size
+                self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+                self._recent_sizes.append(size)
+                self._recent_wait_ms.append(
+                    float(np.mean([t_start - item.enqueued_at for item in batch])) * 1000)
+                self._recent_predict_ms.append((t_end - t_start) * 1000)
+            BATCH_SIZE.labels(self.name).observe(size)
+            wait_hist = BATCH_WAIT_SECONDS.labels(self.name)
+            for item in batch:
+                wait_hist.observe(t_start - item.enqueued_at)
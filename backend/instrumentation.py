@@ -0,0 +1,304 @@
+"""
+Prometheus-style instrumentation (no client library required)
+- Counter, Gauge and Histogram metrics with labels, kept in a Registry
+- Histograms use fixed cumulative buckets so /metrics can be scraped and aggregated
+- Gauges can be backed by a callback (queue depths are read at scrape time)
+- Registry.render() produces the Prometheus text exposition format (version 0.0.4)
+The metrics shared across modules are defined at the bottom of this file.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers sub-millisecond resize/draw up to multi-second CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base for labelled metrics: one child per label-value tuple."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[n] for n in self.labelnames)
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels()")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """Yield exposition lines (without HELP/TYPE)."""
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (name it with a _total suffix)."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def collect(self):
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._fn = None
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, fn):
+        """Read the value from fn() at scrape time instead of storing it."""
+        self._fn = fn
+
+    @property
+    def value(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (or be computed by a callback)."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def set_function(self, fn):
+        self._unlabelled().set_function(fn)
+
+    def collect(self):
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self._buckets = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        idx = bisect_left(self._bounds, value)
+        with self._lock:
+            self._buckets[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._buckets), self._sum, self._count
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (observations in seconds unless stated otherwise)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def collect(self):
+        bounds = self.buckets + (float("inf"),)
+        for values, child in self._items():
+            buckets, total, count = child.snapshot()
+            cumulative = 0
+            for bound, n in zip(bounds, buckets):
+                cumulative += n
+                labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    """Ordered set of metrics rendered together on /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# ---------- Shared metrics ----------
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "detection_stage_seconds",
+    "Time spent in each frame-processing stage (decode, resize, capture, inference, draw, encode)",
+    ["path", "stage"], registry=REGISTRY)
+BACKEND_STAGE_SECONDS = Histogram(
+    "inference_backend_stage_seconds",
+    "Preprocess / inference / postprocess (NMS) time inside the inference backend (torch: per image)",
+    ["backend", "stage"], registry=REGISTRY)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request handling time (streaming responses: until the response starts)",
+    ["method", "endpoint", "status"], registry=REGISTRY)
+BATCH_WAIT_SECONDS = Histogram(
+    "inference_queue_wait_seconds",
+    "Time frames wait in a batcher queue before their batch runs",
+    ["batcher"], registry=REGISTRY)
+BATCH_SIZE = Histogram(
+    "inference_batch_size",
+    "Frames per batched predict call",
+    ["batcher"], buckets=(1, 2, 3, 4, 6, 8, 12, 16, 32), registry=REGISTRY)
+FRAMES_PROCESSED = Counter(
+    "frames_processed_total",
+    "Frames that went through inference",
+    ["path"], registry=REGISTRY)
+FRAMES_DROPPED = Counter(
+    "frames_dropped_total",
+    "Frames dropped before completing the pipeline (stale-slot overwrite or full queue)",
+    ["path", "stage"], registry=REGISTRY)
+DETECTIONS = Counter(
+    "detections_total",
+    "Detected objects by class",
+    ["path", "class"], registry=REGISTRY)
+MOTION_GATE = Counter(
+    "motion_gate_decisions_total",
+    "Motion gate decisions: motion / refresh ran inference, skip reused the previous detections",
+    ["path", "decision"], registry=REGISTRY)
+END_TO_END_SECONDS = Histogram(
+    "end_to_end_latency_seconds",
+    "Capture (camera) or upload decode (browser) until the annotated frame / response is ready",
+    ["path"], registry=REGISTRY)
+QUALITY_LEVEL = Gauge(
+    "quality_level",
+    "Current adaptive quality level per path (0 = best quality)",
+    ["path"], registry=REGISTRY)
+QUEUE_DEPTH = Gauge(
+    "queue_depth",
+    "Current depth of internal queues",
+    ["queue"], registry=REGISTRY)
+
+
+def count_detections(path: str, counts: dict):
+    """Add a {class_name: n} mapping to the per-class detection counter."""
+    for name, n in counts.items():
+        if n:
+            DETECTIONS.labels(path, name).inc(n)
@@ -0,0 +1,127 @@
+"""
+Pluggable JPEG codec
+- TurboJPEGCodec calls libjpeg-turbo directly through PyTurboJPEG (optional dependency)
+- OpenCVCodec is the fallback and needs nothing extra
+- Both decode DCT-domain scaled: with min_width, a 1280 px upload is decoded straight at
+  1/2, 1/4 or 1/8 size (never below min_width) instead of in full and then resized
+- encode() returns the JPEG bytes without an extra copy where the library allows it
+- create_codec("auto") picks turbojpeg when importable, else opencv
+"""
+
+import logging
+
+import cv2
+import numpy as np
+
+# SOFn markers carry the frame size (C4 = DHT, C8 = JPG extension, CC = DAC are not frames)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """(width, height) from the JPEG header without decoding, or None if it isn't a readable JPEG."""
+    data = bytes(data[:65536]) if not isinstance(data, bytes) else data
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 9 <= n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # no length field
+            i += 2
+            continue
+        if marker in _SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return (width, height) if width and height else None
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def _pick_scale(width: int, min_width: int, factors):
+    """Smallest (num, denom) scale that keeps width >= min_width; (1, 1) when none reduces."""
+    best = (1, 1)
+    if not min_width or width <= min_width:
+        return best
+    for num, denom in factors:
+        scaled = -(-width * num // denom)  # libjpeg rounds scaled sizes up
+        if min_width <= scaled and num / denom < best[0] / best[1]:
+            best = (num, denom)
+    return best
+
+
+class OpenCVCodec:
+    """cv2.imdecode / imencode; scaled decode through the IMREAD_REDUCED_COLOR_* flags."""
+
+    name = "opencv"
+    _REDUCED = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    def decode(self, data, min_width: int = None):
+        """BGR frame (None on invalid data); with min_width the result is at least that wide if the source is."""
+        buf = np.frombuffer(data, np.uint8)
+        if not len(buf):
+            return None
+        flags = cv2.IMREAD_COLOR
+        size = jpeg_size(data) if min_width else None
+        if size:
+            num, denom = _pick_scale(size[0], min_width, [(1, d) for d in self._REDUCED])
+            flags = self._REDUCED.get(denom, cv2.IMREAD_COLOR)
+        return cv2.imdecode(buf, flags)
+
+    def encode(self, frame, quality: int = 85):
+        ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        # imencode owns its output array; bytes() is the one copy Flask / WebSocket payloads need
+        return buffer.tobytes() if ret else None
+
+
+class TurboJPEGCodec:
+    """libjpeg-turbo via PyTurboJPEG: faster Huffman/IDCT paths and more scaling factors (3/8, 5/8, ...)."""
+
+    name = "turbojpeg"
+
+    def __init__(self, lib_path: str = None):
+        from turbojpeg import TJPF_BGR, TJSAMP_420, TurboJPEG
+
+        self._tj = TurboJPEG(lib_path) if lib_path else TurboJPEG()
+        self._bgr = TJPF_BGR
+        self._subsample = TJSAMP_420
+        self._factors = sorted(self._tj.scaling_factors)
+
+    def decode(self, data, min_width: int = None):
+        try:
+            scale = None
+            if min_width:
+                width, _, _, _ = self._tj.decode_header(data)
+                scale = _pick_scale(width, min_width, self._factors)
+                if scale == (1, 1):
+                    scale = None
+            return self._tj.decode(data, pixel_format=self._bgr, scaling_factor=scale)
+        except (OSError, ValueError) as e:  # PyTurboJPEG reports corrupt data as OSError
+            logging.debug(f"turbojpeg decode failed: {e}")
+            return None
+
+    def encode(self, frame, quality: int = 85):
+        # returns bytes built straight from libjpeg-turbo's output buffer
+        return self._tj.encode(np.ascontiguousarray(frame), quality=int(quality),
+                               pixel_format=self._bgr, jpeg_subsample=self._subsample)
+
+
+def create_codec(name: str = "auto"):
+    """turbojpeg | opencv | auto (turbojpeg when installed with its native library, else opencv)."""
+    name = (name or "auto").lower()
+    if name in ("auto", "turbojpeg"):
+        try:
+            codec = TurboJPEGCodec()
+            logging.info("JPEG codec: turbojpeg (libjpeg-turbo)")
+            return codec
+        except Exception as e:  # missing package or libturbojpeg shared library
+            if name == "turbojpeg":
+                logging.warning(f"JPEG_CODEC=turbojpeg unavailable ({e}); falling back to OpenCV")
+    elif name != "opencv":
+        logging.warning(f"Unknown JPEG_CODEC {name!r}; using OpenCV")
+    logging.info("JPEG codec: opencv")
+    return OpenCVCodec()
@@ -0,0 +1,147 @@
+"""
+Motion gate: skip inference on frames where nothing changed
+- Frames are compared on a small blurred grayscale copy (under a millisecond at 160 px wide)
+- The reference is the frame inference last ran on, so slow changes accumulate
+  until they cross the threshold instead of slipping through frame by frame
+- Optional ROI (normalized x1,y1,x2,y2): motion outside it is ignored
+- A refresh interval forces inference now and then (lighting drift, objects that stop moving)
+- check() also returns the bounding box of the changed pixels, so callers can run
+  inference on just that region
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def parse_roi(text: str):
+    """'x1,y1,x2,y2' in 0..1 frame fractions -> tuple, or None for an empty string."""
+    if not text:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in text.split(","))
+    except ValueError:
+        raise ValueError(f"ROI must be 'x1,y1,x2,y2' fractions, got {text!r}")
+    if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+        raise ValueError(f"ROI must satisfy 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1, got {text!r}")
+    return x1, y1, x2, y2
+
+
+def merge_region(previous, detections, region):
+    """
+    Combine region-only inference with the previous full-frame result: detections (in crop
+    coordinates) are shifted into the frame, previous boxes centred inside the region are replaced.
+    """
+    x1, y1 = region[:2]
+    xyxy, confs, cls_ids = detections
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4) + np.array([x1, y1, x1, y1], dtype=np.float32)
+    if previous is None:
+        return xyxy, np.asarray(confs, dtype=np.float32), np.asarray(cls_ids, dtype=int)
+    p_xyxy, p_confs, p_cls = (np.asarray(a) for a in previous[:3])
+    p_xyxy = p_xyxy.reshape(-1, 4)
+    cx, cy = (p_xyxy[:, 0] + p_xyxy[:, 2]) / 2, (p_xyxy[:, 1] + p_xyxy[:, 3]) / 2
+    keep = ~((cx >= region[0]) & (cx < region[2]) & (cy >= region[1]) & (cy < region[3]))
+    return (np.concatenate([p_xyxy[keep].astype(np.float32), xyxy]),
+            np.concatenate([p_confs[keep].astype(np.float32), np.asarray(confs, dtype=np.float32)]),
+            np.concatenate([p_cls[keep].astype(int), np.asarray(cls_ids, dtype=int)]))
+
+
+class MotionGate:
+    """
+    Decide per frame whether inference is needed.
+    - threshold: per-pixel gray-level difference that counts as changed
+    - min_changed: fraction of (ROI) pixels that must change to run inference
+    - refresh_seconds: run inference at least this often even in a static scene
+    """
+
+    def __init__(self, width: int = 160, threshold: int = 25, min_changed: float = 0.003,
+                 refresh_seconds: float = 5.0, roi=None, region_padding: float = 0.1):
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.refresh_seconds = refresh_seconds
+        self.roi = roi
+        self.region_padding = region_padding
+        self._reference = None
+        self._roi_mask = None
+        self._last_inference = 0.0
+        self._lock = threading.Lock()
+        self.decisions = {"motion": 0, "refresh": 0, "skip": 0}
+        self.last_changed = 0.0
+
+    def reset(self):
+        with self._lock:
+            self._reference = None
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.width / w if w > self.width else 1.0
+        small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # blur away sensor noise and JPEG artifacts so they don't count as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _mask_for(self, shape):
+        if self.roi is None:
+            return None
+        if self._roi_mask is None or self._roi_mask.shape != shape:
+            h, w = shape
+            x1, y1, x2, y2 = self.roi
+            mask = np.zeros(shape, dtype=bool)
+            mask[int(y1 * h):max(int(y2 * h), int(y1 * h) + 1), int(x1 * w):max(int(x2 * w), int(x1 * w) + 1)] = True
+            self._roi_mask = mask
+        return self._roi_mask
+
+    def check(self, frame, now: float = None):
+        """
+        Returns (run_inference, decision, region). decision is "motion", "refresh" or "skip";
+        region is the padded (x1, y1, x2, y2) pixel box around the changed area for "motion", else None.
+        """
+        now = time.monotonic() if now is None else now
+        small = self._small(frame)
+        with self._lock:
+            reference = self._reference
+            if reference is None or reference.shape != small.shape:
+                return self._accept(small, now, "refresh", None)
+
+            changed = cv2.absdiff(small, reference) > self.threshold
+            mask = self._mask_for(changed.shape)
+            if mask is not None:
+                changed &= mask
+                self.last_changed = float(changed.sum()) / max(int(mask.sum()), 1)
+            else:
+                self.last_changed = float(changed.mean())
+
+            if self.last_changed >= self.min_changed:
+                return self._accept(small, now, "motion", self._region(changed, frame.shape))
+            if now - self._last_inference >= self.refresh_seconds:
+                return self._accept(small, now, "refresh", None)
+            self.decisions["skip"] += 1
+            return False, "skip", None
+
+    def _accept(self, small, now, decision, region):
+        self._reference = small
+        self._last_inference = now
+        self.decisions[decision] += 1
+        return True, decision, region
+
+    def _region(self, changed, frame_shape):
+        ys, xs = np.nonzero(changed)
+        h, w = frame_shape[:2]
+        sy, sx = h / changed.shape[0], w / changed.shape[1]
+        pad_x, pad_y = self.region_padding * w, self.region_padding * h
+        return (max(0, int(xs.min() * sx - pad_x)), max(0, int(ys.min() * sy - pad_y)),
+                min(w, int((xs.max() + 1) * sx + pad_x)), min(h, int((ys.max() + 1) * sy + pad_y)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            checked = sum(self.decisions.values())
+            return {
+                **self.decisions,
+                "skip_ratio": round(self.decisions["skip"] / checked, 3) if checked else 0.0,
+                "last_changed": round(self.last_changed, 5),
+                "min_changed": self.min_changed,
+                "roi": list(self.roi) if self.roi else None,
+            }
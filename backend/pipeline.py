@@ -0,0 +1,117 @@
+"""
+Building blocks for the staged detection pipeline
+- LatestSlot: bounded single-slot hand-off that always keeps the newest item
+- StageTimer: rolling per-stage timings and drop counters
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class LatestSlot:
+    """
+    Single-slot queue between two pipeline stages.
+
+    put() never blocks: an item the consumer has not picked up yet is replaced
+    (and counted as dropped), so a slow consumer always sees the newest frame.
+    dispose(item) is called for replaced items (e.g. to return pooled buffers).
+    """
+
+    def __init__(self, on_drop=None, dispose=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self._on_drop = on_drop
+        self._dispose = dispose
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, item):
+        replaced = None
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+                replaced = self._item
+                if self._on_drop is not None:
+                    self._on_drop()
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+        if replaced is not None and self._dispose is not None:
+            self._dispose(replaced)
+
+    def get(self, timeout: float = None):
+        """Return the newest item, or None on timeout / when the slot is closed and empty."""
+        with self._cond:
+            if not self._has_item and not self._closed:
+                self._cond.wait(timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageTimer:
+    """Rolling timings (ms) and drop counts per named pipeline stage."""
+
+    def __init__(self, window: int = 100):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}
+        self._counts = {}
+        self._drops = {}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._drops.clear()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self._window)
+                self._counts[stage] = 0
+            self._samples[stage].append(seconds * 1000.0)
+            self._counts[stage] += 1
+
+    def record_drop(self, stage: str):
+        with self._lock:
+            self._drops[stage] = self._drops.get(stage, 0) + 1
+
+    @contextmanager
+    def time(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def snapshot(self) -> dict:
+        """Per-stage avg/max/last ms and counts, plus the slowest stage by average."""
+        with self._lock:
+            stages = {}
+            for stage, samples in self._samples.items():
+                values = list(samples)
+                stages[stage] = {
+                    "avg_ms": round(sum(values) / len(values), 2) if values else 0.0,
+                    "max_ms": round(max(values), 2) if values else 0.0,
+                    "last_ms": round(values[-1], 2) if values else 0.0,
+                    "count": self._counts[stage],
+                }
+            drops = dict(self._drops)
+        bottleneck = max(stages, key=lambda s: stages[s]["avg_ms"]) if stages else None
+        return {"stages": stages, "dropped": drops, "bottleneck": bottleneck}
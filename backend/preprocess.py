@@ -0,0 +1,81 @@
+"""
+Letterbox-once preprocessing into preallocated input tensors
+- One resize per frame (none when the frame already fits), straight from the BGR frame
+- BGR->RGB, /255 and HWC->CHW happen in a single write into the float32 NCHW batch tensor;
+  only the padding border is filled, the image area is written once
+- Batch tensors (and the resize scratch) come from a FramePool, so steady traffic stops
+  allocating; callers release the tensor buffer once inference has run
+- Per-frame metas (ratio, (pad_left, pad_top), (h, w)) map boxes back with unletterbox()
+"""
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+
+PAD_VALUE = 114
+_INV_255 = np.float32(1.0 / 255.0)
+
+
+def letterbox_params(h: int, w: int, size: int):
+    """(ratio, new_w, new_h, pad_left, pad_top) for fitting h x w into size x size (ultralytics rounding)."""
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_left = int(round((size - new_w) / 2 - 0.1))
+    pad_top = int(round((size - new_h) / 2 - 0.1))
+    return ratio, new_w, new_h, pad_left, pad_top
+
+
+def unletterbox(xyxy: np.ndarray, meta) -> np.ndarray:
+    """Map xyxy boxes from letterboxed tensor coordinates back to the original frame (in place)."""
+    ratio, (pad_w, pad_h), (h, w) = meta
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_w) / ratio).clip(0, w)
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_h) / ratio).clip(0, h)
+    return xyxy
+
+
+class Preprocessor:
+    """Letterboxes BGR frames into pooled float32 RGB NCHW tensors scaled to [0, 1]."""
+
+    def __init__(self, pool: FramePool = None, pad_value: int = PAD_VALUE,
+                 interpolation: int = cv2.INTER_LINEAR):
+        self.pool = pool or FramePool("preprocess")
+        self.pad = np.float32(pad_value / 255.0)
+        self.interpolation = interpolation
+
+    def __call__(self, frames, size: int):
+        """(FrameBuffer with the (N, 3, size, size) tensor, metas); release the buffer after inference."""
+        buffer = self.pool.acquire((len(frames), 3, size, size), np.float32)
+        try:
+            metas = self.fill(buffer.array, frames, size)
+        except Exception:
+            buffer.release()
+            raise
+        return buffer, metas
+
+    def fill(self, tensor: np.ndarray, frames, size: int):
+        """Write frames into tensor[:len(frames)]; returns one meta per frame."""
+        return [self._fill_one(tensor[i], frame, size) for i, frame in enumerate(frames)]
+
+    def _fill_one(self, out: np.ndarray, frame: np.ndarray, size: int):
+        h, w = frame.shape[:2]
+        ratio, new_w, new_h, left, top = letterbox_params(h, w, size)
+        scratch = None
+        if (new_w, new_h) != (w, h):
+            scratch = self.pool.acquire((new_h, new_w, 3))
+            cv2.resize(frame, (new_w, new_h), dst=scratch.array, interpolation=self.interpolation)
+            frame = scratch.array
+        try:
+            bottom, right = top + new_h, left + new_w
+            out[:, :top] = self.pad
+            out[:, bottom:] = self.pad
+            out[:, top:bottom, :left] = self.pad
+            out[:, top:bottom, right:] = self.pad
+            region = out[:, top:bottom, left:right]
+            for c in range(3):
+                # RGB channel c is BGR channel 2 - c
+                np.multiply(frame[:, :, 2 - c], _INV_255, out=region[c], casting="unsafe")
+        finally:
+            if scratch is not None:
+                scratch.release()
+        return ratio, (left, top), (h, w)
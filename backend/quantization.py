@@ -0,0 +1,222 @@
+"""
+INT8 quantization of the exported ONNX detector
+- Static quantization calibrated from images in saved_frames (falls back to dynamic
+  quantization when there are too few calibration frames)
+- The detection head is kept in FP32 by default; quantizing it costs most of the accuracy
+- Accuracy-vs-speed report comparing the INT8 model against the FP32 model on the same frames
+
+Usage:
+    python quantization.py --weights yolov8n.pt --mode static --report
+"""
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from inference_backends import box_iou, preprocess_batch
+
+MIN_STATIC_CALIBRATION_FRAMES = 8
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def list_frames(frames_dir, limit: int = None):
+    """Image files under frames_dir (newest first), capped at limit."""
+    frames_dir = Path(frames_dir) if frames_dir else None
+    if frames_dir is None or not frames_dir.is_dir():
+        return []
+    paths = sorted((p for p in frames_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES),
+                   key=lambda p: p.stat().st_mtime, reverse=True)
+    return paths[:limit] if limit else paths
+
+
+def int8_path(fp32_path, mode: str) -> Path:
+    fp32_path = Path(fp32_path)
+    return fp32_path.with_name(f"{fp32_path.stem}.int8-{mode}.onnx")
+
+
+def _head_nodes(onnx_path):
+    """Names of nodes in the YOLOv8 detect head (model.22), excluded from quantization."""
+    import onnx
+
+    graph = onnx.load(str(onnx_path)).graph
+    head = [n.name for n in graph.node if "/model.22/" in n.name]
+    return head
+
+
+def quantize_onnx(fp32_path, calibration_dir, mode: str = "static", imgsz: int = 640,
+                  max_frames: int = 100, exclude_head: bool = True) -> Path:
+    """Quantize an FP32 ONNX export to INT8 once and return the cached path."""
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_dynamic, quantize_static)
+
+    frames = list_frames(calibration_dir, max_frames)
+    if mode == "static" and len(frames) < MIN_STATIC_CALIBRATION_FRAMES:
+        logging.warning(f"Only {len(frames)} calibration frames in {calibration_dir}; "
+                        f"using dynamic quantization instead of static")
+        mode = "dynamic"
+
+    target = int8_path(fp32_path, mode)
+    if target.exists():
+        return target
+
+    exclude = _head_nodes(fp32_path) if exclude_head else []
+    t0 = time.time()
+
+    if mode == "dynamic":
+        quantize_dynamic(str(fp32_path), str(target), weight_type=QuantType.QUInt8,
+                         nodes_to_exclude=exclude)
+    elif mode == "static":
+        import onnxruntime as ort
+
+        input_name = ort.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+        class SavedFramesReader(CalibrationDataReader):
+            """Feeds letterboxed saved frames one at a time to the calibrator."""
+
+            def __init__(self):
+                self._paths = iter(frames)
+
+            def get_next(self):
+                for p in self._paths:
+                    img = cv2.imread(str(p), cv2.IMREAD_COLOR)
+                    if img is not None:
+                        tensor, _ = preprocess_batch([img], imgsz)
+                        return {input_name: tensor}
+                return None
+
+        quantize_static(str(fp32_path), str(target), SavedFramesReader(),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=exclude)
+    else:
+        raise ValueError(f"unknown quantization mode: {mode}")
+
+    logging.info(f"Quantized {fp32_path} -> {target} ({mode}, {len(frames)} calibration frames, "
+                 f"{len(exclude)} head nodes kept FP32) in {time.time() - t0:.1f}s")
+    return target
+
+
+# ---------- Accuracy vs speed report ----------
+
+def _match_detections(ref, cand, iou_thr: float):
+    """Greedy same-class matching; returns (match count, IoU per match, |conf delta| per match)."""
+    ref_xyxy, ref_conf, ref_cls = ref
+    cand_xyxy, cand_conf, cand_cls = cand
+    if len(ref_cls) == 0 or len(cand_cls) == 0:
+        return 0, [], []
+    ious = box_iou(ref_xyxy, cand_xyxy)
+    ious[ref_cls[:, None] != cand_cls[None, :]] = 0.0
+    matched_ious, conf_deltas = [], []
+    used = set()
+    for i in np.argsort(-ref_conf):
+        j = int(np.argmax(ious[i]))
+        if ious[i, j] >= iou_thr and j not in used:
+            used.add(j)
+            matched_ious.append(float(ious[i, j]))
+            conf_deltas.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+            ious[:, j] = 0.0
+    return len(used), matched_ious, conf_deltas
+
+
+def _timed_predictions(backend, images, conf, imgsz, warmup: int = 2):
+    for img in images[:warmup]:
+        backend.predict([img], conf=conf, imgsz=imgsz)
+    preds, times = [], []
+    for img in images:
+        t0 = time.perf_counter()
+        preds.append(backend.predict([img], conf=conf, imgsz=imgsz)[0])
+        times.append((time.perf_counter() - t0) * 1000)
+    return preds, times
+
+
+def _latency_summary(times):
+    return {
+        "mean_ms": round(float(np.mean(times)), 2),
+        "p50_ms": round(float(np.percentile(times, 50)), 2),
+        "p95_ms": round(float(np.percentile(times, 95)), 2),
+    }
+
+
+def compare_backends(reference, candidate, frame_paths, conf: float = 0.25, imgsz: int = 640,
+                     iou_thr: float = 0.5) -> dict:
+    """Run both backends on the same frames and report latency, speedup and detection agreement."""
+    images = [img for img in (cv2.imread(str(p), cv2.IMREAD_COLOR) for p in frame_paths) if img is not None]
+    if not images:
+        raise ValueError("no readable frames to compare on")
+
+    ref_preds, ref_times = _timed_predictions(reference, images, conf, imgsz)
+    cand_preds, cand_times = _timed_predictions(candidate, images, conf, imgsz)
+
+    n_ref = n_cand = n_match = 0
+    all_ious, all_deltas = [], []
+    for ref, cand in zip(ref_preds, cand_preds):
+        matches, ious, deltas = _match_detections(ref, cand, iou_thr)
+        n_ref += len(ref[2])
+        n_cand += len(cand[2])
+        n_match += matches
+        all_ious.extend(ious)
+        all_deltas.extend(deltas)
+
+    precision = n_match / n_cand if n_cand else 1.0
+    recall = n_match / n_ref if n_ref else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) else 0.0
+    ref_lat, cand_lat = _latency_summary(ref_times), _latency_summary(cand_times)
+    return {
+        "frames": len(images),
+        "imgsz": imgsz,
+        "conf": conf,
+        "iou_threshold": iou_thr,
+        "reference": {"backend": reference.name, **ref_lat, "detections": n_ref},
+        "candidate": {"backend": candidate.name, **cand_lat, "detections": n_cand},
+        "speedup": round(ref_lat["mean_ms"] / cand_lat["mean_ms"], 3) if cand_lat["mean_ms"] else None,
+        "agreement": {
+            "matched": n_match,
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "mean_iou": round(float(np.mean(all_ious)), 4) if all_ious else None,
+            "mean_conf_delta": round(float(np.mean(all_deltas)), 4) if all_deltas else None,
+        },
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main():
+    from inference_backends import OnnxBackend, export_weights
+
+    parser = argparse.ArgumentParser(description="Quantize the detector to INT8 and report accuracy vs speed")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--frames-dir", default=str(Path(__file__).parent / "saved_frames"))
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--max-frames", type=int, default=100)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--report", action="store_true", help="compare INT8 against FP32 and save a JSON report")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    fp32 = export_weights(args.weights, "onnx", imgsz=args.imgsz)
+    int8 = quantize_onnx(fp32, args.frames_dir, mode=args.mode, imgsz=args.imgsz, max_frames=args.max_frames)
+    print(f"INT8 model: {int8}")
+
+    if args.report:
+        fp32_backend = OnnxBackend(fp32, threads=args.threads)
+        int8_backend = OnnxBackend(int8, threads=args.threads)
+        int8_backend.name = "onnx-int8"
+        report = compare_backends(fp32_backend, int8_backend, list_frames(args.frames_dir, args.max_frames),
+                                  conf=args.conf, imgsz=args.imgsz)
+        report["fp32_model"], report["int8_model"] = str(fp32), str(int8)
+        out = int8.with_suffix(".report.json")
+        out.write_text(json.dumps(report, indent=2))
+        print(json.dumps(report, indent=2))
+        print(f"Report saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Per-client session state for browser camera clients
+- Sessions are keyed by a client-chosen id (X-Session-Id header, session_id cookie or
+  ?session=), so several browsers no longer share FPS, counts, confidence or the frame
+  that save-frame writes
+- A session owns its latest-frame SnapshotPublisher, rolling FPS / latency windows,
+  counters and confidence; metrics() has the shape of the global current_metrics
+- Each session has its own lock; the store lock only covers the id lookup, so clients
+  don't contend with each other
+- Memory is bounded: fixed-size windows, one snapshot per session and at most
+  max_sessions sessions (least recently used evicted first); sessions idle for
+  idle_seconds are swept on later requests and give their frame buffer back
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from frame_pool import SnapshotPublisher
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+# idle sessions are looked for at most this often
+_SWEEP_INTERVAL = 10.0
+
+
+def session_id_from(headers, cookies, args):
+    """Session id from a request's headers / cookies / query args (Flask or Starlette); None if absent or malformed."""
+    value = headers.get("X-Session-Id") or cookies.get("session_id") or args.get("session")
+    return value if value and _VALID_ID.match(value) else None
+
+
+class ClientSession:
+    """State of one browser client."""
+
+    def __init__(self, session_id: str, confidence: float, window: int = 30):
+        self.id = session_id
+        self.confidence = confidence
+        self.snapshots = SnapshotPublisher()
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+        self._fps = deque(maxlen=window)
+        self._latency_ms = deque(maxlen=window)
+        self.frames_processed = 0
+        self.saved_count = 0
+        self.object_count = 0
+        self.detections = {}
+        self.session_start = datetime.now().isoformat()
+
+    def record(self, processing_time: float, detections_count: dict):
+        """One processed frame: rolling FPS / latency and the latest counts."""
+        with self._lock:
+            self._fps.append(1.0 / processing_time if processing_time > 0 else 0.0)
+            self._latency_ms.append(processing_time * 1000.0)
+            self.frames_processed += 1
+            self.object_count = sum(detections_count.values())
+            self.detections = dict(detections_count)
+
+    def record_save(self):
+        with self._lock:
+            self.saved_count += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latency = sorted(self._latency_ms)
+            return {
+                "fps": round(sum(self._fps) / len(self._fps), 2) if self._fps else 0.0,
+                "confidence": self.confidence,
+                "object_count": self.object_count,
+                "frames_processed": self.frames_processed,
+                "saved_count": self.saved_count,
+                "detections": dict(self.detections),
+                "session_start": self.session_start,
+                "session_id": self.id,
+                "latency_ms": {
+                    "p50": round(latency[len(latency) // 2], 2) if latency else None,
+                    "p95": round(latency[min(len(latency) - 1, int(len(latency) * 0.95))], 2) if latency else None,
+                },
+            }
+
+    def close(self):
+        self.snapshots.clear()
+
+
+class SessionStore:
+    """LRU-ordered sessions with a size cap and idle eviction."""
+
+    def __init__(self, max_sessions: int = 200, idle_seconds: float = 600.0):
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_seconds = float(idle_seconds)
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def get(self, session_id: str, confidence: float = 0.15):
+        """The session for session_id, created (with this confidence) on first use; None for no id."""
+        if session_id is None:
+            return None
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            # sweep first so the session being returned is never the one swept away
+            if now - self._last_sweep >= _SWEEP_INTERVAL:
+                evicted += self._sweep_locked(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ClientSession(session_id, confidence)
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    evicted.append(self._sessions.popitem(last=False)[1])
+                    self.evicted_lru += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+        for old in evicted:
+            old.close()
+        return session
+
+    def _sweep_locked(self, now: float):
+        """Pop idle sessions; the dict is in last-use order, so stop at the first active one."""
+        self._last_sweep = now
+        evicted = []
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.idle_seconds:
+                break
+            evicted.append(self._sessions.popitem(last=False)[1])
+            self.evicted_idle += 1
+        return evicted
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._sweep_locked(now)
+            sessions = list(self._sessions.values())
+            stats = {
+                "active": len(sessions),
+                "max_sessions": self.max_sessions,
+                "idle_seconds": self.idle_seconds,
+                "created": self.created,
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+            }
+        for old in evicted:
+            old.close()
+        stats["sessions"] = [{"id": s.id, "idle_seconds": round(now - s.last_seen, 1),
+                              "frames_processed": s.frames_processed, "confidence": s.confidence}
+                             for s in sessions]
+        return stats
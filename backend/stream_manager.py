@@ -0,0 +1,335 @@
+"""
+Multi-stream detection manager
+- Runs N independent capture sources concurrently: camera indices, video files, RTSP/HTTP URLs
+- Every stream thread submits its frames to one shared InferenceBatcher, so concurrent
+  streams are served by batched predict calls on a single model
+- Each stream owns its FrameBroadcaster (MJPEG feed) and metrics
+- Network sources reconnect with backoff; video files can loop
+- Each stream decodes into one pooled buffer that is reused for every frame
+- Sources come from API clients, so files must live under media_dir and URLs must match
+  url_allowlist; both are disabled unless configured
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import cv2
+
+from frame_broadcaster import FrameBroadcaster
+from frame_pool import FramePool
+from inference_batcher import InferenceBatcher
+from instrumentation import FRAMES_PROCESSED, STAGE_SECONDS, count_detections
+
+URL_SCHEMES = ("rtsp://", "rtsps://", "http://", "https://", "rtmp://")
+
+
+def url_allowed(url: str, allowlist) -> bool:
+    """
+    True when url matches an allow-list entry: "*" (anything), a host name / IP (any scheme)
+    or "scheme://host[:port]" (that scheme and host, and that port when one is given).
+    """
+    try:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port
+    except ValueError:
+        return False
+    if not host:
+        return False
+    for entry in allowlist:
+        if entry == "*":
+            return True
+        if "://" not in entry:
+            if entry.lower() == host:
+                return True
+            continue
+        allowed = urlsplit(entry)
+        if (allowed.scheme == parts.scheme.lower() and allowed.hostname == host
+                and (allowed.port is None or allowed.port == port)):
+            return True
+    return False
+
+
+def parse_source(source, media_dir=None, url_allowlist=()):
+    """
+    Normalize a source spec: int camera index, allowed URL string or a video file inside
+    media_dir (relative paths are taken from there). Raises ValueError for anything else.
+    """
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    if source.isdigit():
+        return int(source)
+    if source.lower().startswith(URL_SCHEMES):
+        if not url_allowed(source, url_allowlist):
+            raise ValueError("stream URL is not allowed (see STREAM_URL_ALLOWLIST)")
+        return source
+    if media_dir is None:
+        raise ValueError("file sources are disabled (set STREAM_MEDIA_DIR)")
+    root = Path(media_dir).resolve()
+    path = (root / source).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        raise ValueError(f"source must be a camera index, an allowed stream URL or a video file in STREAM_MEDIA_DIR: {source}")
+    return str(path)
+
+
+def source_kind(source) -> str:
+    if isinstance(source, int):
+        return "camera"
+    return "url" if str(source).lower().startswith(URL_SCHEMES) else "file"
+
+
+class DetectionStream:
+    """One capture source with its own thread, broadcaster and metrics."""
+
+    def __init__(self, stream_id: str, source, manager, confidence: float = 0.15, loop: bool = True):
+        self.id = stream_id
+        self.source = source
+        self.kind = source_kind(source)
+        self.manager = manager
+        self.confidence = confidence
+        self.loop = loop
+        self.broadcaster = FrameBroadcaster(manager.encoder, quality=manager.jpeg_quality)
+
+        self.status = "created"
+        self.error = None
+        self._running = False
+        self._thread = None
+        self._fps_queue = deque(maxlen=30)
+        self._last_time = None
+        self.metrics = {
+            "fps": 0.0,
+            "object_count": 0,
+            "frames_processed": 0,
+            "detections": {},
+            "reconnects": 0,
+            "errors": 0,
+            "session_start": None,
+        }
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        self._running = True
+        self.metrics["session_start"] = datetime.now().isoformat()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._running = False
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self.status = "stopped"
+
+    @property
+    def running(self) -> bool:
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    # ---------- capture / detect loop ----------
+
+    def _open(self):
+        if self.kind == "camera":
+            cap = cv2.VideoCapture(self.source, cv2.CAP_DSHOW) if os.name == "nt" else cv2.VideoCapture(self.source)
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.manager.frame_width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.manager.frame_height)
+        else:
+            cap = cv2.VideoCapture(self.source)
+        try:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _run(self):
+        backoff = 0.5
+        cap = None
+        pool = self.manager.frame_pool
+        buffer = None
+        try:
+            while self._running:
+                if cap is None:
+                    self.status = "connecting"
+                    cap = self._open()
+                    if cap is None:
+                        self.status = "reconnecting"
+                        self.error = f"could not open source {self.source}"
+                        time.sleep(backoff)
+                        backoff = min(backoff * 2, 10.0)
+                        continue
+                    backoff = 0.5
+                    self.status = "running"
+                    self.error = None
+                    # pace file playback at its native rate so it behaves like a live source
+                    src_fps = cap.get(cv2.CAP_PROP_FPS) if self.kind == "file" else 0
+                    frame_interval = 1.0 / src_fps if src_fps and src_fps > 0 else 0.0
+
+                t_read = time.time()
+                if buffer is None:
+                    buffer = pool.acquire((self.manager.frame_height, self.manager.frame_width, 3))
+                # frames are fully processed before the next read, so one buffer serves the whole stream
+                ret, frame = cap.read(buffer.array)
+                if ret and frame is not None and frame is not buffer.array:
+                    # source size differs from the buffer: keep OpenCV's array for the next reads
+                    buffer.release()
+                    buffer = pool.adopt(frame)
+                if not ret or frame is None:
+                    if self.kind == "file":
+                        if not self.loop:
+                            self.status = "finished"
+                            break
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    # camera / network hiccup -> reopen
+                    cap.release()
+                    cap = None
+                    self.metrics["reconnects"] += 1
+                    continue
+
+                self._process(self.manager.normalize(frame))
+
+                if frame_interval:
+                    remaining = frame_interval - (time.time() - t_read)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        finally:
+            if cap is not None:
+                cap.release()
+            if buffer is not None:
+                buffer.release()
+            self._running = False
+
+    def _process(self, frame):
+        try:
+            with STAGE_SECONDS.labels("stream", "inference").time():
+                xyxy, confs, cls_ids = self.manager.batcher.submit(frame, self.confidence)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            self.error = str(e)
+            logging.warning(f"Stream {self.id}: inference failed: {e}")
+            time.sleep(0.05)
+            return
+
+        renderer = self.manager.renderer()
+        counts = renderer.count(cls_ids)
+
+        now = time.time()
+        if self._last_time is not None and now > self._last_time:
+            self._fps_queue.append(1.0 / (now - self._last_time))
+        self._last_time = now
+        avg_fps = sum(self._fps_queue) / len(self._fps_queue) if self._fps_queue else 0.0
+
+        self.metrics["fps"] = round(avg_fps, 2)
+        self.metrics["object_count"] = sum(counts.values())
+        self.metrics["detections"] = counts
+        self.metrics["frames_processed"] += 1
+        FRAMES_PROCESSED.labels("stream").inc()
+        count_detections("stream", counts)
+
+        # nobody watching -> skip drawing and JPEG encoding entirely
+        if self.broadcaster.has_viewers():
+            with STAGE_SECONDS.labels("stream", "draw").time():
+                annotated = renderer.render(frame, xyxy, confs, cls_ids, copy=False)
+            with STAGE_SECONDS.labels("stream", "encode").time():
+                self.broadcaster.publish(annotated)
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "confidence": self.confidence,
+            "loop": self.loop,
+            "metrics": dict(self.metrics),
+            "stream": self.broadcaster.stats(),
+        }
+
+
+class StreamManager:
+    """Registry of DetectionStreams sharing one batched inference queue."""
+
+    def __init__(self, predict_fn, renderer, encoder, normalize, max_batch_size: int = 8,
+                 max_wait_ms: float = 15.0, max_streams: int = 16, jpeg_quality: int = 85,
+                 concurrency: int = 1, frame_width: int = 640, frame_height: int = 480,
+                 media_dir=None, url_allowlist=()):
+        # renderer is a callable returning the current AnnotationRenderer (the model may be reloaded)
+        self.renderer = renderer
+        self.encoder = encoder
+        self.normalize = normalize
+        self.max_streams = max_streams
+        self.jpeg_quality = jpeg_quality
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.media_dir = media_dir
+        self.url_allowlist = tuple(url_allowlist)
+        self.frame_pool = FramePool("stream")
+        self.batcher = InferenceBatcher(predict_fn, max_batch_size=max_batch_size,
+                                        max_wait_ms=max_wait_ms, name="stream-batcher",
+                                        concurrency=concurrency)
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def parse_source(self, source):
+        """parse_source() under this manager's media_dir / url_allowlist."""
+        return parse_source(source, self.media_dir, self.url_allowlist)
+
+    def add(self, source, stream_id: str = None, confidence: float = 0.15, loop: bool = True) -> DetectionStream:
+        source = self.parse_source(source)
+        with self._lock:
+            if len(self._streams) >= self.max_streams:
+                raise RuntimeError(f"stream limit reached ({self.max_streams})")
+            stream_id = str(stream_id) if stream_id else uuid.uuid4().hex[:8]
+            if stream_id in self._streams:
+                raise KeyError(f"stream {stream_id} already exists")
+            if any(s.source == source for s in self._streams.values()):
+                raise RuntimeError(f"source {source} is already being streamed")
+            stream = DetectionStream(stream_id, source, self, confidence=confidence, loop=loop)
+            self._streams[stream_id] = stream
+        stream.start()
+        logging.info(f"Stream {stream_id} started for {stream.kind} source {source}")
+        return stream
+
+    def remove(self, stream_id: str) -> bool:
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            return False
+        stream.stop()
+        logging.info(f"Stream {stream_id} stopped")
+        return True
+
+    def get(self, stream_id: str):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def uses_source(self, source) -> bool:
+        with self._lock:
+            return any(s.source == source for s in self._streams.values())
+
+    def list(self) -> list:
+        with self._lock:
+            streams = list(self._streams.values())
+        return [s.info() for s in streams]
+
+    def stop_all(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop()
+        self.batcher.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = len(self._streams)
+        return {"streams": count, "max_streams": self.max_streams, "batching": self.batcher.stats()}
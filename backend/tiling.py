@@ -0,0 +1,218 @@
+"""
+Tiled / region-of-interest inference for high-resolution frames
+- Modes: off | roi | auto
+  * roi:  configured regions (x1,y1,x2,y2 frame fractions) are inferred at full resolution,
+          split into tiles when larger than one
+  * auto: the whole frame is covered by overlapping tiles
+- The full frame can ride along at the same input size, so objects larger than a tile
+  are still found whole
+- All crops go through one batched predict call at imgsz = tile_size
+- max_tiles bounds the cost: when more tiles would be needed they grow instead (and the
+  letterbox downscales them), so one call never exceeds max_tiles (+1) inputs
+- Detections are shifted into frame coordinates and merged with class-aware NMS across
+  tiles; boxes cut by an inner tile edge rank below complete ones and are also dropped
+  when mostly contained in a box from another tile
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+from motion_gate import parse_roi
+
+MODES = ("off", "roi", "auto")
+# boxes this close (px) to an inner tile edge are treated as cut by it
+_EDGE_MARGIN = 4
+
+
+def parse_rois(text: str):
+    """'x1,y1,x2,y2;x1,y1,x2,y2' frame fractions -> list of tuples ([] for an empty string)."""
+    return [parse_roi(part.strip()) for part in (text or "").split(";") if part.strip()]
+
+
+def _starts(length: int, tile: int, overlap: int):
+    """Evenly spread tile offsets along one axis; neighbours overlap by at least `overlap` px."""
+    if length <= tile:
+        return [0]
+    n = math.ceil((length - overlap) / (tile - overlap))
+    return [round(i * (length - tile) / (n - 1)) for i in range(n)]
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: float, max_tiles: int, origin=(0, 0)):
+    """Tile rects (x1, y1, x2, y2) covering a width x height area at origin; grows tiles to stay within max_tiles."""
+    tile = max(32, int(tile))
+    while True:
+        ov = int(tile * overlap)
+        xs, ys = _starts(width, tile, ov), _starts(height, tile, ov)
+        if len(xs) * len(ys) <= max(1, max_tiles) or tile >= max(width, height):
+            break
+        tile = int(tile * 1.25)
+    ox, oy = origin
+    return [(ox + x, oy + y, ox + min(x + tile, width), oy + min(y + tile, height)) for y in ys for x in xs]
+
+
+def merge_detections(xyxy, confs, cls_ids, tile_ids, cut, iou: float = 0.5, ios: float = 0.7, max_det: int = 300):
+    """
+    Greedy class-aware NMS over detections from several tiles. Complete boxes are visited
+    before cut ones, then by confidence. A box is suppressed by a kept one of the same class
+    when IoU > iou or, if they come from different tiles, when more than `ios` of its own
+    area lies inside the kept box (the cut-off half of an object another tile saw whole).
+    """
+    n = len(confs)
+    if n == 0:
+        return xyxy.reshape(0, 4).astype(np.float32), confs.astype(np.float32), cls_ids.astype(int)
+    area = np.prod(np.clip(xyxy[:, 2:] - xyxy[:, :2], 0, None), axis=1)
+    order = np.lexsort((-confs, cut))
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) >= max_det:
+            break
+        idx = np.flatnonzero(~suppressed & (cls_ids == cls_ids[i]))
+        idx = idx[idx != i]
+        if not len(idx):
+            continue
+        tl = np.maximum(xyxy[idx, :2], xyxy[i, :2])
+        br = np.minimum(xyxy[idx, 2:], xyxy[i, 2:])
+        inter = np.prod(np.clip(br - tl, 0, None), axis=1)
+        box_iou = inter / np.maximum(area[idx] + area[i] - inter, 1e-9)
+        contained = inter / np.maximum(area[idx], 1e-9)
+        hit = (box_iou > iou) | ((tile_ids[idx] != tile_ids[i]) & (contained > ios))
+        suppressed[idx[hit]] = True
+    keep = np.array(keep, dtype=int)
+    return xyxy[keep].astype(np.float32), confs[keep].astype(np.float32), cls_ids[keep].astype(int)
+
+
+class TiledDetector:
+    """Plans crops for a frame, runs them as one batch and merges the results (thread-safe config)."""
+
+    def __init__(self, mode: str = "off", tile_size: int = 640, overlap: float = 0.2, rois=None,
+                 max_tiles: int = 6, full_frame: bool = True, iou: float = 0.5):
+        self._lock = threading.Lock()
+        self.mode = "off"
+        self.tile_size = 640
+        self.overlap = 0.2
+        self.rois = []
+        self.max_tiles = 6
+        self.full_frame = True
+        self.iou = iou
+        self.calls = 0
+        self.inputs = 0
+        self._last_ms = None
+        self._last_plan = []
+        self.configure(mode=mode, tile_size=tile_size, overlap=overlap, rois=rois or [],
+                       max_tiles=max_tiles, full_frame=full_frame)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def configure(self, mode=None, tile_size=None, overlap=None, rois=None, max_tiles=None, full_frame=None):
+        """Runtime changes from the API; raises ValueError on invalid input (rois as tuples or 'x1,y1,x2,y2;...')."""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"mode must be one of {list(MODES)}")
+        if tile_size is not None and not 64 <= int(tile_size) <= 1280:
+            raise ValueError("tile_size must be in 64..1280")
+        if overlap is not None and not 0 <= float(overlap) < 0.5:
+            raise ValueError("overlap must be in [0, 0.5)")
+        if max_tiles is not None and not 1 <= int(max_tiles) <= 32:
+            raise ValueError("max_tiles must be in 1..32")
+        if isinstance(rois, str):
+            rois = parse_rois(rois)
+        elif rois is not None:
+            rois = [parse_roi(",".join(str(v) for v in roi)) for roi in rois]
+        with self._lock:
+            new_rois = rois if rois is not None else self.rois
+            new_max = int(max_tiles) if max_tiles is not None else self.max_tiles
+            if (mode or self.mode) == "roi" and not new_rois:
+                raise ValueError("mode 'roi' needs at least one ROI")
+            if len(new_rois) > new_max:
+                raise ValueError(f"{len(new_rois)} ROIs but max_tiles is {new_max}; these would never be "
+                                 f"inferred: {[list(r) for r in new_rois[new_max:]]}")
+            if mode is not None:
+                self.mode = mode
+            if tile_size is not None:
+                self.tile_size = int(math.ceil(int(tile_size) / 32) * 32)
+            if overlap is not None:
+                self.overlap = float(overlap)
+            if rois is not None:
+                self.rois = rois
+            if max_tiles is not None:
+                self.max_tiles = int(max_tiles)
+            if full_frame is not None:
+                self.full_frame = bool(full_frame)
+
+    def plan(self, width: int, height: int):
+        """Crop rects for a width x height frame under the current settings."""
+        with self._lock:
+            mode, tile, overlap, rois, max_tiles = self.mode, self.tile_size, self.overlap, self.rois, self.max_tiles
+        if mode == "auto":
+            return plan_tiles(width, height, tile, overlap, max_tiles)
+        rects = []
+        # configure() keeps len(rois) <= max_tiles, so every ROI gets at least one tile
+        per_roi = max(1, max_tiles // max(1, len(rois)))
+        for x1, y1, x2, y2 in rois:
+            px1, py1 = int(x1 * width), int(y1 * height)
+            px2, py2 = max(px1 + 1, int(round(x2 * width))), max(py1 + 1, int(round(y2 * height)))
+            rects += plan_tiles(px2 - px1, py2 - py1, tile, overlap, per_roi, origin=(px1, py1))
+        return rects
+
+    def detect(self, frame: np.ndarray, predict, max_det: int = 300):
+        """
+        predict(crops, imgsz) -> one (xyxy, confs, cls_ids) per crop (e.g. run_inference with
+        conf/iou bound). Returns merged detections in frame coordinates.
+        """
+        h, w = frame.shape[:2]
+        t0 = time.perf_counter()
+        rects = self.plan(w, h)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+        if self.full_frame:
+            rects.append((0, 0, w, h))
+            crops.append(frame)
+        results = predict(crops, self.tile_size)
+
+        boxes, confs, classes, tile_ids, cut = [], [], [], [], []
+        for tile_id, ((x1, y1, x2, y2), (xyxy, conf, cls_ids)) in enumerate(zip(rects, results)):
+            xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4) + np.array([x1, y1, x1, y1], dtype=np.float32)
+            if not len(xyxy):
+                continue
+            # a box touching a tile edge that is not also the frame edge was probably cut off
+            m = _EDGE_MARGIN
+            is_cut = (((x1 > 0) & (xyxy[:, 0] <= x1 + m)) | ((y1 > 0) & (xyxy[:, 1] <= y1 + m))
+                      | ((x2 < w) & (xyxy[:, 2] >= x2 - m)) | ((y2 < h) & (xyxy[:, 3] >= y2 - m)))
+            boxes.append(xyxy)
+            confs.append(np.asarray(conf, dtype=np.float32))
+            classes.append(np.asarray(cls_ids, dtype=int))
+            tile_ids.append(np.full(len(xyxy), tile_id))
+            cut.append(is_cut)
+        if boxes:
+            merged = merge_detections(np.concatenate(boxes), np.concatenate(confs), np.concatenate(classes),
+                                      np.concatenate(tile_ids), np.concatenate(cut), iou=self.iou, max_det=max_det)
+        else:
+            merged = (np.zeros((0, 4), np.float32), np.zeros((0,), np.float32), np.zeros((0,), int))
+        with self._lock:
+            self.calls += 1
+            self.inputs += len(crops)
+            self._last_ms = (time.perf_counter() - t0) * 1000
+            self._last_plan = rects
+        return merged
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "tile_size": self.tile_size,
+                "overlap": self.overlap,
+                "rois": [list(r) for r in self.rois],
+                "max_tiles": self.max_tiles,
+                "full_frame": self.full_frame,
+                "calls": self.calls,
+                "avg_inputs_per_call": round(self.inputs / self.calls, 2) if self.calls else None,
+                "last_ms": round(self._last_ms, 2) if self._last_ms is not None else None,
+                "last_plan": [list(r) for r in self._last_plan],
+            }
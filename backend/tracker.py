@@ -0,0 +1,295 @@
+"""
+Multi-object tracking between detections (ByteTrack-style)
+- Constant-velocity Kalman filter per track on (cx, cy, aspect, height)
+- Two-stage IoU association: confident detections first, then low-score ones
+  rescue tracks that would otherwise be lost (occlusion, motion blur)
+- Persistent track IDs; lost tracks are kept for a few frames before removal
+- predict() advances every track without a detection, so frames where inference
+  is skipped still get smooth, labeled boxes
+- AdaptiveInterval picks how many frames to skip from scene motion and inference load
+"""
+
+import math
+import threading
+
+import numpy as np
+
+from inference_backends import box_iou, empty_detections
+
+
+# ---------- Kalman filter ----------
+
+# x' = x + v per frame for each of (cx, cy, a, h); we only observe the positions
+_MOTION = np.eye(8)
+_MOTION[:4, 4:] = np.eye(4)
+_OBSERVE = np.eye(4, 8)
+
+class KalmanBoxFilter:
+    """8-state constant-velocity filter over (cx, cy, a, h) and their velocities."""
+
+    # noise scales relative to box height, as in SORT / ByteTrack
+    _std_position = 1.0 / 20
+    _std_velocity = 1.0 / 160
+
+    def __init__(self, xyxy):
+        measurement = self.to_xyah(xyxy)
+        self.mean = np.r_[measurement, np.zeros(4)]
+        h = measurement[3]
+        std = [2 * self._std_position * h, 2 * self._std_position * h, 1e-2, 2 * self._std_position * h,
+               10 * self._std_velocity * h, 10 * self._std_velocity * h, 1e-5, 10 * self._std_velocity * h]
+        self.covariance = np.diag(np.square(std))
+
+    @staticmethod
+    def to_xyah(xyxy):
+        x1, y1, x2, y2 = (float(v) for v in xyxy)
+        w, h = max(x2 - x1, 1e-3), max(y2 - y1, 1e-3)
+        return np.array([x1 + w / 2, y1 + h / 2, w / h, h])
+
+    def xyxy(self) -> np.ndarray:
+        cx, cy, a, h = self.mean[:4]
+        h = max(h, 1e-3)
+        w = a * h
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+    def predict(self):
+        h = self.mean[3]
+        std = [self._std_position * h, self._std_position * h, 1e-2, self._std_position * h,
+               self._std_velocity * h, self._std_velocity * h, 1e-5, self._std_velocity * h]
+        self.mean = _MOTION @ self.mean
+        self.covariance = _MOTION @ self.covariance @ _MOTION.T + np.diag(np.square(std))
+
+    def update(self, xyxy):
+        measurement = self.to_xyah(xyxy)
+        h = self.mean[3]
+        noise = np.diag(np.square([self._std_position * h, self._std_position * h, 1e-1, self._std_position * h]))
+        projected_cov = _OBSERVE @ self.covariance @ _OBSERVE.T + noise
+        gain = self.covariance @ _OBSERVE.T @ np.linalg.inv(projected_cov)
+        self.mean = self.mean + gain @ (measurement - _OBSERVE @ self.mean)
+        self.covariance = self.covariance - gain @ projected_cov @ gain.T
+
+    def speed(self) -> float:
+        """Center speed in box heights per frame (scale-independent motion measure)."""
+        return float(math.hypot(self.mean[4], self.mean[5]) / max(self.mean[3], 1e-3))
+
+
+# ---------- Tracks ----------
+
+class Track:
+    """One tracked object: Kalman state plus class, last confidence and bookkeeping."""
+
+    def __init__(self, track_id: int, xyxy, conf: float, cls_id: int):
+        self.id = track_id
+        self.kf = KalmanBoxFilter(xyxy)
+        self.conf = float(conf)
+        self.cls = int(cls_id)
+        self.hits = 1
+        self.age = 0
+        self.frames_since_update = 0
+        self.missed_updates = 0  # consecutive update() rounds without a matching detection
+
+    def predict(self, steps: int = 1):
+        for _ in range(steps):
+            self.kf.predict()
+        self.age += steps
+        self.frames_since_update += steps
+
+    def update(self, xyxy, conf: float):
+        self.kf.update(xyxy)
+        self.conf = float(conf)
+        self.hits += 1
+        self.frames_since_update = 0
+        self.missed_updates = 0
+
+
+def _greedy_match(iou: np.ndarray, threshold: float):
+    """Match rows to columns by descending IoU; returns (pairs, unmatched_rows, unmatched_cols)."""
+    pairs = []
+    if iou.size:
+        order = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+        used_r, used_c = set(), set()
+        for r, c in order:
+            if iou[r, c] < threshold:
+                break
+            if r in used_r or c in used_c:
+                continue
+            used_r.add(r)
+            used_c.add(c)
+            pairs.append((int(r), int(c)))
+    matched_r = {r for r, _ in pairs}
+    matched_c = {c for _, c in pairs}
+    return (pairs, [r for r in range(iou.shape[0]) if r not in matched_r],
+            [c for c in range(iou.shape[1]) if c not in matched_c])
+
+
+class ObjectTracker:
+    """
+    ByteTrack-style tracker. update() takes a frame's detections (include low-score ones:
+    they only extend existing tracks) and returns tracked boxes with IDs; predict() returns
+    Kalman-predicted boxes for frames where detection was skipped.
+    """
+
+    def __init__(self, high_thresh: float = 0.5, low_thresh: float = 0.1, match_iou: float = 0.3,
+                 max_lost: int = 30, min_hits: int = 1, max_predict: int = 10):
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.match_iou = match_iou
+        self.max_lost = max_lost
+        self.min_hits = min_hits
+        self.max_predict = max_predict
+        self._tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.frames_updated = 0
+        self.frames_predicted = 0
+        self.tracks_created = 0
+        # True when the last update() started a track or missed one (new / occluded objects)
+        self.scene_changed = False
+
+    def reset(self):
+        with self._lock:
+            self._tracks = []
+            self._next_id = 1
+
+    def _iou(self, tracks, xyxy, cls_ids):
+        if not tracks or len(xyxy) == 0:
+            return np.zeros((len(tracks), len(xyxy)), dtype=np.float32)
+        predicted = np.stack([t.kf.xyxy() for t in tracks])
+        iou = box_iou(predicted, np.asarray(xyxy, dtype=np.float32))
+        # never switch an ID to a different class
+        iou[np.array([t.cls for t in tracks])[:, None] != np.asarray(cls_ids)[None, :]] = 0.0
+        return iou
+
+    def update(self, xyxy, confs, cls_ids, steps: int = 1):
+        """
+        Associate detections with tracks; returns (xyxy, confs, cls_ids, track_ids) of visible tracks.
+        steps = camera frames since the previous update()/predict() call (frames dropped in between count).
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32)
+        cls_ids = np.asarray(cls_ids, dtype=int)
+        steps = max(1, min(int(steps), self.max_lost))
+        with self._lock:
+            for track in self._tracks:
+                track.predict(steps)
+
+            high = np.flatnonzero(confs >= self.high_thresh)
+            low = np.flatnonzero((confs >= self.low_thresh) & (confs < self.high_thresh))
+
+            # 1) confident detections against every track
+            pairs, free_tracks, free_high = _greedy_match(
+                self._iou(self._tracks, xyxy[high], cls_ids[high]), self.match_iou)
+            for ti, di in pairs:
+                self._tracks[ti].update(xyxy[high[di]], confs[high[di]])
+
+            # 2) low-score detections can only extend tracks still matched in the previous round
+            remaining = [self._tracks[i] for i in free_tracks if self._tracks[i].missed_updates == 0]
+            pairs, _, _ = _greedy_match(self._iou(remaining, xyxy[low], cls_ids[low]), 0.5)
+            for ti, di in pairs:
+                remaining[ti].update(xyxy[low[di]], confs[low[di]])
+            for track in self._tracks:
+                if track.frames_since_update > 0:
+                    track.missed_updates += 1
+
+            # 3) unmatched confident detections start new tracks
+            for di in free_high:
+                d = high[di]
+                self._tracks.append(Track(self._next_id, xyxy[d], confs[d], cls_ids[d]))
+                self._next_id += 1
+                self.tracks_created += 1
+
+            self.scene_changed = bool(free_high) or any(t.missed_updates == 1 for t in self._tracks)
+            self._tracks = [t for t in self._tracks if t.frames_since_update <= self.max_lost]
+            self.frames_updated += 1
+            return self._visible(max_age=0)
+
+    def predict(self, steps: int = 1):
+        """Advance all tracks `steps` frames without detections; returns predicted visible tracks."""
+        steps = max(1, min(int(steps), self.max_lost))
+        with self._lock:
+            for track in self._tracks:
+                track.predict(steps)
+            self.frames_predicted += 1
+            return self._visible(max_age=self.max_predict)
+
+    def _visible(self, max_age: int):
+        tracks = [t for t in self._tracks if t.hits >= self.min_hits and t.frames_since_update <= max_age]
+        if not tracks:
+            xyxy, confs, cls_ids = empty_detections()
+            return xyxy, confs, cls_ids, np.zeros((0,), dtype=int)
+        return (np.stack([t.kf.xyxy() for t in tracks]),
+                np.array([t.conf for t in tracks], dtype=np.float32),
+                np.array([t.cls for t in tracks], dtype=int),
+                np.array([t.id for t in tracks], dtype=int))
+
+    def motion(self) -> float:
+        """Fastest confirmed track speed (box heights per frame); 0 for an empty scene."""
+        with self._lock:
+            speeds = [t.kf.speed() for t in self._tracks if t.missed_updates == 0 and t.hits > 1]
+        return max(speeds) if speeds else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = sum(1 for t in self._tracks if t.frames_since_update == 0)
+            return {
+                "tracks": len(self._tracks),
+                "active_tracks": active,
+                "tracks_created": self.tracks_created,
+                "frames_updated": self.frames_updated,
+                "frames_predicted": self.frames_predicted,
+            }
+
+
+# ---------- Adaptive detection interval ----------
+
+class AdaptiveInterval:
+    """
+    Number of frames between detections (1 = every frame).
+    - load: inference slower than the camera frame period forces a wider interval
+    - motion: fast-moving tracks (in box heights per frame) pull it back down
+    - scene change: tracks appearing / getting lost forces the next frame to be detected
+    """
+
+    def __init__(self, min_interval: int = 1, max_interval: int = 6, fast_motion: float = 0.08):
+        self.min_interval = max(1, int(min_interval))
+        self._base_max = int(max_interval)  # configured upper bound; a raised min only lifts it temporarily
+        self.max_interval = max(self.min_interval, self._base_max)
+        self.fast_motion = fast_motion
+        self.interval = self.min_interval
+        self._inference_s = None
+        self._frame_s = None
+
+    def set_min_interval(self, n: int):
+        """Raise (or restore) the lower bound, e.g. from the quality controller."""
+        self.min_interval = max(1, int(n))
+        self.max_interval = max(self._base_max, self.min_interval)
+        self.interval = min(self.max_interval, max(self.interval, self.min_interval))
+
+    def observe_inference(self, seconds: float):
+        self._inference_s = seconds if self._inference_s is None else 0.8 * self._inference_s + 0.2 * seconds
+
+    def observe_frame_period(self, seconds: float):
+        if seconds > 0:
+            self._frame_s = seconds if self._frame_s is None else 0.9 * self._frame_s + 0.1 * seconds
+
+    def update(self, motion: float, scene_changed: bool = False) -> int:
+        if scene_changed:
+            self.interval = self.min_interval
+            return self.interval
+        # fast motion -> min interval; a still scene -> max interval
+        calm = max(0.0, 1.0 - motion / self.fast_motion) if self.fast_motion > 0 else 1.0
+        motion_interval = self.min_interval + calm * (self.max_interval - self.min_interval)
+        load_interval = self.min_interval
+        if self._inference_s and self._frame_s:
+            load_interval = math.ceil(self._inference_s / self._frame_s)
+        target = max(round(motion_interval), load_interval)
+        self.interval = int(min(self.max_interval, max(self.min_interval, target)))
+        return self.interval
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "inference_ms": round(self._inference_s * 1000, 2) if self._inference_s else None,
+            "frame_period_ms": round(self._frame_s * 1000, 2) if self._frame_s else None,
+        }
@@ -0,0 +1,520 @@
+"""
+Multi-process inference worker pool with shared-memory frame transport
+- K worker processes, each pinned to its own CPU subset with its own thread count,
+  so model threads don't fight over the same cores or the web process' GIL
+- Frames are copied once into a per-worker shared-memory ring of fixed-size slots;
+  only small metadata tuples (slot, shape, thresholds) go through the queues
+- Workers write detections as compact float32 rows into a shared result ring
+- Workers build their backend with inference_backends.create_backend (they never import app)
+- predict() has the backend signature, so the pool can stand in for inference_backend;
+  run it behind an InferenceBatcher with concurrency=K to keep every worker busy
+- A worker that dies is skipped and respawned in the background; slots of a request that
+  timed out are reclaimed when its late reply arrives, and a worker whose whole ring is
+  held by unanswered requests is restarted. With no live worker, running is False and
+  callers fall back to in-process inference
+"""
+
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# x1, y1, x2, y2, conf, cls
+_RESULT_COLS = 6
+_MAX_RESULTS = 300
+# how often a waiting request checks that its worker is still alive
+_LIVENESS_POLL = 0.5
+# minimum seconds between two respawns of the same worker
+_RESPAWN_BACKOFF = 30.0
+
+
+def cpu_subsets(num_workers: int, cpus=None):
+    """Split the CPUs this process may use into num_workers contiguous subsets."""
+    if cpus is None:
+        try:
+            cpus = sorted(os.sched_getaffinity(0))
+        except AttributeError:  # not available on macOS / Windows
+            return [None] * num_workers
+    cpus = list(cpus)
+    if len(cpus) < num_workers:
+        return [None] * num_workers
+    per = len(cpus) // num_workers
+    return [cpus[i * per:(i + 1) * per] if i < num_workers - 1 else cpus[i * per:] for i in range(num_workers)]
+
+
+@contextmanager
+def _skip_main_reimport():
+    """
+    Spawned children re-run the parent's __main__ script (app.py under `python app.py`),
+    which would load a second model per worker. Workers only need this module, so hide
+    the script path while the processes are launched.
+    """
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    if path is None or getattr(main, "__spec__", None) is not None:
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = path
+
+
+def _attach(name: str):
+    # the parent owns (and unlinks) the block; children spawned from it share its resource
+    # tracker, so attaching must not register the block a second time where that is avoidable
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(index, config, in_name, out_name, slot_bytes, tasks, results):
+    """Worker process: load a backend, then serve batches read from the shared input ring."""
+    cpus = config.get("cpus")
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads = int(config.get("threads") or 1)
+    # must be set before torch / onnxruntime / openvino spin up their thread pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    cv2.setNumThreads(1)
+
+    in_shm = out_shm = None
+    try:
+        import torch
+        from ultralytics import YOLO
+
+        from inference_backends import create_backend
+
+        torch.set_num_threads(threads)
+        yolo = YOLO(config["weights_file"])
+        backend = create_backend(config["backend"], yolo, config["weights_file"], device="cpu",
+                                 threads=threads, imgsz=config.get("imgsz", 640),
+                                 calibration_dir=config.get("calibration_dir"),
+                                 quant_mode=config.get("quant_mode", "static"),
+                                 tensor_input=config.get("tensor_input", False))
+        in_shm = _attach(in_name)
+        out_shm = _attach(out_name)
+        results.put(("ready", index, {"pid": os.getpid(), "cpus": cpus, "threads": threads, **backend.info()}))
+    except Exception as e:
+        results.put(("failed", index, repr(e)))
+        return
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            request_id, frames_meta, conf, iou, imgsz, max_det = task
+            try:
+                # zero-copy views onto the parent's frames
+                frames = [np.ndarray(shape, dtype=np.uint8, buffer=in_shm.buf, offset=slot * slot_bytes)
+                          for slot, shape in frames_meta]
+                detections = backend.predict(frames, conf=conf, iou=iou, imgsz=imgsz, max_det=max_det)
+                counts = []
+                for (slot, _), (xyxy, confs, cls_ids) in zip(frames_meta, detections):
+                    n = min(len(confs), _MAX_RESULTS)
+                    rows = np.ndarray((_MAX_RESULTS, _RESULT_COLS), dtype=np.float32, buffer=out_shm.buf,
+                                      offset=slot * _MAX_RESULTS * _RESULT_COLS * 4)
+                    rows[:n, :4] = xyxy[:n]
+                    rows[:n, 4] = confs[:n]
+                    rows[:n, 5] = cls_ids[:n]
+                    counts.append(n)
+                del frames
+                results.put(("done", request_id, counts))
+            except Exception as e:
+                results.put(("error", request_id, repr(e)))
+    finally:
+        for shm in (in_shm, out_shm):
+            try:
+                shm.close()
+            except BufferError:  # a view is still alive; the OS reclaims it at exit
+                pass
+
+
+class _Worker:
+    """Parent-side handle: process, queues, shared rings and the free-slot list."""
+
+    def __init__(self, index: int, slots: int, slot_bytes: int, ctx):
+        self.index = index
+        self.slot_bytes = slot_bytes
+        self.in_shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.out_shm = shared_memory.SharedMemory(create=True, size=slots * _MAX_RESULTS * _RESULT_COLS * 4)
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.free_slots = list(range(slots))
+        self.slot_cond = threading.Condition()
+        self.in_flight = 0
+        self.orphaned_slots = 0  # held by requests that timed out and are still unanswered
+        self.process = None
+        self.collector = None
+        self.info = None
+        self.healthy = False
+
+    def acquire_slots(self, n: int, timeout: float):
+        with self.slot_cond:
+            if not self.slot_cond.wait_for(lambda: len(self.free_slots) >= n, timeout):
+                raise TimeoutError(f"worker {self.index}: no free shared-memory slots")
+            slots, self.free_slots = self.free_slots[:n], self.free_slots[n:]
+            self.in_flight += 1
+            return slots
+
+    def release_slots(self, slots):
+        with self.slot_cond:
+            self.free_slots.extend(slots)
+            self.in_flight -= 1
+            self.slot_cond.notify_all()
+
+    def alive(self) -> bool:
+        return self.healthy and self.process is not None and self.process.is_alive()
+
+    def close(self):
+        for shm in (self.in_shm, self.out_shm):
+            try:
+                shm.close()
+            except BufferError:  # a request thread still holds a view; unlinking is enough
+                pass
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _PendingRequest:
+    def __init__(self, worker: _Worker, slots):
+        self.worker = worker
+        self.slots = slots
+        self.done = threading.Event()
+        self.counts = None
+        self.error = None
+        self.orphaned = False
+
+
+class WorkerPool:
+    """K inference processes fed through shared memory; predict() matches InferenceBackend.predict."""
+
+    name = "worker-pool"
+
+    def __init__(self, num_workers: int, backend: str, weights_file, names, threads: int = 0,
+                 imgsz: int = 640, slots_per_worker: int = 8, max_frame_pixels: int = 1280 * 720,
+                 calibration_dir=None, quant_mode: str = "static", tensor_input: bool = False,
+                 start_timeout: float = 300.0):
+        self.num_workers = max(1, int(num_workers))
+        self.names = names
+        self.max_frame_pixels = int(max_frame_pixels)
+        self.slots_per_worker = max(1, int(slots_per_worker))
+        self.start_timeout = start_timeout
+        cpus = cpu_subsets(self.num_workers)
+        per_worker_threads = threads or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self._configs = [{
+            "backend": backend,
+            "weights_file": str(weights_file),
+            "threads": len(cpus[i]) if cpus[i] and not threads else per_worker_threads,
+            "cpus": cpus[i],
+            "imgsz": imgsz,
+            "calibration_dir": str(calibration_dir) if calibration_dir else None,
+            "quant_mode": quant_mode,
+            "tensor_input": tensor_input,
+        } for i in range(self.num_workers)]
+        # spawn: a fresh interpreter per worker (fork + torch threads is unsafe)
+        self._ctx = mp.get_context("spawn")
+        self._workers = []
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._running = False
+        self._slot_bytes = self.max_frame_pixels * 3
+        self._respawn_lock = threading.Lock()
+        self._respawning = set()
+        self._last_respawn = {}
+        self._requests = 0
+        self._frames = 0
+        self._resized = 0
+        self._timeouts = 0
+        self._respawns = 0
+
+    # ---------- lifecycle ----------
+
+    def _launch(self, index: int) -> _Worker:
+        worker = _Worker(index, self.slots_per_worker, self._slot_bytes, self._ctx)
+        with _skip_main_reimport():
+            worker.process = self._ctx.Process(
+                target=_worker_main, name=f"inference-worker-{index}",
+                args=(index, self._configs[index], worker.in_shm.name, worker.out_shm.name, self._slot_bytes,
+                      worker.tasks, worker.results),
+                daemon=True)
+            worker.process.start()
+        return worker
+
+    def _await_ready(self, worker: _Worker) -> bool:
+        """Wait for the worker's backend to load, then start its result collector."""
+        try:
+            status, _, info = worker.results.get(timeout=self.start_timeout)
+        except queue.Empty:
+            status, info = "failed", "timed out while loading the model"
+        if status != "ready":
+            logging.error(f"Inference worker {worker.index} failed to start: {info}")
+            return False
+        worker.info = info
+        worker.healthy = True
+        worker.collector = threading.Thread(target=self._collect, args=(worker,),
+                                            name=f"inference-worker-{worker.index}-results", daemon=True)
+        worker.collector.start()
+        return True
+
+    def start(self) -> bool:
+        """Spawn the workers and wait until each has loaded its backend."""
+        t0 = time.time()
+        self._workers = [self._launch(i) for i in range(self.num_workers)]
+        for worker in self._workers:
+            if not self._await_ready(worker):
+                self.stop()
+                return False
+        self._running = True
+        logging.info(f"Worker pool ready: {self.num_workers} processes in {time.time() - t0:.1f}s "
+                     f"({[w.info.get('cpus') for w in self._workers]})")
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        with self._respawn_lock:
+            self._running = False
+        for worker in self._workers:
+            try:
+                worker.tasks.put(None)
+            except Exception:
+                pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            worker.results.put(None)  # stops the collector thread
+            worker.close()
+        with self._pending_lock:
+            pending, self._pending = list(self._pending.values()), {}
+        for request in pending:
+            request.error = RuntimeError("worker pool stopped")
+            request.done.set()
+        self._workers = []
+
+    @property
+    def running(self) -> bool:
+        """True while at least one worker can take requests."""
+        return self._running and any(w.alive() for w in self._workers)
+
+    # ---------- failure handling ----------
+
+    def _retire(self, worker: _Worker, reason: str):
+        """Take a dead or wedged worker out of rotation, fail its requests and respawn it."""
+        with self._respawn_lock:
+            if not worker.healthy:
+                return
+            worker.healthy = False
+        logging.error(f"Inference worker {worker.index} {reason}; respawning it")
+        with self._pending_lock:
+            failed = [(rid, r) for rid, r in self._pending.items() if r.worker is worker]
+            for rid, _ in failed:
+                self._pending.pop(rid)
+        for _, request in failed:
+            request.error = RuntimeError(f"worker {worker.index} {reason}")
+            request.done.set()
+        threading.Thread(target=self._respawn, args=(worker,),
+                         name=f"inference-worker-{worker.index}-respawn", daemon=True).start()
+
+    def _respawn(self, old: _Worker):
+        index = old.index
+        with self._respawn_lock:
+            wait = self._last_respawn.get(index, 0.0) + _RESPAWN_BACKOFF - time.monotonic()
+            if index in self._respawning:
+                return
+            self._respawning.add(index)
+        try:
+            if old.process is not None and old.process.is_alive():
+                old.process.terminate()
+                old.process.join(timeout=5.0)
+            old.results.put(None)  # stops the old collector thread
+            old.close()
+            if wait > 0:
+                time.sleep(wait)
+            if not self._running:
+                return
+            self._last_respawn[index] = time.monotonic()
+            worker = self._launch(index)
+            if not self._await_ready(worker):
+                worker.process.terminate()
+                worker.close()
+                return
+            with self._respawn_lock:
+                installed = self._running
+                if installed:
+                    self._workers[index] = worker
+            if not installed:  # stopped while the model was loading
+                worker.tasks.put(None)
+                worker.process.join(timeout=5.0)
+                worker.results.put(None)
+                worker.close()
+                return
+            self._respawns += 1
+            logging.info(f"Inference worker {index} respawned (pid {worker.info.get('pid')})")
+        except Exception:
+            logging.exception(f"Failed to respawn inference worker {index}")
+        finally:
+            with self._respawn_lock:
+                self._respawning.discard(index)
+
+    # ---------- inference ----------
+
+    def _collect(self, worker: _Worker):
+        while True:
+            message = worker.results.get()
+            if message is None:
+                break
+            status, request_id, payload = message
+            with self._pending_lock:
+                request = self._pending.pop(request_id, None)
+            if request is None:
+                continue
+            if request.orphaned:
+                # late reply to a timed-out request: the worker is done with its slots
+                with worker.slot_cond:
+                    worker.orphaned_slots -= len(request.slots)
+                worker.release_slots(request.slots)
+                continue
+            if status == "done":
+                request.counts = payload
+            else:
+                request.error = RuntimeError(f"worker {worker.index}: {payload}")
+            request.done.set()
+
+    def _pick_worker(self) -> _Worker:
+        live = []
+        for worker in list(self._workers):
+            if worker.alive():
+                live.append(worker)
+            elif worker.healthy:  # the process exited since the last request
+                self._retire(worker, f"exited with code {worker.process.exitcode}")
+        if not live:
+            raise RuntimeError("no live inference workers")
+        return min(live, key=lambda w: (w.in_flight, w.index))
+
+    def predict(self, frames, conf=0.25, iou=0.45, imgsz=640, max_det=300, timeout: float = 30.0):
+        if not frames:
+            return []
+        if not self._running:
+            raise RuntimeError("worker pool is not running")
+        results = []
+        # batches larger than a worker's ring are split into ring-sized chunks
+        for start in range(0, len(frames), self.slots_per_worker):
+            results.extend(self._predict_chunk(frames[start:start + self.slots_per_worker],
+                                               conf, iou, imgsz, min(max_det, _MAX_RESULTS), timeout))
+        return results
+
+    def _predict_chunk(self, frames, conf, iou, imgsz, max_det, timeout):
+        worker = self._pick_worker()
+        try:
+            slots = worker.acquire_slots(len(frames), timeout)
+        except TimeoutError:
+            if worker.orphaned_slots:
+                # its ring is held by requests it never answered: the process is stuck
+                self._retire(worker, "stopped answering")
+            raise
+        release = True
+        try:
+            frames_meta, scales = [], []
+            for slot, frame in zip(slots, frames):
+                frame, scale = self._fit(frame)
+                view = np.ndarray(frame.shape, dtype=np.uint8, buffer=worker.in_shm.buf,
+                                  offset=slot * worker.slot_bytes)
+                view[...] = frame
+                frames_meta.append((slot, frame.shape))
+                scales.append(scale)
+
+            request = _PendingRequest(worker, slots)
+            request_id = next(self._ids)
+            with self._pending_lock:
+                self._pending[request_id] = request
+            worker.tasks.put((request_id, frames_meta, float(conf), float(iou), int(imgsz), int(max_det)))
+            deadline = time.monotonic() + timeout
+            while not request.done.wait(min(_LIVENESS_POLL, max(0.0, deadline - time.monotonic()))):
+                if not worker.alive():
+                    self._retire(worker, f"exited with code {worker.process.exitcode}")
+                    with self._pending_lock:
+                        self._pending.pop(request_id, None)
+                    request.error = request.error or RuntimeError(f"worker {worker.index} is not available")
+                    break
+                if time.monotonic() >= deadline:
+                    with self._pending_lock:
+                        answered = request_id not in self._pending
+                        # the worker may still write into these slots; the collector frees them
+                        # when the late reply arrives
+                        request.orphaned = not answered
+                    if answered:  # the reply raced the deadline; done is about to be set
+                        continue
+                    release = False
+                    self._timeouts += 1
+                    with worker.slot_cond:
+                        worker.orphaned_slots += len(slots)
+                    raise TimeoutError(f"worker {worker.index} did not answer within {timeout}s")
+            if request.error is not None:
+                raise request.error
+
+            out = []
+            for slot, n, scale in zip(slots, request.counts, scales):
+                rows = np.ndarray((_MAX_RESULTS, _RESULT_COLS), dtype=np.float32, buffer=worker.out_shm.buf,
+                                  offset=slot * _MAX_RESULTS * _RESULT_COLS * 4)[:n].copy()
+                xyxy = rows[:, :4] / scale if scale != 1.0 else rows[:, :4]
+                out.append((xyxy, rows[:, 4], rows[:, 5].astype(int)))
+            self._requests += 1
+            self._frames += len(frames)
+            return out
+        finally:
+            if release:
+                worker.release_slots(slots)
+
+    def _fit(self, frame):
+        """Downscale frames that don't fit a ring slot; returns (frame, scale applied)."""
+        if frame.ndim != 3 or frame.shape[2] != 3 or frame.dtype != np.uint8:
+            raise ValueError("worker pool expects HxWx3 uint8 BGR frames")
+        h, w = frame.shape[:2]
+        if h * w <= self.max_frame_pixels:
+            return frame, 1.0
+        scale = math.sqrt(self.max_frame_pixels / float(h * w))
+        self._resized += 1
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), size[0] / float(w)
+
+    # ---------- inspection ----------
+
+    def info(self) -> dict:
+        return {
+            "backend": self.name,
+            "workers": [dict(w.info or {}, index=w.index, alive=w.process.is_alive() if w.process else False)
+                        for w in self._workers],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "workers": self.num_workers,
+            "slots_per_worker": self.slots_per_worker,
+            "max_frame_pixels": self.max_frame_pixels,
+            "requests": self._requests,
+            "frames": self._frames,
+            "frames_downscaled": self._resized,
+            "in_flight": [w.in_flight for w in self._workers],
+            "alive": [w.alive() for w in self._workers],
+            "timeouts": self._timeouts,
+            "respawns": self._respawns,
+        }
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { FaPlay, FaPause, FaCamera, FaCog } from 'react-icons/fa';
 import axios from 'axios';
@@ -6,11 +6,16 @@ import LiveFeed from './LiveFeed';
 import MetricsPanel from './MetricsPanel';
 import SavedFrames from './SavedFrames';
 import Controls from './Controls';
+import { SESSION_ID } from '../session';
 import './Dashboard.css';
 
 const API_BASE = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 const API_URL = `${API_BASE}/api`;
 const USE_BROWSER_CAMERA = true; // Must match LiveFeed.js setting
+// Browser-camera metrics, confidence and save-frame belong to this tab's session; the server
+// camera loop uses the shared state, so those calls carry no session. A query parameter
+// (not a custom header) keeps the GETs free of CORS preflights.
+const SESSION_PARAMS = USE_BROWSER_CAMERA ? { session: SESSION_ID } : {};
 
 function Dashboard() {
   const [isDetecting, setIsDetecting] = useState(false);
@@ -23,6 +28,10 @@ function Dashboard() {
     detections: {}
   });
   const [savedFrames, setSavedFrames] = useState([]);
+  const [savedTotal, setSavedTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const savedFramesEtag = useRef(null);
+  const loadedMorePages = useRef(false);
   const [loading, setLoading] = useState(false);
   const [showSettings, setShowSettings] = useState(false);
 
@@ -30,7 +39,7 @@ function Dashboard() {
   useEffect(() => {
     const interval = setInterval(async () => {
       try {
-        const response = await axios.get(`${API_URL}/metrics`);
+        const response = await axios.get(`${API_URL}/metrics`, { params: SESSION_PARAMS });
         setMetrics(response.data);
       } catch (error) {
         console.error('Error fetching metrics:', error);
@@ -40,16 +49,43 @@ function Dashboard() {
     return () => clearInterval(interval);
   }, []);
 
-  // Fetch saved frames
+  // Refresh the first page of saved frames and merge it into the loaded list, so pages added
+  // with "load more" survive the poll. No custom headers (they would force a CORS preflight):
+  // the browser cache revalidates with the ETag on its own and an unchanged list is skipped.
   const fetchSavedFrames = useCallback(async () => {
     try {
       const response = await axios.get(`${API_URL}/saved-frames`);
-      setSavedFrames(response.data.frames);
+      const etag = response.headers.etag || null;
+      if (etag && etag === savedFramesEtag.current) return;
+      savedFramesEtag.current = etag;
+      const { frames, total, next_cursor: cursor } = response.data;
+      setSavedTotal(total);
+      if (!loadedMorePages.current) {
+        setSavedFrames(frames);
+        setNextCursor(cursor);
+        return;
+      }
+      // keep the later pages (and their cursor); page 1 wins for frames in both
+      const fresh = new Set(frames.map((frame) => frame.filename));
+      setSavedFrames((loaded) => [...frames, ...loaded.filter((frame) => !fresh.has(frame.filename))]);
     } catch (error) {
       console.error('Error fetching saved frames:', error);
     }
   }, []);
 
+  // Append the next page
+  const loadMoreFrames = async () => {
+    if (!nextCursor) return;
+    try {
+      const response = await axios.get(`${API_URL}/saved-frames`, { params: { cursor: nextCursor } });
+      loadedMorePages.current = true;
+      setSavedFrames((frames) => [...frames, ...response.data.frames]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error loading more saved frames:', error);
+    }
+  };
+
   useEffect(() => {
     fetchSavedFrames();
     const interval = setInterval(fetchSavedFrames, 5000);
@@ -115,7 +151,7 @@ function Dashboard() {
   // Save frame
   const handleSaveFrame = async () => {
     try {
-      const response = await axios.post(`${API_URL}/save-frame`);
+      const response = await axios.post(`${API_URL}/save-frame`, null, { params: SESSION_PARAMS });
       console.log('Frame saved successfully:', response.data);
       fetchSavedFrames();
       
@@ -144,7 +180,7 @@ function Dashboard() {
   // Update confidence
   const handleConfidenceChange = async (newConfidence) => {
     try {
-      await axios.post(`${API_URL}/confidence`, { confidence: newConfidence });
+      await axios.post(`${API_URL}/confidence`, { confidence: newConfidence }, { params: SESSION_PARAMS });
       setMetrics(prev => ({ ...prev, confidence: newConfidence }));
     } catch (error) {
       console.error('Error updating confidence:', error);
@@ -155,6 +191,8 @@ function Dashboard() {
   const handleDeleteFrame = async (filename) => {
     try {
       await axios.delete(`${API_URL}/delete-frame/${filename}`);
+      // the poll only refreshes page 1, so drop the frame locally in case it was on a later page
+      setSavedFrames((frames) => frames.filter((frame) => frame.filename !== filename));
       fetchSavedFrames();
     } catch (error) {
       console.error('Error deleting frame:', error);
@@ -256,6 +294,9 @@ function Dashboard() {
         >
           <SavedFrames 
             frames={savedFrames} 
+            total={savedTotal}
+            hasMore={Boolean(nextCursor)}
+            onLoadMore={loadMoreFrames}
             onDelete={handleDeleteFrame}
             onRefresh={fetchSavedFrames}
           />
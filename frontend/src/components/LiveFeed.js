@@ -1,15 +1,69 @@
 import React, { useRef, useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
 import { FaVideo, FaVideoSlash } from 'react-icons/fa';
+import { SESSION_ID } from '../session';
 import './LiveFeed.css';
 
 const API_BASE = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 const USE_BROWSER_CAMERA = true; // Toggle: true for WebRTC, false for server camera
+// 'binary' / 'json': backend returns detections only and we draw the overlay here;
+// 'jpeg': backend returns the annotated frame (more server CPU and bandwidth)
+const RESPONSE_FORMAT = 'binary';
+// Stream frames over one WebSocket (/api/ws/frames) instead of one HTTP POST per frame.
+// The server keeps only the newest pending frame; falls back to POST if the socket is unavailable.
+const USE_WEBSOCKET = true;
+// the session id travels as a query parameter (WebSockets can't carry custom headers, and a
+// header would make every process-frame POST a CORS preflight)
+const WS_URL = `${API_BASE.replace(/^http/, 'ws')}/api/ws/frames?format=${RESPONSE_FORMAT}`
+  + `&session=${encodeURIComponent(SESSION_ID)}`;
+const FRAME_INTERVAL_MS = USE_WEBSOCKET ? 100 : 250;
+
+// Same palette as get_color_for_class in backend/app.py (converted from BGR)
+const BASE_COLORS = {
+  person: 'rgb(100, 100, 255)',
+  car: 'rgb(100, 255, 100)',
+  truck: 'rgb(255, 200, 100)',
+  bus: 'rgb(200, 100, 255)',
+  motorcycle: 'rgb(255, 100, 200)',
+  bicycle: 'rgb(255, 255, 100)',
+};
+
+const colorForClass = (name) => {
+  if (BASE_COLORS[name]) return BASE_COLORS[name];
+  let h = 0;
+  for (let i = 0; i < name.length; i++) h = (h * 31 + name.charCodeAt(i)) | 0;
+  return `hsl(${Math.abs(h) % 360}, 80%, 65%)`;
+};
+
+// Decode the packed format from backend/detection_codec.py
+const parseBinaryDetections = (buffer) => {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+  if (magic !== 'DET1') throw new Error('Unexpected detections payload');
+  const width = view.getUint16(4, true);
+  const height = view.getUint16(6, true);
+  const count = view.getUint32(8, true);
+  const boxes = new Float32Array(buffer.slice(12, 12 + count * 16));
+  const scores = new Float32Array(buffer.slice(12 + count * 16, 12 + count * 20));
+  const classes = new Uint16Array(buffer.slice(12 + count * 20, 12 + count * 22));
+  const detections = [];
+  for (let i = 0; i < count; i++) {
+    detections.push({
+      box: [boxes[i * 4], boxes[i * 4 + 1], boxes[i * 4 + 2], boxes[i * 4 + 3]],
+      conf: scores[i],
+      class_id: classes[i],
+    });
+  }
+  return { width, height, detections };
+};
 
 function LiveFeed({ isDetecting }) {
   const imgRef = useRef(null);
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
+  const overlayRef = useRef(null); // Detection overlay drawn client-side (structured responses)
+  const classesRef = useRef({ version: null, names: [] }); // Class-name table, fetched once
+  const wsRef = useRef(null); // Open frame WebSocket, if any
   const streamRef = useRef(null);
   const [cameraError, setCameraError] = useState(null);
   const [processedFrame, setProcessedFrame] = useState(null);
@@ -17,6 +71,7 @@ function LiveFeed({ isDetecting }) {
   const processingRef = useRef(false); // Track if frame is being processed
   const [framesSent, setFramesSent] = useState(0); // Track frames sent
   const [framesProcessed, setFramesProcessed] = useState(0); // Track frames processed
+  const [overlayActive, setOverlayActive] = useState(false); // Structured results received
 
   // Request camera access from browser
   useEffect(() => {
@@ -37,7 +92,7 @@ function LiveFeed({ isDetecting }) {
       console.log('Starting frame capture interval...');
       const interval = setInterval(() => {
         captureAndSendFrame();
-      }, 250); // Send 4 frames per second (reduced to prevent lag)
+      }, FRAME_INTERVAL_MS); // Server drops stale frames on the WebSocket; POST mode stays at 4 fps
 
       return () => {
         console.log('Stopping frame capture interval');
@@ -46,6 +101,62 @@ function LiveFeed({ isDetecting }) {
     }
   }, [isDetecting, cameraReady]);
 
+  // Open the frame WebSocket while detecting; results arrive as messages
+  useEffect(() => {
+    if (!(USE_WEBSOCKET && USE_BROWSER_CAMERA && isDetecting && cameraReady)) {
+      return undefined;
+    }
+    let closedByUs = false;
+    const ws = new WebSocket(WS_URL);
+    ws.binaryType = 'arraybuffer';
+    ws.onopen = () => {
+      console.log('🔌 Frame WebSocket connected');
+      wsRef.current = ws;
+      fetchClasses();
+    };
+    ws.onmessage = (event) => {
+      handleSocketResult(event.data);
+    };
+    ws.onerror = (err) => {
+      console.error('❌ Frame WebSocket error, falling back to HTTP:', err);
+    };
+    ws.onclose = () => {
+      if (wsRef.current === ws) wsRef.current = null;
+      if (!closedByUs) console.warn('🔌 Frame WebSocket closed, using HTTP POST');
+    };
+    return () => {
+      closedByUs = true;
+      if (wsRef.current === ws) wsRef.current = null;
+      ws.close();
+    };
+  }, [isDetecting, cameraReady]);
+
+  const handleSocketResult = (data) => {
+    try {
+      if (typeof data === 'string') {
+        const message = JSON.parse(data);
+        if (message.error) {
+          console.error('❌ Backend error:', message.error, message.details || '');
+          return;
+        }
+        drawOverlay(message);
+        setOverlayActive(true);
+      } else if (RESPONSE_FORMAT === 'jpeg') {
+        const url = URL.createObjectURL(new Blob([data], { type: 'image/jpeg' }));
+        setProcessedFrame(prev => {
+          if (prev) URL.revokeObjectURL(prev);
+          return url;
+        });
+      } else {
+        drawOverlay(parseBinaryDetections(data));
+        setOverlayActive(true);
+      }
+      setFramesProcessed(prev => prev + 1);
+    } catch (err) {
+      console.error('❌ Error handling frame result:', err);
+    }
+  };
+
   const startBrowserCamera = async () => {
     try {
       console.log('🎥 Requesting camera access...');
@@ -93,8 +204,46 @@ function LiveFeed({ isDetecting }) {
     }
   };
 
+  const fetchClasses = async () => {
+    try {
+      const response = await fetch(`${API_BASE}/api/classes`);
+      if (response.ok) {
+        classesRef.current = await response.json();
+      }
+    } catch (err) {
+      console.error('❌ Error fetching class names:', err);
+    }
+  };
+
+  const drawOverlay = ({ width, height, detections }) => {
+    const overlay = overlayRef.current;
+    if (!overlay) return;
+    if (overlay.width !== width) overlay.width = width;
+    if (overlay.height !== height) overlay.height = height;
+    const ctx = overlay.getContext('2d');
+    ctx.clearRect(0, 0, width, height);
+    ctx.lineWidth = 2;
+    ctx.font = '16px sans-serif';
+    ctx.textBaseline = 'bottom';
+    const names = classesRef.current.names;
+    detections.forEach(({ box: [x1, y1, x2, y2], conf, class_id }) => {
+      const name = names[class_id] || String(class_id);
+      const color = colorForClass(name);
+      const label = `${name} ${conf.toFixed(2)}`;
+      ctx.strokeStyle = color;
+      ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+      const tw = ctx.measureText(label).width + 6;
+      const ly = Math.max(y1, 22);
+      ctx.fillStyle = color;
+      ctx.fillRect(x1, ly - 22, tw, 22);
+      ctx.fillStyle = '#fff';
+      ctx.fillText(label, x1 + 3, ly - 3);
+    });
+  };
+
   const stopBrowserCamera = () => {
     setCameraReady(false);
+    setOverlayActive(false);
     setFramesSent(0);
     setFramesProcessed(0);
     if (streamRef.current) {
@@ -108,8 +257,17 @@ function LiveFeed({ isDetecting }) {
   };
 
   const captureAndSendFrame = async () => {
+    const ws = wsRef.current;
+    const useSocket = ws && ws.readyState === WebSocket.OPEN;
+
+    // On the socket only skip while the previous frame is still uploading;
+    // the server replaces any frame it has not started on yet.
+    if (useSocket && ws.bufferedAmount > 0) {
+      return;
+    }
+
     // Skip if already processing a frame
-    if (processingRef.current) {
+    if (!useSocket && processingRef.current) {
       console.log('⏭️ Skipping frame - already processing');
       return;
     }
@@ -128,7 +286,7 @@ function LiveFeed({ isDetecting }) {
       return;
     }
     
-    processingRef.current = true; // Mark as processing
+    processingRef.current = !useSocket; // Mark as processing (HTTP mode waits for the response)
     
     const ctx = canvas.getContext('2d');
 
@@ -145,6 +303,16 @@ function LiveFeed({ isDetecting }) {
     // Draw current video frame to canvas
     ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
+    if (useSocket) {
+      canvas.toBlob((blob) => {
+        if (blob && ws.readyState === WebSocket.OPEN) {
+          ws.send(blob);
+          setFramesSent(prev => prev + 1);
+        }
+      }, 'image/jpeg', 0.7);
+      return;
+    }
+
     // Convert canvas to blob
     canvas.toBlob(async (blob) => {
       if (!blob) {
@@ -161,12 +329,24 @@ function LiveFeed({ isDetecting }) {
         console.log(`📤 Sending frame ${framesSent + 1} to backend...`);
         setFramesSent(prev => prev + 1);
 
-        const response = await fetch(`${API_BASE}/api/process-frame`, {
+        const response = await fetch(`${API_BASE}/api/process-frame?format=${RESPONSE_FORMAT}`
+          + `&session=${encodeURIComponent(SESSION_ID)}`, {
           method: 'POST',
           body: formData,
         });
 
-        if (response.ok) {
+        if (response.ok && RESPONSE_FORMAT !== 'jpeg') {
+          // Refresh the class table only when the backend reports a different version
+          if (response.headers.get('X-Classes-Version') !== classesRef.current.version) {
+            await fetchClasses();
+          }
+          const result = RESPONSE_FORMAT === 'binary'
+            ? parseBinaryDetections(await response.arrayBuffer())
+            : await response.json();
+          drawOverlay(result);
+          setOverlayActive(true);
+          setFramesProcessed(prev => prev + 1);
+        } else if (response.ok) {
           const blob = await response.blob();
           const url = URL.createObjectURL(blob);
           
@@ -258,13 +438,13 @@ function LiveFeed({ isDetecting }) {
             </small>
             <small style={{ 
               padding: '4px 8px', 
-              background: processedFrame ? 'rgba(59, 130, 246, 0.2)' : 'rgba(156, 163, 175, 0.2)',
-              border: `1px solid ${processedFrame ? 'rgba(59, 130, 246, 0.3)' : 'rgba(156, 163, 175, 0.3)'}`,
+              background: (processedFrame || overlayActive) ? 'rgba(59, 130, 246, 0.2)' : 'rgba(156, 163, 175, 0.2)',
+              border: `1px solid ${(processedFrame || overlayActive) ? 'rgba(59, 130, 246, 0.3)' : 'rgba(156, 163, 175, 0.3)'}`,
               borderRadius: '4px',
               fontSize: '11px',
-              color: processedFrame ? '#3b82f6' : '#9ca3af'
+              color: (processedFrame || overlayActive) ? '#3b82f6' : '#9ca3af'
             }}>
-              {processedFrame ? '🎯 Detecting' : '⏸️ Processing'}
+              {(processedFrame || overlayActive) ? '🎯 Detecting' : '⏸️ Processing'}
             </small>
           </div>
         )}
@@ -314,6 +494,24 @@ function LiveFeed({ isDetecting }) {
                 }}
               />
               
+              {/* Client-side detection overlay (structured responses) */}
+              {RESPONSE_FORMAT !== 'jpeg' && (
+                <canvas
+                  ref={overlayRef}
+                  className="feed-video"
+                  style={{
+                    position: 'absolute',
+                    top: 0,
+                    left: 0,
+                    width: '100%',
+                    height: '100%',
+                    objectFit: 'contain',
+                    pointerEvents: 'none',
+                    display: cameraReady ? 'block' : 'none'
+                  }}
+                />
+              )}
+              
               {/* Processed frame overlay */}
               {processedFrame && (
                 <motion.img
@@ -5,7 +5,7 @@ import './SavedFrames.css';
 
 const API_BASE = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 
-function SavedFrames({ frames, onDelete, onRefresh }) {
+function SavedFrames({ frames, total, hasMore, onLoadMore, onDelete, onRefresh }) {
   const [selectedFrame, setSelectedFrame] = useState(null);
   const [viewMode, setViewMode] = useState('grid'); // 'grid' or 'list'
 
@@ -31,7 +31,7 @@ function SavedFrames({ frames, onDelete, onRefresh }) {
         <h2>
           <FaImages />
           <span>Saved Frames</span>
-          <span className="frame-count">{frames.length}</span>
+          <span className="frame-count">{total ?? frames.length}</span>
         </h2>
         <motion.button
           className="refresh-btn"
@@ -69,9 +69,10 @@ function SavedFrames({ frames, onDelete, onRefresh }) {
               >
                 <div className="frame-image-container">
                   <img
-                    src={`${API_BASE}${frame.url}`}
+                    src={`${API_BASE}${frame.thumbnail_url || frame.url}`}
                     alt={frame.filename}
                     className="frame-image"
+                    loading="lazy"
                   />
                   <div className="frame-overlay">
                     <motion.button
@@ -112,6 +113,16 @@ function SavedFrames({ frames, onDelete, onRefresh }) {
             ))}
           </div>
         )}
+        {hasMore && (
+          <motion.button
+            className="load-more-btn"
+            onClick={onLoadMore}
+            whileHover={{ scale: 1.03 }}
+            whileTap={{ scale: 0.97 }}
+          >
+            Load more
+          </motion.button>
+        )}
       </div>
 
       {/* Lightbox Modal */}
@@ -0,0 +1,22 @@
+// Per-tab session id sent (as ?session=) with the browser-camera calls, so the backend keeps
+// this client's metrics, confidence and latest frame apart from other browsers
+// (see backend/sessions.py)
+const STORAGE_KEY = 'detection-session-id';
+
+const newSessionId = () => (window.crypto && window.crypto.randomUUID
+  ? window.crypto.randomUUID()
+  : `${Date.now().toString(36)}${Math.random().toString(36).slice(2, 12)}`);
+
+export const SESSION_ID = (() => {
+  try {
+    let id = window.sessionStorage.getItem(STORAGE_KEY);
+    if (!id) {
+      id = newSessionId();
+      window.sessionStorage.setItem(STORAGE_KEY, id);
+    }
+    return id;
+  } catch (e) {
+    // storage unavailable (privacy mode): the id lasts as long as the page
+    return newSessionId();
+  }
+})();